@@ -1,15 +1,22 @@
-from flask import Flask, send_from_directory
-from flask_sqlalchemy import SQLAlchemy
+from flask import Flask, send_from_directory, jsonify
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
 import os
+import sys
+import time
 from datetime import timedelta
 
-# Initialize extensions
-db = SQLAlchemy()
+# Make the top-level models module importable
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Initialize extensions. The SQLAlchemy instance is the one the models are
+# declared on, so the app, the models and the replica router share a session.
+from models import db
 jwt = JWTManager()
 
 def create_app(config=None):
+    boot_started = time.perf_counter()
+    
     # Create and configure the app
     app = Flask(__name__)
     
@@ -24,6 +31,52 @@ def create_app(config=None):
     app.config['DEFINITIONS_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'definitions')
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max upload
     
+    # Hash signature partitions: 16 ** HASH_PARTITION_PREFIX_LENGTH partitions, stored as
+    # Postgres partitions or, for SQLite setups, one SQLite file per prefix
+    app.config['HASH_PARTITION_PREFIX_LENGTH'] = int(os.getenv('HASH_PARTITION_PREFIX_LENGTH', 1))
+    app.config['HASH_PARTITION_BACKEND'] = os.getenv('HASH_PARTITION_BACKEND')
+    app.config['HASH_PARTITION_FOLDER'] = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'partitions')
+    # Target false-positive rate of the hashes.bloom prefilter published with each hash build
+    app.config['HASH_FILTER_FP_RATE'] = float(os.getenv('HASH_FILTER_FP_RATE', 0.001))
+    
+    # Definitions push configuration (seconds)
+    app.config['DEFINITIONS_LONGPOLL_TIMEOUT'] = float(os.getenv('DEFINITIONS_LONGPOLL_TIMEOUT', 55))
+    app.config['DEFINITIONS_REFRESH_INTERVAL'] = float(os.getenv('DEFINITIONS_REFRESH_INTERVAL', 5))
+    app.config['DEFINITIONS_DOWNLOAD_JITTER'] = float(os.getenv('DEFINITIONS_DOWNLOAD_JITTER', 30))
+    app.config['DEFINITIONS_SSE_KEEPALIVE'] = float(os.getenv('DEFINITIONS_SSE_KEEPALIVE', 15))
+    app.config['DEFINITIONS_SSE_MAX_DURATION'] = float(os.getenv('DEFINITIONS_SSE_MAX_DURATION', 300))
+    app.config['DEFINITIONS_SSE_RETRY'] = float(os.getenv('DEFINITIONS_SSE_RETRY', 10))
+    app.config['DEFINITIONS_CACHE_TTL'] = float(os.getenv('DEFINITIONS_CACHE_TTL', 5))
+    # Load the definitions cache from the database at boot when there is no snapshot
+    app.config['DEFINITIONS_WARMUP'] = os.getenv('DEFINITIONS_WARMUP', '1') == '1'
+    
+    # Device heartbeat write-behind buffer. A crash loses at most
+    # HEARTBEAT_FLUSH_INTERVAL seconds or HEARTBEAT_FLUSH_ROWS devices of updates.
+    app.config['HEARTBEAT_FLUSH_INTERVAL'] = float(os.getenv('HEARTBEAT_FLUSH_INTERVAL', 30))
+    app.config['HEARTBEAT_FLUSH_ROWS'] = int(os.getenv('HEARTBEAT_FLUSH_ROWS', 5000))
+    app.config['HEARTBEAT_MAX_BUFFERED'] = int(os.getenv('HEARTBEAT_MAX_BUFFERED', 50000))
+    app.config['HEARTBEAT_ACTIVE_WINDOW'] = int(os.getenv('HEARTBEAT_ACTIVE_WINDOW', 24 * 60 * 60))
+    
+    # Similarity signatures: bytes sketched per sample and default match distance (1 - Jaccard)
+    app.config['SIMILARITY_MAX_BYTES'] = int(os.getenv('SIMILARITY_MAX_BYTES', 16 * 1024 * 1024))
+    app.config['SIMILARITY_MAX_DISTANCE'] = float(os.getenv('SIMILARITY_MAX_DISTANCE', 0.5))
+    
+    # Pattern compiler: minimum fixed bytes of an "any" offset pattern, and
+    # the expected matches per MB above which a signature is flagged
+    app.config['PATTERN_MIN_BYTES'] = int(os.getenv('PATTERN_MIN_BYTES', 4))
+    app.config['PATTERN_MAX_MATCHES_PER_MB'] = float(os.getenv('PATTERN_MAX_MATCHES_PER_MB', 1e-3))
+    
+    # Read replicas, e.g. DATABASE_REPLICA_URLS=sqlite:////tmp/replica.db for local testing
+    app.config['SQLALCHEMY_REPLICA_URIS'] = [url for url in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if url]
+    app.config['REPLICA_MAX_LAG'] = float(os.getenv('REPLICA_MAX_LAG', 10))
+    app.config['REPLICA_LAG_CHECK_INTERVAL'] = float(os.getenv('REPLICA_LAG_CHECK_INTERVAL', 5))
+    
+    # Detection telemetry ingestion
+    app.config['TELEMETRY_MAX_BATCH'] = int(os.getenv('TELEMETRY_MAX_BATCH', 1000))
+    # Accepted event timestamps: at most this many days old or seconds ahead of the server clock
+    app.config['TELEMETRY_MAX_EVENT_AGE_DAYS'] = float(os.getenv('TELEMETRY_MAX_EVENT_AGE_DAYS', 30))
+    app.config['TELEMETRY_MAX_CLOCK_SKEW'] = float(os.getenv('TELEMETRY_MAX_CLOCK_SKEW', 3600))
+    
     # Ensure directories exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     os.makedirs(app.config['DEFINITIONS_FOLDER'], exist_ok=True)
@@ -37,16 +90,67 @@ def create_app(config=None):
     jwt.init_app(app)
     CORS(app)
     
-    # Register blueprints
+    from app.db_routing import replica_router
+    replica_router.init_app(app, db)
+    
+    from app.query_stats import query_stats
+    query_stats.init_app(app)
+    
+    from app.heartbeats import heartbeats
+    heartbeats.init_app(app, 'HEARTBEAT')
+    
+    from app.hash_partitions import hash_partitions
+    hash_partitions.init_app(app)
+    
+    # Register blueprints. Admin-only views are imported lazily.
     from app.routes import api
-    from app.auth import auth, create_initial_admin
-    from app.license_manager import license_bp
+    from app.telemetry import telemetry_bp
+    from app.lazy_views import register_admin_views
     app.register_blueprint(api, url_prefix='/api')
-    app.register_blueprint(auth, url_prefix='/auth')
-    app.register_blueprint(license_bp, url_prefix='/api/license')
+    app.register_blueprint(telemetry_bp, url_prefix='/api/telemetry')
+    register_admin_views(app)
+    
+    # Schema and admin bootstrapping are one-off commands (flask init-db)
+    from app.commands import register_commands
+    register_commands(app)
+    
+    # Warm the hot-path caches from the prebuilt snapshot, not the database.
+    # Without one they are loaded from the database in the background.
+    from app.snapshot import definitions_cache, load_snapshot, start_warmup
+    definitions_cache.ttl = app.config['DEFINITIONS_CACHE_TTL']
+    if not load_snapshot(app) and app.config['DEFINITIONS_WARMUP']:
+        from app.signature_manager import SignatureManager
+        start_warmup(app, SignatureManager.get_latest_definitions)
     
-    # Create initial admin user
-    create_initial_admin(app)
+    startup = {
+        'boot_ms': round((time.perf_counter() - boot_started) * 1000, 1),
+        'first_request_ms': None
+    }
+    app.extensions['startup'] = startup
+    
+    @app.before_request
+    def record_first_request():
+        if startup['first_request_ms'] is None:
+            startup['first_request_ms'] = round((time.perf_counter() - boot_started) * 1000, 1)
+            app.logger.info('First request %.1f ms after boot started', startup['first_request_ms'])
+    
+    # Liveness: the process is up and serving
+    @app.route('/health', methods=['GET'])
+    def health_check():
+        return jsonify({'status': 'healthy', 'startup': startup}), 200
+    
+    # Readiness: hot-path caches are loaded. Only reports the state, so
+    # probes never query the database.
+    @app.route('/ready', methods=['GET'])
+    def readiness_check():
+        if not definitions_cache.ready:
+            return jsonify({'status': 'warming', 'startup': startup}), 503
+        
+        return jsonify({
+            'status': 'ready',
+            'definitions_source': definitions_cache.source,
+            'startup': startup
+        }), 200
     
     # Add route to serve the dashboard
     @app.route('/admin', defaults={'path': ''})
@@ -56,10 +160,4 @@ def create_app(config=None):
             return send_from_directory(os.path.join(app.static_folder, 'admin'), path)
         return send_from_directory(os.path.join(app.static_folder, 'admin'), 'index.html')
     
-    # Import models for database creation
-    import sys
-    import os
-    sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-    from models import User
-    
     return app
\ No newline at end of file
@@ -1,12 +1,10 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from werkzeug.security import generate_password_hash, check_password_hash
 from models import db, User
+from app.serialization import RowEncoder, DATETIME, json_response
 import datetime
 
-auth = Blueprint('auth', __name__)
-
-@auth.route('/login', methods=['POST'])
 def login():
     """Handle user login and generate JWT token"""
     data = request.get_json()
@@ -36,7 +34,6 @@ def login():
     
     return jsonify({'error': 'Invalid credentials'}), 401
 
-@auth.route('/register', methods=['POST'])
 @jwt_required()
 def register():
     """Register a new admin user (requires admin privileges)"""
@@ -72,7 +69,8 @@ def register():
     
     return jsonify({'message': 'User created successfully'}), 201
 
-@auth.route('/users', methods=['GET'])
+USER_LIST_ENCODER = RowEncoder([('id', 0), ('username', 1), ('is_admin', 2), ('created_at', 3, DATETIME)])
+
 @jwt_required()
 def get_users():
     """Get all users (requires admin privileges)"""
@@ -83,20 +81,10 @@ def get_users():
     if not user or not user.is_admin:
         return jsonify({'error': 'Admin privileges required'}), 403
     
-    # Get all users
-    users = User.query.all()
-    
-    # Format response
-    result = []
-    for u in users:
-        result.append({
-            'id': u.id,
-            'username': u.username,
-            'is_admin': u.is_admin,
-            'created_at': u.created_at.isoformat()
-        })
+    # Get all users, only the returned columns
+    users = db.session.query(User.id, User.username, User.is_admin, User.created_at).all()
     
-    return jsonify(result), 200
+    return json_response(USER_LIST_ENCODER.dumps(users))
 
 # Function to create initial admin user
 def create_initial_admin(app):
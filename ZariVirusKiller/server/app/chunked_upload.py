@@ -0,0 +1,301 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Bytes read from the request stream per write
+COPY_BUFFER_SIZE = 1024 * 1024
+UPLOAD_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+
+class UploadError(Exception):
+    """
+    An upload request that cannot be applied; carries the HTTP status
+    """
+
+    def __init__(self, message, status=400, offset=None):
+        super().__init__(message)
+        self.status = status
+        self.offset = offset
+
+
+def save_stream(stream, destination, expected_sha256=None):
+    """
+    Streams a file to ``destination`` through a temp file, verifying its
+    SHA-256 when ``expected_sha256`` is given. Returns the hex digest.
+    """
+    directory = os.path.dirname(destination)
+    os.makedirs(directory, exist_ok=True)
+    temp_path = os.path.join(directory, f'.{os.path.basename(destination)}-{uuid.uuid4().hex}.tmp')
+    hasher = hashlib.sha256()
+    try:
+        with open(temp_path, 'wb') as f:
+            for block in iter(lambda: stream.read(COPY_BUFFER_SIZE), b''):
+                f.write(block)
+                hasher.update(block)
+
+        digest = hasher.hexdigest()
+        if expected_sha256 and digest != expected_sha256.lower():
+            raise UploadError('File SHA-256 mismatch', 422)
+        os.replace(temp_path, destination)
+        return digest
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def _lock_file(f):
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_EX)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+
+
+def _unlock_file(f):
+    if fcntl:
+        fcntl.flock(f, fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ChunkedUploadStore:
+    """
+    Resumable uploads written to disk chunk by chunk.
+
+    Each upload has a ``<id>.json`` state file and a ``<id>.part`` data file
+    in ``folder``. The committed offset is the size of the data file, so an
+    upload can be resumed from any worker or after a restart. Writes to an
+    upload hold an exclusive lock on its ``<id>.lock`` file, so workers in
+    different processes cannot append at the same offset. The running
+    SHA-256 is kept in memory per process and rebuilt from the data file
+    when a chunk arrives at a worker that does not have it.
+    """
+
+    def __init__(self, folder, max_size, ttl=24 * 60 * 60):
+        self.folder = folder
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._upload_locks = {}
+        self._hashers = {}
+        os.makedirs(folder, exist_ok=True)
+
+    def create(self, size, sha256, metadata=None):
+        """
+        Starts an upload of ``size`` bytes whose SHA-256 must equal ``sha256``
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise UploadError('Upload size must be a positive integer')
+        if size > self.max_size:
+            raise UploadError(f'Upload exceeds the maximum size of {self.max_size} bytes', 413)
+        sha256 = (sha256 or '').lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise UploadError('A hex SHA-256 of the whole file is required')
+
+        self.expire()
+
+        upload_id = uuid.uuid4().hex
+        state = {
+            'upload_id': upload_id,
+            'size': size,
+            'sha256': sha256,
+            'metadata': metadata or {},
+            'created_at': time.time()
+        }
+        open(self._part_path(upload_id), 'wb').close()
+        self._write_state(state)
+        return self.status(upload_id)
+
+    def status(self, upload_id):
+        state = self._read_state(upload_id)
+        offset = os.path.getsize(self._part_path(upload_id))
+        return {
+            'upload_id': upload_id,
+            'offset': offset,
+            'size': state['size'],
+            'complete': offset == state['size'],
+            'metadata': state['metadata']
+        }
+
+    def append(self, upload_id, offset, stream, length, chunk_sha256=None):
+        """
+        Streams ``length`` bytes from ``stream`` onto the upload at ``offset``.
+
+        The offset must equal the bytes already stored, otherwise a 409 with
+        the current offset tells the client where to resume. When
+        ``chunk_sha256`` is given and does not match, the chunk is discarded.
+        """
+        with self._upload_lock(upload_id):
+            state = self._read_state(upload_id)
+            part_path = self._part_path(upload_id)
+            current = os.path.getsize(part_path)
+
+            if offset != current:
+                raise UploadError('Offset does not match the stored upload', 409, current)
+            if length is None or length <= 0:
+                raise UploadError('Chunk length is required', 411, current)
+            if current + length > state['size']:
+                raise UploadError('Chunk goes past the declared upload size', 413, current)
+
+            hasher = self._hasher(upload_id, current)
+            chunk_hasher = hashlib.sha256()
+            chunk_state = hasher.copy()
+            written = 0
+
+            with open(part_path, 'ab') as f:
+                try:
+                    while written < length:
+                        block = stream.read(min(COPY_BUFFER_SIZE, length - written))
+                        if not block:
+                            break
+                        f.write(block)
+                        chunk_state.update(block)
+                        chunk_hasher.update(block)
+                        written += len(block)
+
+                    if written != length:
+                        raise UploadError('Chunk ended before its declared length', 400, current)
+                    if chunk_sha256 and chunk_hasher.hexdigest() != chunk_sha256.lower():
+                        raise UploadError('Chunk SHA-256 mismatch', 422, current)
+                except BaseException:
+                    # Drop the partial chunk so the upload stays resumable at ``current``
+                    f.truncate(current)
+                    raise
+
+            with self._lock:
+                self._hashers[upload_id] = (current + written, chunk_state)
+            return self.status(upload_id)
+
+    def complete(self, upload_id, destination):
+        """
+        Verifies the whole upload and atomically moves it to ``destination``.
+        Returns the upload metadata.
+        """
+        with self._upload_lock(upload_id):
+            state = self._read_state(upload_id)
+            part_path = self._part_path(upload_id)
+            offset = os.path.getsize(part_path)
+
+            if offset != state['size']:
+                raise UploadError('Upload is incomplete', 409, offset)
+
+            digest = self._hasher(upload_id, offset).hexdigest()
+            if digest != state['sha256']:
+                self._discard(upload_id)
+                raise UploadError('Upload SHA-256 mismatch; the upload was discarded', 422)
+
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            os.replace(part_path, destination)
+            self._discard(upload_id)
+            return dict(state['metadata'], sha256=digest, size=offset)
+
+    def abort(self, upload_id):
+        with self._upload_lock(upload_id):
+            self._read_state(upload_id)
+            self._discard(upload_id)
+
+    def expire(self):
+        """
+        Removes uploads not touched for ``ttl`` seconds
+        """
+        cutoff = time.time() - self.ttl
+        for filename in os.listdir(self.folder):
+            upload_id, extension = os.path.splitext(filename)
+            if not UPLOAD_ID_PATTERN.match(upload_id):
+                continue
+            if extension == '.lock' and not os.path.exists(self._state_path(upload_id)):
+                # Left behind by a discard that raced with a waiting request
+                path = os.path.join(self.folder, filename)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if extension != '.json':
+                continue
+            part_path = self._part_path(upload_id)
+            touched = os.path.getmtime(part_path if os.path.exists(part_path) else os.path.join(self.folder, filename))
+            if touched < cutoff:
+                self._discard(upload_id)
+
+    def _hasher(self, upload_id, offset):
+        with self._lock:
+            cached = self._hashers.get(upload_id)
+        if cached and cached[0] == offset:
+            return cached[1]
+
+        # Another worker took the earlier chunks; rebuild from disk once
+        hasher = hashlib.sha256()
+        with open(self._part_path(upload_id), 'rb') as f:
+            for block in iter(lambda: f.read(COPY_BUFFER_SIZE), b''):
+                hasher.update(block)
+        with self._lock:
+            self._hashers[upload_id] = (offset, hasher)
+        return hasher
+
+    @contextmanager
+    def _upload_lock(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise UploadError('Upload not found', 404)
+        with self._lock:
+            thread_lock = self._upload_locks.setdefault(upload_id, threading.Lock())
+
+        # flock is per open file, so threads of this process still need the thread lock
+        with thread_lock:
+            if not os.path.exists(self._state_path(upload_id)):
+                raise UploadError('Upload not found', 404)
+            with open(self._lock_path(upload_id), 'a+b') as f:
+                _lock_file(f)
+                try:
+                    yield
+                finally:
+                    _unlock_file(f)
+
+    def _read_state(self, upload_id):
+        if not UPLOAD_ID_PATTERN.match(upload_id or ''):
+            raise UploadError('Upload not found', 404)
+        try:
+            with open(self._state_path(upload_id)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            raise UploadError('Upload not found', 404)
+
+    def _write_state(self, state):
+        with open(self._state_path(state['upload_id']), 'w') as f:
+            json.dump(state, f)
+
+    def _discard(self, upload_id):
+        for path in (self._part_path(upload_id), self._state_path(upload_id)):
+            if os.path.exists(path):
+                os.remove(path)
+        try:
+            os.remove(self._lock_path(upload_id))
+        except OSError:
+            # Still open by a waiting request on Windows; expire() removes it later
+            pass
+        with self._lock:
+            self._hashers.pop(upload_id, None)
+            self._upload_locks.pop(upload_id, None)
+
+    def _state_path(self, upload_id):
+        return os.path.join(self.folder, f'{upload_id}.json')
+
+    def _part_path(self, upload_id):
+        return os.path.join(self.folder, f'{upload_id}.part')
+
+    def _lock_path(self, upload_id):
+        return os.path.join(self.folder, f'{upload_id}.lock')
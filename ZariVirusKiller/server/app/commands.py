@@ -0,0 +1,100 @@
+import json
+import os
+import click
+from models import db, VirusSignature
+
+
+def register_commands(app):
+    """
+    Registers the one-off management commands on the Flask CLI
+    """
+
+    @app.cli.command('init-db')
+    def init_db():
+        """Create the database schema and the initial admin user."""
+        db.create_all()
+        
+        from app.hash_partitions import hash_partitions
+        hash_partitions.ensure_schema()
+        
+        from app.signature_search import SignatureSearch
+        SignatureSearch.ensure_index()
+        click.echo('Database schema created')
+
+        from app.auth import create_initial_admin
+        create_initial_admin(app)
+
+    @app.cli.command('create-admin')
+    def create_admin():
+        """Create the initial admin user if no users exist."""
+        from app.auth import create_initial_admin
+        create_initial_admin(app)
+
+    @app.cli.command('build-snapshot')
+    def build_snapshot():
+        """Write the definitions snapshot workers load at boot."""
+        from app.signature_manager import SignatureManager
+        SignatureManager.publish_snapshot()
+        click.echo('Definitions snapshot written')
+
+    @app.cli.command('migrate-hash-signatures')
+    @click.option('--batch-size', default=10000, help='Rows read from virus_signature per batch.')
+    def migrate_hash_signatures(batch_size):
+        """Copy existing hash signatures into the prefix partitions."""
+        from app.hash_partitions import hash_partitions, normalize_hash
+        from app.signature_manager import SignatureManager
+        
+        hash_partitions.ensure_schema()
+        
+        copied = 0
+        skipped = 0
+        last_id = 0
+        while True:
+            batch = VirusSignature.query.filter(
+                VirusSignature.signature_type == 'hash',
+                VirusSignature.id > last_id
+            ).order_by(VirusSignature.id).limit(batch_size).all()
+            if not batch:
+                break
+            
+            for signature in batch:
+                if normalize_hash(signature.hash_value) is None:
+                    skipped += 1
+                elif hash_partitions.add(
+                    signature.hash_value, signature.name, signature.severity, signature_id=signature.id
+                ):
+                    copied += 1
+            last_id = batch[-1].id
+            db.session.expunge_all()
+        
+        click.echo(f'Copied {copied} hash signatures into partitions')
+        if skipped:
+            click.echo(f'Skipped {skipped} signatures whose hash is not a hex digest')
+        
+        success, message = SignatureManager.generate_definitions_file()
+        click.echo(message)
+
+    @app.cli.command('rebuild-search-index')
+    def rebuild_search_index():
+        """Re-index every signature for /api/signatures/search."""
+        from app.signature_search import SignatureSearch
+        indexed = SignatureSearch.ensure_index()
+        click.echo(f'Indexed {indexed} signatures')
+
+    @app.cli.command('compile-patterns')
+    def compile_patterns():
+        """Recompile patterns.json and print the compile report."""
+        from app.signature_manager import SignatureManager
+        success, message = SignatureManager.generate_pattern_definitions_file()
+        click.echo(message)
+        if not success:
+            return
+        
+        with open(os.path.join(app.config['DEFINITIONS_FOLDER'], 'patterns.report.json')) as f:
+            report = json.load(f)
+        click.echo(f"patterns: {report['source_patterns']} -> {report['compiled_patterns']}, "
+                   f"total cost {report['total_cost']}")
+        for dropped in report['dropped']:
+            click.echo(f"dropped {dropped['id']}: {dropped['reason']} {dropped.get('by') or dropped.get('error', '')}")
+        for flagged in report['flagged']:
+            click.echo(f"flagged {flagged['id']}: {', '.join(key for key in flagged if key != 'id')}")
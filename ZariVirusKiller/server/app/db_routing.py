@@ -0,0 +1,186 @@
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, has_app_context, has_request_context, request, current_app
+from sqlalchemy import create_engine, event, text
+
+# Lag reported by a Postgres standby. Zero when it has replayed everything it
+# received, so an idle primary does not make the replica look stale.
+POSTGRES_LAG_QUERY = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+)
+
+
+class ReplicaRouter:
+    """
+    Sends read-only queries to replica databases.
+
+    Queries go to a replica only inside views decorated with ``replica_reads``
+    (or a ``use_replica`` block), only for SELECTs, and only to replicas whose
+    lag is below REPLICA_MAX_LAG. Everything else, including every flush,
+    uses the primary bound by Flask-SQLAlchemy.
+
+    After a request writes, the response carries a fence cookie. Requests
+    holding a fence younger than REPLICA_MAX_LAG read from the primary, so a
+    client always sees its own writes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = []
+        self._cycle = None
+        self._lag = {}
+        self._stats = {'replica_reads': 0, 'primary_reads': 0, 'lagging_skips': 0}
+        self.max_lag = 10.0
+        self.lag_check_interval = 5.0
+        self.fence_cookie = 'replica_fence'
+
+    def init_app(self, app, db):
+        """
+        Creates replica engines from SQLALCHEMY_REPLICA_URIS and hooks the session
+        """
+        self.max_lag = app.config.get('REPLICA_MAX_LAG', self.max_lag)
+        self.lag_check_interval = app.config.get('REPLICA_LAG_CHECK_INTERVAL', self.lag_check_interval)
+        self.fence_cookie = app.config.get('REPLICA_FENCE_COOKIE', self.fence_cookie)
+
+        self._engines = [
+            create_engine(url, pool_pre_ping=True)
+            for url in app.config.get('SQLALCHEMY_REPLICA_URIS', [])
+        ]
+        self._cycle = itertools.cycle(range(len(self._engines))) if self._engines else None
+        # Lag readings belong to the previous engines
+        with self._lock:
+            self._lag = {}
+
+        # The session is shared by every app, so hook it only once
+        if not event.contains(db.session, 'do_orm_execute', self._route):
+            event.listen(db.session, 'do_orm_execute', self._route)
+            event.listen(db.session, 'after_flush', self._mark_write)
+        app.after_request(self._set_fence)
+
+    def metrics(self):
+        """
+        Returns routing counters and the last measured lag of each replica
+        """
+        with self._lock:
+            return dict(
+                self._stats,
+                replicas=[
+                    {'url': engine.url.render_as_string(hide_password=True), 'lag': self._lag.get(index, (None, 0))[0]}
+                    for index, engine in enumerate(self._engines)
+                ]
+            )
+
+    def replica_engine(self):
+        """
+        Picks the next replica whose lag is acceptable, or None for the primary
+        """
+        if not self._engines:
+            return None
+
+        for _ in range(len(self._engines)):
+            with self._lock:
+                index = next(self._cycle)
+
+            if self._replica_lag(index) <= self.max_lag:
+                return self._engines[index]
+
+            with self._lock:
+                self._stats['lagging_skips'] += 1
+
+        return None
+
+    def _replica_lag(self, index):
+        now = time.monotonic()
+        with self._lock:
+            lag, checked_at = self._lag.get(index, (None, 0))
+            if lag is not None and now - checked_at < self.lag_check_interval:
+                return lag
+
+        engine = self._engines[index]
+        try:
+            if engine.dialect.name == 'postgresql':
+                with engine.connect() as connection:
+                    lag = float(connection.execute(POSTGRES_LAG_QUERY).scalar() or 0)
+            else:
+                # Local file replicas have no replication stream to measure
+                lag = 0.0
+        except Exception:
+            lag = float('inf')
+
+        with self._lock:
+            self._lag[index] = (lag, now)
+        return lag
+
+    def _route(self, orm_execute_state):
+        if not orm_execute_state.is_select or 'bind' in orm_execute_state.bind_arguments:
+            return
+        if not has_app_context() or not g.get('_replica_reads'):
+            return
+
+        engine = None if self._fenced() else self.replica_engine()
+        with self._lock:
+            self._stats['replica_reads' if engine is not None else 'primary_reads'] += 1
+
+        if engine is not None:
+            orm_execute_state.bind_arguments['bind'] = engine
+
+    def _fenced(self):
+        if g.get('_wrote'):
+            return True
+        if not has_request_context():
+            return False
+
+        fence = request.cookies.get(self.fence_cookie, type=float)
+        return fence is not None and time.time() - fence < self.max_lag
+
+    def _mark_write(self, session, flush_context):
+        if has_app_context():
+            g._wrote = True
+
+    def _set_fence(self, response):
+        if g.get('_wrote') and self._engines:
+            response.set_cookie(self.fence_cookie, str(time.time()), max_age=int(self.max_lag) + 1, httponly=True)
+        return response
+
+
+@contextmanager
+def use_replica(enabled=True):
+    """
+    Routes SELECTs in the block to a replica (or back to the primary when
+    ``enabled`` is False), restoring the previous routing afterwards
+    """
+    previous = g.get('_replica_reads', False)
+    g._replica_reads = enabled
+    try:
+        yield
+    finally:
+        g._replica_reads = previous
+
+
+def primary_reads():
+    """
+    Forces reads in the block to the primary, e.g. before a write that
+    depends on what was read
+    """
+    return use_replica(False)
+
+
+def replica_reads(view):
+    """
+    Marks a read-only view whose queries may be served by a replica
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not current_app.config.get('SQLALCHEMY_REPLICA_URIS'):
+            return view(*args, **kwargs)
+        with use_replica():
+            return view(*args, **kwargs)
+    return wrapper
+
+
+# Shared router for the whole process, configured by create_app
+replica_router = ReplicaRouter()
@@ -0,0 +1,17 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db
+
+
+def dialect_insert(table, dialect=None):
+    """
+    Returns an INSERT construct supporting ON CONFLICT for ``dialect``, by
+    default the one of the bound database
+    """
+    dialect = dialect or db.engine.dialect.name
+
+    if dialect == 'postgresql':
+        return postgresql.insert(table)
+    if dialect == 'sqlite':
+        return sqlite.insert(table)
+
+    raise ValueError(f'Upserts are not supported on {dialect}')
@@ -0,0 +1,126 @@
+import math
+import threading
+import time
+import random
+
+
+class DefinitionsNotifier:
+    """
+    Tracks the latest published definitions versions and wakes up clients
+    waiting on them (long-poll and Server-Sent Events).
+
+    Publishes made in this process wake waiters immediately. Publishes made by
+    other worker processes are picked up through the optional ``refresh``
+    callable, which waiters call every ``refresh_interval`` seconds.
+    """
+
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._versions = {}
+        self._sequence = 0
+        self._last_refresh = 0.0
+
+    @property
+    def sequence(self):
+        """
+        Monotonic counter bumped on every version change seen by this process
+        """
+        return self._sequence
+
+    def versions(self):
+        """
+        Returns a snapshot of the known versions keyed by update type
+        """
+        with self._condition:
+            return dict(self._versions)
+
+    def publish(self, update_type, version):
+        """
+        Records a new definitions build and wakes every waiting client
+        """
+        with self._condition:
+            if self._versions.get(update_type) == version:
+                return False
+            self._versions[update_type] = version
+            self._sequence += 1
+            self._condition.notify_all()
+            return True
+
+    def seed(self, versions):
+        """
+        Loads the versions known at boot without counting them as a change
+        """
+        with self._condition:
+            for update_type, version in versions.items():
+                if version and update_type not in self._versions:
+                    self._versions[update_type] = version
+            self._last_refresh = time.monotonic()
+
+    def refresh(self, loader, min_interval=0.0):
+        """
+        Pulls versions published by other processes through ``loader``.
+
+        ``loader`` returns a dict of update type to version. It is called at
+        most once per ``min_interval`` seconds across all waiters.
+        """
+        now = time.monotonic()
+        with self._condition:
+            if now - self._last_refresh < min_interval:
+                return
+            self._last_refresh = now
+
+        for update_type, version in loader().items():
+            if version:
+                self.publish(update_type, version)
+
+    def wait_for_change(self, known, timeout, loader=None, refresh_interval=5.0):
+        """
+        Blocks until a version in ``known`` changes or ``timeout`` expires.
+
+        Returns the current versions when they changed, or None on timeout.
+        """
+        # A NaN deadline would make every wait below block forever
+        if not math.isfinite(timeout):
+            raise ValueError('timeout must be finite')
+        deadline = time.monotonic() + max(timeout, 0.0)
+
+        while True:
+            with self._condition:
+                current = dict(self._versions)
+                if self._changed(known, current):
+                    return current
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+
+                wait_time = min(remaining, refresh_interval) if loader else remaining
+                self._condition.wait(wait_time)
+
+            if loader:
+                self.refresh(loader, min_interval=refresh_interval)
+
+    @staticmethod
+    def _changed(known, current):
+        # Clients only wait on the types they told us about; a client that
+        # sent nothing gets whatever is current right away
+        if not known:
+            return any(current.values())
+        for update_type, version in current.items():
+            if version and update_type in known and known[update_type] != version:
+                return True
+        return False
+
+
+def download_jitter(max_jitter):
+    """
+    Picks the randomized delay a client should wait before downloading a new
+    build, so a publish does not turn into a synchronized download stampede
+    """
+    if max_jitter <= 0:
+        return 0.0
+    return round(random.uniform(0, max_jitter), 3)
+
+
+# Shared instance for the whole process
+definitions_notifier = DefinitionsNotifier()
@@ -0,0 +1,136 @@
+"""
+Bloom filter of the hash signatures, downloaded by clients as a prefilter.
+
+A client checks each file hash against the filter and only calls
+/api/check-file (or the full hash list) when the filter says "maybe";
+"no" answers are always right.
+
+Binary format, version 1 (all integers little-endian)::
+
+    offset  size  field
+    0       4     magic b"ZBF1"
+    4       2     format version (1)
+    6       2     k, number of bit positions per hash
+    8       8     m, number of bits
+    16      8     n, number of hashes added
+    24      8     target false-positive rate (IEEE 754 double)
+    32      m/8   bit array; bit i is (byte[i >> 3] >> (i & 7)) & 1
+
+Bit positions of a hash: d = SHA-256 of the lowercase hex hash as ASCII,
+h1 = uint64 of d[0:8], h2 = uint64 of d[8:16] | 1, and for i in 0..k-1
+position_i = (h1 + i * h2) mod m. Hashing the hex string keeps the filter
+independent of the digest type (MD5, SHA-1 or SHA-256).
+"""
+import hashlib
+import math
+import struct
+
+FILTER_MAGIC = b'ZBF1'
+FILTER_FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHQQd')
+MAX_HASH_FUNCTIONS = 32
+
+
+def filter_parameters(count, fp_rate):
+    """
+    Returns (bits, hash_functions) for ``count`` hashes at ``fp_rate``
+    """
+    if not 0 < fp_rate < 1:
+        raise ValueError('False-positive rate must be between 0 and 1')
+
+    count = max(count, 1)
+    bits = math.ceil(-count * math.log(fp_rate) / (math.log(2) ** 2))
+    bits = max(64, (bits + 63) // 64 * 64)
+    hash_functions = max(1, min(MAX_HASH_FUNCTIONS, round(bits / count * math.log(2))))
+    return bits, hash_functions
+
+
+def _positions(hash_value, bits, hash_functions):
+    digest = hashlib.sha256(hash_value.strip().lower().encode('ascii')).digest()
+    h1, h2 = struct.unpack_from('<QQ', digest)
+    h2 |= 1
+    return [(h1 + i * h2) % bits for i in range(hash_functions)]
+
+
+class HashFilter:
+    """
+    Reference implementation of the definitions Bloom filter
+    """
+
+    def __init__(self, bits, hash_functions, fp_rate, count=0, data=None):
+        if bits % 8:
+            raise ValueError('Bit count must be a multiple of 8')
+        self.bits = bits
+        self.hash_functions = hash_functions
+        self.fp_rate = fp_rate
+        self.count = count
+        self.data = bytearray(data) if data is not None else bytearray(bits // 8)
+
+    @classmethod
+    def for_capacity(cls, count, fp_rate):
+        bits, hash_functions = filter_parameters(count, fp_rate)
+        return cls(bits, hash_functions, fp_rate)
+
+    def add(self, hash_value):
+        data = self.data
+        for position in _positions(hash_value, self.bits, self.hash_functions):
+            data[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def update(self, other):
+        """
+        ORs in a filter built with the same bits and hash functions, e.g. the
+        filter of another hash partition
+        """
+        if (other.bits, other.hash_functions) != (self.bits, self.hash_functions):
+            raise ValueError('Hash filters must have the same size and hash functions to be merged')
+        merged = int.from_bytes(self.data, 'little') | int.from_bytes(other.data, 'little')
+        self.data = bytearray(merged.to_bytes(len(self.data), 'little'))
+        self.count += other.count
+
+    def __contains__(self, hash_value):
+        data = self.data
+        for position in _positions(hash_value, self.bits, self.hash_functions):
+            if not data[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def expected_fp_rate(self):
+        """
+        False-positive rate implied by the actual number of hashes added
+        """
+        if not self.count:
+            return 0.0
+        return (1 - math.exp(-self.hash_functions * self.count / self.bits)) ** self.hash_functions
+
+    def header(self):
+        return HEADER.pack(FILTER_MAGIC, FILTER_FORMAT_VERSION, self.hash_functions,
+                           self.bits, self.count, self.fp_rate)
+
+    def write(self, f):
+        f.write(self.header())
+        f.write(self.data)
+
+    def to_bytes(self):
+        return self.header() + bytes(self.data)
+
+    @classmethod
+    def from_bytes(cls, payload):
+        """
+        Parses a filter; raises ValueError on an unknown or corrupt file
+        """
+        if len(payload) < HEADER.size:
+            raise ValueError('Truncated hash filter')
+        magic, version, hash_functions, bits, count, fp_rate = HEADER.unpack_from(payload)
+        if magic != FILTER_MAGIC:
+            raise ValueError('Not a hash filter')
+        if version != FILTER_FORMAT_VERSION:
+            raise ValueError(f'Unsupported hash filter version {version}')
+        if len(payload) != HEADER.size + bits // 8 or bits % 8 or not hash_functions:
+            raise ValueError('Corrupt hash filter')
+        return cls(bits, hash_functions, fp_rate, count, payload[HEADER.size:])
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            return cls.from_bytes(f.read())
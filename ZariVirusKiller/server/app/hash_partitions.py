@@ -0,0 +1,246 @@
+import os
+import re
+import threading
+from contextlib import contextmanager
+from sqlalchemy import MetaData, Table, Column, String, Integer, create_engine, select, delete, func, text
+from models import db
+from app.db_utils import dialect_insert
+from app.json_stream import STREAM_BATCH_SIZE, stream_rows
+
+metadata = MetaData()
+
+# Hex digests from MD5 (32 digits) to SHA-256 (64), the width of hash_value
+HASH_PATTERN = re.compile(r'^[0-9a-f]{32,64}$')
+
+# Hash signatures keyed by digest prefix. On Postgres this is a table
+# partitioned by LIST (prefix); locally each prefix lives in its own SQLite file.
+hash_signature = Table(
+    'hash_signature', metadata,
+    Column('prefix', String(4), primary_key=True),
+    Column('hash_value', String(64), primary_key=True),
+    Column('signature_id', Integer, nullable=True),
+    Column('name', String(128), nullable=False),
+    Column('severity', String(16), nullable=False, default='medium'),
+    postgresql_partition_by='LIST (prefix)'
+)
+
+# Bumped on every write to a partition, so builds can skip unchanged ones
+hash_partition_state = Table(
+    'hash_partition_state', metadata,
+    Column('prefix', String(4), primary_key=True),
+    Column('generation', Integer, nullable=False, default=0)
+)
+
+
+def normalize_hash(hash_value):
+    """
+    Lowercases a hex digest; returns None when the value is not one
+    """
+    if not isinstance(hash_value, str):
+        return None
+    hash_value = hash_value.lower()
+    return hash_value if HASH_PATTERN.match(hash_value) else None
+
+
+class HashPartitionStore:
+    """
+    Stores hash signatures partitioned by the first hex digits of the digest.
+
+    Every lookup and every definitions build works on a single partition.
+    With HASH_PARTITION_PREFIX_LENGTH = 1 there are 16 partitions, with 2
+    there are 256.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._shards = {}
+        self.prefix_length = 1
+        self.folder = None
+        self.backend = None
+
+    def init_app(self, app):
+        self.prefix_length = app.config.get('HASH_PARTITION_PREFIX_LENGTH', self.prefix_length)
+        if app.config['HASH_PARTITION_FOLDER'] != self.folder:
+            # Shard engines belong to the previous folder
+            with self._lock:
+                for engine in self._shards.values():
+                    engine.dispose()
+                self._shards = {}
+        self.folder = app.config['HASH_PARTITION_FOLDER']
+        self.backend = app.config.get('HASH_PARTITION_BACKEND') or (
+            'postgresql' if app.config['SQLALCHEMY_DATABASE_URI'].startswith('postgresql') else 'sqlite'
+        )
+
+    def prefixes(self):
+        """
+        Lists every partition prefix, e.g. '0' to 'f'
+        """
+        width = self.prefix_length
+        return [format(value, f'0{width}x') for value in range(16 ** width)]
+
+    def partition_of(self, hash_value):
+        return hash_value[:self.prefix_length].lower()
+
+    @staticmethod
+    def _checked(hash_value):
+        normalized = normalize_hash(hash_value)
+        if normalized is None:
+            raise ValueError(f'Invalid hash value: {hash_value!r}')
+        return normalized
+
+    def ensure_schema(self):
+        """
+        Creates the partitioned table and one partition per prefix
+        """
+        if self.backend == 'postgresql':
+            metadata.create_all(db.engine)
+            with db.engine.begin() as connection:
+                for prefix in self.prefixes():
+                    connection.execute(text(
+                        f"CREATE TABLE IF NOT EXISTS hash_signature_p{prefix} "
+                        f"PARTITION OF hash_signature FOR VALUES IN ('{prefix}')"
+                    ))
+        else:
+            for prefix in self.prefixes():
+                metadata.create_all(self._shard_engine(prefix))
+
+    def add(self, hash_value, name, severity='medium', signature_id=None):
+        """
+        Adds a hash signature; returns False if the hash is already known
+        """
+        hash_value = self._checked(hash_value)
+        prefix = self.partition_of(hash_value)
+
+        with self._connection(prefix, write=True) as connection:
+            # A concurrent insert of the same hash loses here instead of
+            # failing on the primary key
+            inserted = connection.execute(
+                self._insert(hash_signature).values(
+                    prefix=prefix,
+                    hash_value=hash_value,
+                    signature_id=signature_id,
+                    name=name,
+                    severity=severity
+                ).on_conflict_do_nothing(index_elements=['prefix', 'hash_value'])
+            ).rowcount
+            if inserted:
+                self._bump_generation(connection, prefix)
+
+        return bool(inserted)
+
+    def lookup(self, hash_value):
+        """
+        Finds the signature for a hash, reading only its partition
+        """
+        hash_value = self._checked(hash_value)
+        prefix = self.partition_of(hash_value)
+
+        with self._connection(prefix) as connection:
+            row = connection.execute(
+                select(
+                    hash_signature.c.signature_id,
+                    hash_signature.c.name,
+                    hash_signature.c.severity
+                ).where(
+                    hash_signature.c.prefix == prefix,
+                    hash_signature.c.hash_value == hash_value
+                )
+            ).first()
+
+        if not row:
+            return None
+
+        return {'signature_id': row.signature_id, 'name': row.name, 'severity': row.severity}
+
+    def remove(self, hash_value):
+        """
+        Deletes a hash signature; returns False if the hash was not stored
+        """
+        hash_value = self._checked(hash_value)
+        prefix = self.partition_of(hash_value)
+
+        with self._connection(prefix, write=True) as connection:
+            deleted = connection.execute(
+                delete(hash_signature).where(
+                    hash_signature.c.prefix == prefix,
+                    hash_signature.c.hash_value == hash_value
+                )
+            ).rowcount
+            if deleted:
+                self._bump_generation(connection, prefix)
+
+        return bool(deleted)
+
+    def partition_rows(self, prefix, batch_size=STREAM_BATCH_SIZE):
+        """
+        Streams the (name, hash_value) rows of one partition from a
+        server-side cursor
+        """
+        with self._connection(prefix) as connection:
+            yield from stream_rows(
+                connection,
+                select(hash_signature.c.name, hash_signature.c.hash_value)
+                .where(hash_signature.c.prefix == prefix)
+                .order_by(hash_signature.c.hash_value),
+                batch_size
+            )
+
+    def generation(self, prefix):
+        with self._connection(prefix) as connection:
+            return connection.execute(
+                select(hash_partition_state.c.generation).where(hash_partition_state.c.prefix == prefix)
+            ).scalar() or 0
+
+    def count(self):
+        if self.backend == 'postgresql':
+            return db.session.execute(select(func.count()).select_from(hash_signature)).scalar()
+
+        total = 0
+        for prefix in self.prefixes():
+            with self._connection(prefix) as connection:
+                total += connection.execute(select(func.count()).select_from(hash_signature)).scalar()
+        return total
+
+    def _bump_generation(self, connection, prefix):
+        statement = self._insert(hash_partition_state).values(prefix=prefix, generation=1)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=['prefix'],
+            set_={'generation': hash_partition_state.c.generation + 1}
+        ))
+
+    def _insert(self, table):
+        # SQLite shards are not bound to db.engine, so pick the dialect by backend
+        return dialect_insert(table, 'postgresql' if self.backend == 'postgresql' else 'sqlite')
+
+    @contextmanager
+    def _connection(self, prefix, write=False):
+        if self.backend == 'postgresql':
+            # Goes through the session so reads follow replica routing
+            try:
+                yield db.session
+                if write:
+                    db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+        else:
+            engine = self._shard_engine(prefix)
+            with (engine.begin() if write else engine.connect()) as connection:
+                yield connection
+
+    def _shard_engine(self, prefix):
+        with self._lock:
+            engine = self._shards.get(prefix)
+            if engine is None:
+                os.makedirs(self.folder, exist_ok=True)
+                path = os.path.join(self.folder, f'hash_{prefix}.sqlite')
+                is_new = not os.path.exists(path)
+                engine = create_engine(f'sqlite:///{path}')
+                if is_new:
+                    metadata.create_all(engine)
+                self._shards[prefix] = engine
+            return engine
+
+
+# Shared store for the whole process, configured by create_app
+hash_partitions = HashPartitionStore()
@@ -0,0 +1,59 @@
+from datetime import datetime
+from sqlalchemy import func
+from models import db, DeviceHeartbeat
+from app.db_utils import dialect_insert
+from app.write_behind import WriteBehindBuffer
+
+FIELD_LENGTHS = {
+    'device_id': DeviceHeartbeat.device_id.type.length,
+    'license_key': DeviceHeartbeat.license_key.type.length,
+    'client_version': DeviceHeartbeat.client_version.type.length
+}
+
+
+def write_heartbeats(rows):
+    """
+    Upserts a batch of buffered heartbeats in a single statement
+    """
+    table = DeviceHeartbeat.__table__
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.device_id],
+        set_={
+            'last_seen': stmt.excluded.last_seen,
+            'client_version': func.coalesce(stmt.excluded.client_version, table.c.client_version),
+            'license_key': func.coalesce(stmt.excluded.license_key, table.c.license_key)
+        }
+    )
+
+    db.session.execute(stmt, rows)
+    db.session.commit()
+
+
+def record_heartbeat(device_id, license_key=None, client_version=None):
+    """
+    Queues a last-seen update for a device without touching the database.
+    Raises ValueError for values that do not fit the DeviceHeartbeat columns,
+    which would otherwise fail the whole batch at flush time.
+    """
+    for field, value in (('device_id', device_id), ('license_key', license_key),
+                         ('client_version', client_version)):
+        if value is None and field != 'device_id':
+            continue
+        if not isinstance(value, str) or not value:
+            raise ValueError(f'{field} must be a non-empty string')
+        if len(value) > FIELD_LENGTHS[field]:
+            raise ValueError(f'{field} is longer than {FIELD_LENGTHS[field]} characters')
+
+    now = datetime.utcnow()
+    return heartbeats.record(device_id, {
+        'device_id': device_id,
+        'license_key': license_key,
+        'client_version': client_version,
+        'first_seen': now,
+        'last_seen': now
+    })
+
+
+# Shared buffer for the whole process, configured by create_app
+heartbeats = WriteBehindBuffer(write_heartbeats)
@@ -0,0 +1,101 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Rows fetched per round trip when streaming from a server-side cursor
+STREAM_BATCH_SIZE = 2000
+
+# Read once at import: os.umask can only be read by setting it
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+@contextmanager
+def atomic_file(path, mode='w'):
+    """
+    Opens a temp file next to ``path`` and renames it over ``path`` when the
+    block completes. Readers see either the old file or the complete new one.
+    The file keeps the mode of the file it replaces, or gets the usual
+    ``0o666 & ~umask`` instead of mkstemp's 0600.
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}-', suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        try:
+            file_mode = os.stat(path).st_mode & 0o7777
+        except FileNotFoundError:
+            file_mode = 0o666 & ~_UMASK
+        os.chmod(temp_path, file_mode)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_json_object(f, items):
+    """
+    Streams ``(key, value)`` pairs as a JSON object, one member per line.
+    Returns the number of members written.
+    """
+    count = 0
+    f.write('{')
+    for key, value in items:
+        f.write(',\n' if count else '\n')
+        f.write(json.dumps(str(key)))
+        f.write(': ')
+        f.write(json.dumps(value))
+        count += 1
+    f.write('\n}\n' if count else '}\n')
+    return count
+
+
+def write_json_array(f, items, key=None):
+    """
+    Streams ``items`` as a JSON array, one element per line, optionally
+    wrapped as ``{"<key>": [...]}``. Returns the number of elements written.
+    """
+    count = 0
+    if key is not None:
+        f.write('{' + json.dumps(key) + ': ')
+    f.write('[')
+    for item in items:
+        f.write(',\n' if count else '\n')
+        f.write(json.dumps(item))
+        count += 1
+    f.write('\n]' if count else ']')
+    f.write('}\n' if key is not None else '\n')
+    return count
+
+
+def iter_json_object_members(path):
+    """
+    Yields the raw ``"key": value`` members of a JSON object file that has
+    one member per line (as written by ``write_json_object`` or by
+    ``json.dump(..., indent=2)`` for flat objects), without parsing it whole.
+    """
+    with open(path) as f:
+        for line in f:
+            member = line.strip().rstrip(',')
+            if member in ('', '{', '}', '{}'):
+                continue
+            yield member
+
+
+def stream_rows(session_or_connection, statement, batch_size=STREAM_BATCH_SIZE):
+    """
+    Executes ``statement`` on a server-side cursor and yields its rows,
+    keeping at most ``batch_size`` rows buffered
+    """
+    # yield_per turns on stream_results and also stops the ORM from
+    # buffering the whole result when the statement selects ORM columns
+    result = session_or_connection.execute(statement.execution_options(yield_per=batch_size))
+    try:
+        for partition in result.partitions(batch_size):
+            yield from partition
+    finally:
+        result.close()
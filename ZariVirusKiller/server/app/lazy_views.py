@@ -0,0 +1,41 @@
+from werkzeug.utils import import_string, cached_property
+
+
+class LazyView:
+    """
+    View that imports its module on first call instead of at app creation
+    """
+
+    def __init__(self, import_name):
+        self.__module__, self.__name__ = import_name.rsplit('.', 1)
+        self.import_name = import_name
+
+    @cached_property
+    def view(self):
+        return import_string(self.import_name)
+
+    def __call__(self, *args, **kwargs):
+        return self.view(*args, **kwargs)
+
+
+# Admin-only routes, declared only here. Their modules are imported by the
+# first admin request, keeping them off the worker boot path.
+ADMIN_VIEWS = [
+    ('/auth/login', 'app.auth.login', ['POST']),
+    ('/auth/register', 'app.auth.register', ['POST']),
+    ('/auth/users', 'app.auth.get_users', ['GET']),
+    ('/api/license/licenses', 'app.license_manager.get_licenses', ['GET']),
+    ('/api/license/licenses', 'app.license_manager.create_license', ['POST']),
+    ('/api/license/licenses/<int:license_id>', 'app.license_manager.delete_license', ['DELETE']),
+    ('/api/license/licenses/revoke/<int:license_id>', 'app.license_manager.revoke_license', ['POST']),
+]
+
+
+def register_admin_views(app):
+    """
+    Registers the admin routes as lazily imported views
+    """
+    for rule, import_name, methods in ADMIN_VIEWS:
+        module, name = import_name.rsplit('.', 1)
+        endpoint = f"{module.rsplit('.', 1)[-1]}_{name}"
+        app.add_url_rule(rule, endpoint=endpoint, view_func=LazyView(import_name), methods=methods)
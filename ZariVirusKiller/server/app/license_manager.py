@@ -1,14 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import db, LicenseKey
+from app.serialization import RowEncoder, DATETIME, json_response
 from datetime import datetime, timedelta
 import uuid
 import string
 import random
 
-license_bp = Blueprint('license', __name__)
+LICENSE_LIST_ENCODER = RowEncoder([
+    ('id', 0),
+    ('key', 1),
+    ('created_at', 2, DATETIME),
+    ('expires_at', 3, DATETIME),
+    ('device_id', 4),
+    ('is_active', 5),
+    ('is_used', 6)
+])
 
-@license_bp.route('/licenses', methods=['GET'])
 @jwt_required()
 def get_licenses():
     """Get all license keys"""
@@ -16,36 +24,29 @@ def get_licenses():
         # Get query parameters
         status = request.args.get('status')  # 'active', 'expired', 'unused'
         
-        # Build query
-        query = LicenseKey.query
+        # Only the returned columns, as tuples; the flags are computed by the database
+        now = datetime.utcnow()
+        query = db.session.query(
+            LicenseKey.id,
+            LicenseKey.key,
+            LicenseKey.created_at,
+            LicenseKey.expires_at,
+            LicenseKey.device_id,
+            LicenseKey.expires_at > now,
+            LicenseKey.device_id != None
+        )
         
         if status == 'active':
-            query = query.filter(LicenseKey.expires_at > datetime.utcnow())
+            query = query.filter(LicenseKey.expires_at > now)
         elif status == 'expired':
-            query = query.filter(LicenseKey.expires_at <= datetime.utcnow())
+            query = query.filter(LicenseKey.expires_at <= now)
         elif status == 'unused':
             query = query.filter(LicenseKey.device_id == None)
         
-        licenses = query.all()
-        
-        # Format response
-        result = []
-        for license in licenses:
-            result.append({
-                'id': license.id,
-                'key': license.key,
-                'created_at': license.created_at.isoformat(),
-                'expires_at': license.expires_at.isoformat(),
-                'device_id': license.device_id,
-                'is_active': license.expires_at > datetime.utcnow(),
-                'is_used': license.device_id is not None
-            })
-        
-        return jsonify(result), 200
+        return json_response(LICENSE_LIST_ENCODER.dumps(query.all()))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
-@license_bp.route('/licenses', methods=['POST'])
 @jwt_required()
 def create_license():
     """Create a new license key"""
@@ -79,7 +80,6 @@ def create_license():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@license_bp.route('/licenses/<int:license_id>', methods=['DELETE'])
 @jwt_required()
 def delete_license(license_id):
     """Delete a license key"""
@@ -97,7 +97,6 @@ def delete_license(license_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
-@license_bp.route('/licenses/revoke/<int:license_id>', methods=['POST'])
 @jwt_required()
 def revoke_license(license_id):
     """Revoke a license by clearing its device ID"""
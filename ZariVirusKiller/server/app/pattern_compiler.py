@@ -0,0 +1,434 @@
+import re
+
+# Patterns with fewer fixed bytes than this match random data too often
+MIN_PATTERN_BYTES = 4
+# Signatures expected to match more often than this per MB of scanned data are flagged
+MAX_MATCHES_PER_MB = 1e-3
+# Bytes that fill padding, alignment and text, so runs of them select nothing
+COMMON_BYTES = frozenset(b'\x00\xff\x90\xcc\x20')
+SEVERITY_RANK = {'low': 0, 'medium': 1, 'high': 2, 'critical': 3}
+
+# Relative client cost: an "any" offset pattern reads the whole file, a fixed
+# offset pattern reads one 4 KB block, and a regex decodes every block
+FULL_SCAN_COST = 1.0
+FIXED_READ_COST = 0.01
+REGEX_COST = 4.0
+SCANNED_BYTES = 1024 * 1024
+
+HEX_SEPARATORS = re.compile(r'[\s:,\-]|0x|\\x', re.IGNORECASE)
+HEX_PATTERN = re.compile(r'^(?:[0-9A-F]{2}|\?\?)+$')
+WILDCARD = None
+
+
+class Pattern:
+    """
+    A pattern in canonical form.
+
+    ``data`` holds the bytes to match as a tuple, with WILDCARD for ``??``
+    positions in hex patterns. Regex patterns keep their source in ``regex``.
+    """
+
+    __slots__ = ('kind', 'offset', 'data', 'regex')
+
+    def __init__(self, kind, offset, data=(), regex=None):
+        self.kind = kind
+        self.offset = offset
+        self.data = data
+        self.regex = regex
+
+    @property
+    def key(self):
+        return (self.kind if self.kind == 'regex' else 'bytes', self.offset, self.data, self.regex)
+
+    @property
+    def fixed_bytes(self):
+        return sum(1 for value in self.data if value is not WILDCARD)
+
+    @property
+    def exact(self):
+        return self.kind != 'regex' and WILDCARD not in self.data
+
+    def implies(self, other):
+        """
+        True when a file containing this pattern always contains ``other``
+        """
+        if self.key == other.key:
+            return True
+        if not (self.exact and other.exact) or len(other.data) > len(self.data):
+            return False
+
+        if other.offset is None:
+            return _contains(self.data, other.data)
+        if self.offset is None or self.offset > other.offset:
+            return False
+        start = other.offset - self.offset
+        return self.data[start:start + len(other.data)] == other.data
+
+    def match_probability(self):
+        """
+        Chance of a match in SCANNED_BYTES of random data
+        """
+        if self.kind == 'regex':
+            return 0.01
+        per_position = 256.0 ** -self.fixed_bytes
+        if self.offset is not None:
+            return per_position
+        return min(1.0, per_position * SCANNED_BYTES)
+
+    def cost(self):
+        if self.kind == 'regex':
+            return REGEX_COST
+        return FIXED_READ_COST if self.offset is not None else FULL_SCAN_COST
+
+    def flags(self, min_bytes=MIN_PATTERN_BYTES):
+        if self.kind == 'regex':
+            return []
+        flags = []
+        if self.fixed_bytes < min_bytes and self.offset is None:
+            flags.append('short')
+        if all(value is WILDCARD or value in COMMON_BYTES for value in self.data):
+            flags.append('common_bytes')
+        return flags
+
+    def check_client_support(self):
+        """
+        Raises ValueError for patterns the clients cannot scan: neither
+        scanner parses ``??`` wildcards in hex patterns
+        """
+        if self.kind == 'hex' and WILDCARD in self.data:
+            raise ValueError('Wildcard bytes (??) in hex patterns are not supported by clients')
+
+    def to_json(self):
+        """
+        Returns the pattern in the client definitions format. Hex and ASCII
+        patterns carry ``hex_pattern`` / ``ascii_pattern`` for
+        BetaPatternScanner and the same text in ``value`` for PatternScanner.
+        """
+        offset = 'any' if self.offset is None else str(self.offset)
+        if self.kind == 'regex':
+            return {'type': 'regex', 'offset': offset, 'value': self.regex}
+        if self.kind == 'ascii':
+            value = bytes(self.data).decode('ascii')
+            return {'type': 'ascii', 'offset': offset, 'ascii_pattern': value, 'value': value,
+                    'match_type': 'contains'}
+        value = ''.join('??' if byte is WILDCARD else format(byte, '02X') for byte in self.data)
+        return {'type': 'hex', 'offset': offset, 'hex_pattern': value, 'value': value, 'match_type': 'exact'}
+
+
+def _contains(data, part):
+    if not part:
+        return True
+    first = part[0]
+    for start in range(len(data) - len(part) + 1):
+        if data[start] == first and data[start:start + len(part)] == part:
+            return True
+    return False
+
+
+def normalize_pattern(pattern):
+    """
+    Converts one pattern into canonical form; raises ValueError when invalid.
+
+    Accepts the ``hex_pattern`` / ``ascii_pattern`` fields clients use as
+    well as the ``{"type", "value", "offset"}`` form. Hex is case- and
+    separator-insensitive (``4d 5a``, ``4D:5A``, ``0x4d0x5a``).
+    """
+    if not isinstance(pattern, dict):
+        raise ValueError('Each pattern must be an object')
+
+    offset = pattern.get('offset', 'any')
+    if offset in (None, '', 'any'):
+        offset = None
+    else:
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid pattern offset: {offset!r}')
+        if offset < 0:
+            raise ValueError(f'Invalid pattern offset: {offset!r}')
+
+    kind = pattern.get('type')
+    if pattern.get('hex_pattern') is not None:
+        kind, value = 'hex', pattern['hex_pattern']
+    elif pattern.get('ascii_pattern') is not None:
+        kind, value = 'ascii', pattern['ascii_pattern']
+    else:
+        value = pattern.get('value')
+
+    if not isinstance(value, str) or not value:
+        raise ValueError('Pattern value is required')
+
+    if kind == 'regex':
+        try:
+            re.compile(value)
+        except re.error as e:
+            raise ValueError(f'Invalid regex pattern: {e}')
+        return Pattern('regex', offset, regex=value)
+
+    if kind == 'ascii':
+        if not value.isascii():
+            raise ValueError('ASCII patterns must only contain ASCII characters')
+        return Pattern('ascii', offset, tuple(value.encode('ascii')))
+
+    if kind == 'hex':
+        value = HEX_SEPARATORS.sub('', value).upper()
+        if not HEX_PATTERN.match(value):
+            raise ValueError(f'Invalid hex pattern: {value!r}')
+        data = tuple(WILDCARD if value[i] == '?' else int(value[i:i + 2], 16) for i in range(0, len(value), 2))
+        if all(byte is WILDCARD for byte in data):
+            raise ValueError('Hex pattern has no fixed bytes')
+        return Pattern('hex', offset, data)
+
+    raise ValueError(f'Unknown pattern type: {kind!r}')
+
+
+def normalize_patterns(patterns):
+    """
+    Normalizes a list of patterns into their JSON form; raises ValueError
+    """
+    if not patterns or not isinstance(patterns, list):
+        raise ValueError('Invalid patterns format')
+    result = []
+    for pattern in patterns:
+        pattern = normalize_pattern(pattern)
+        pattern.check_client_support()
+        result.append(pattern.to_json())
+    return result
+
+
+class CompiledSignature:
+    __slots__ = ('order', 'id', 'name', 'severity', 'logic', 'patterns', 'removed_patterns')
+
+    def __init__(self, order, id, name, severity, logic, patterns, removed_patterns=0):
+        self.order = order
+        self.id = id
+        self.name = name
+        self.severity = severity
+        self.logic = logic
+        self.patterns = patterns
+        self.removed_patterns = removed_patterns
+
+    @property
+    def rank(self):
+        return SEVERITY_RANK.get(self.severity, SEVERITY_RANK['medium'])
+
+    def fires_whenever(self, other):
+        """
+        True when this signature matches every file ``other`` matches
+        """
+        # Sets of patterns guaranteed present when ``other`` matches
+        if other.logic == 'all':
+            present_sets = [other.patterns]
+        else:
+            present_sets = [[pattern] for pattern in other.patterns]
+
+        for present in present_sets:
+            implied = [any(p.implies(q) for p in present) for q in self.patterns]
+            if not (all(implied) if self.logic == 'all' else any(implied)):
+                return False
+        return True
+
+    def match_probability(self):
+        probabilities = [pattern.match_probability() for pattern in self.patterns]
+        if self.logic == 'all':
+            result = 1.0
+            for probability in probabilities:
+                result *= probability
+            return result
+        return min(1.0, sum(probabilities))
+
+    def cost(self):
+        """
+        Expected client scan cost; "all" signatures stop at the first miss
+        """
+        if self.logic != 'all':
+            return sum(pattern.cost() for pattern in self.patterns)
+
+        total = 0.0
+        reached = 1.0
+        for pattern in self.patterns:
+            total += reached * pattern.cost()
+            reached *= pattern.match_probability()
+        return total
+
+    def to_json(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'severity': self.severity,
+            'logic': self.logic,
+            'patterns': [pattern.to_json() for pattern in self.patterns],
+            'cost': round(self.cost(), 4)
+        }
+
+
+class PatternCompiler:
+    """
+    Compiles pattern signatures into the definitions clients scan with.
+
+    Signatures are added one at a time and compiled together, since
+    duplicates and subsumption can only be found across the whole set. Only
+    the canonical patterns are kept in memory. ``compile`` then:
+
+    - drops duplicate patterns, and patterns made redundant by another
+      pattern of the same signature
+    - orders "all" patterns so fixed offsets and the most selective
+      patterns are checked first, as clients stop at the first miss
+    - drops signatures that another selective signature of at least the
+      same severity matches whenever they match (including exact duplicates)
+    - flags short and common-byte patterns and signatures likely to match
+      clean files
+    """
+
+    def __init__(self, min_bytes=MIN_PATTERN_BYTES, max_matches_per_mb=MAX_MATCHES_PER_MB):
+        self.min_bytes = min_bytes
+        self.max_matches_per_mb = max_matches_per_mb
+        self.signatures = []
+        self.invalid = []
+        self.source_patterns = 0
+        self._index_cache = None
+
+    def add(self, signature_id, name, severity, patterns, logic='all'):
+        """
+        Adds a signature; invalid signatures are recorded and skipped
+        """
+        self._index_cache = None
+        self.source_patterns += len(patterns or [])
+        try:
+            if not patterns:
+                raise ValueError('Signature has no patterns')
+            if logic not in ('all', 'any'):
+                raise ValueError(f'Unknown logic: {logic!r}')
+            canonical = [normalize_pattern(pattern) for pattern in patterns]
+            for pattern in canonical:
+                pattern.check_client_support()
+        except ValueError as e:
+            self.invalid.append({'id': signature_id, 'reason': 'invalid', 'error': str(e)})
+            return
+
+        unique = list({pattern.key: pattern for pattern in canonical}.values())
+        kept = self._drop_redundant_patterns(unique, logic)
+        if len(kept) == 1:
+            logic = 'all'
+        if logic == 'all':
+            kept.sort(key=lambda pattern: (pattern.offset is None, pattern.match_probability(), pattern.cost()))
+
+        self.signatures.append(CompiledSignature(
+            len(self.signatures), signature_id, name, severity, logic, kept, len(patterns) - len(kept)
+        ))
+
+    def compile(self):
+        """
+        Returns ``(signatures, report)``: the compiled signatures as JSON-ready
+        dicts and a report of what was dropped and flagged
+        """
+        dropped = list(self.invalid)
+        kept = []
+        for signature in self.signatures:
+            cover = self._covering_signature(signature)
+            if cover is None:
+                kept.append(signature)
+            else:
+                reason = 'duplicate' if self._same(signature, cover) else 'subsumed'
+                dropped.append({'id': signature.id, 'reason': reason, 'by': cover.id})
+
+        flagged = []
+        compiled = []
+        for signature in kept:
+            entry = signature.to_json()
+            compiled.append(entry)
+
+            flags = {}
+            for pattern, pattern_json in zip(signature.patterns, entry['patterns']):
+                pattern_flags = pattern.flags(self.min_bytes)
+                if pattern_flags:
+                    flags.setdefault('patterns', []).append(dict(pattern_json, flags=pattern_flags))
+            if signature.match_probability() > self.max_matches_per_mb:
+                flags['low_selectivity'] = round(signature.match_probability(), 6)
+            if flags:
+                flagged.append(dict(flags, id=signature.id))
+
+        report = {
+            'source_signatures': len(self.signatures) + len(self.invalid),
+            'source_patterns': self.source_patterns,
+            'compiled_signatures': len(compiled),
+            'compiled_patterns': sum(len(entry['patterns']) for entry in compiled),
+            'removed_patterns': sum(signature.removed_patterns for signature in kept),
+            'total_cost': round(sum(entry['cost'] for entry in compiled), 4),
+            'dropped': dropped,
+            'flagged': flagged
+        }
+        return compiled, report
+
+    @staticmethod
+    def _drop_redundant_patterns(patterns, logic):
+        kept = []
+        for index, pattern in enumerate(patterns):
+            others = patterns[:index] + patterns[index + 1:]
+            if logic == 'all':
+                # Another pattern that is always present with this one makes it redundant
+                redundant = any(other.implies(pattern) for other in others)
+            else:
+                # This pattern only matches where a shorter one already does
+                redundant = any(pattern.implies(other) for other in others)
+            # Equal patterns imply each other; they were already deduplicated
+            if not redundant:
+                kept.append(pattern)
+        return kept
+
+    def _covering_signature(self, signature):
+        """
+        Finds a signature that makes ``signature`` redundant, preferring to
+        keep the higher severity, then the earlier one, among equivalents
+        """
+        for other in self._candidates(signature):
+            if other is signature or other.rank < signature.rank:
+                continue
+            # A catch-all pattern is flagged for review, not used to drop
+            # the specific signatures it happens to cover
+            if other.match_probability() > self.max_matches_per_mb:
+                continue
+            if not other.fires_whenever(signature):
+                continue
+            equivalent = signature.fires_whenever(other) and other.rank == signature.rank
+            if not equivalent or other.order < signature.order:
+                return other
+        return None
+
+    def _candidates(self, signature):
+        # A covering signature has at least one pattern implied by one of
+        # ours: equal to it, or an exact pattern contained in it
+        index = self._index()
+        candidates = {}
+        for pattern in signature.patterns:
+            for other in index['keys'].get(pattern.key, ()):
+                candidates[other.order] = other
+            if not pattern.exact:
+                continue
+            data = pattern.data
+            for length in range(1, MIN_PATTERN_BYTES + 1):
+                table = index['grams'].get(length)
+                if not table:
+                    continue
+                for start in range(len(data) - length + 1):
+                    for other in table.get(data[start:start + length], ()):
+                        candidates[other.order] = other
+        return [candidates[order] for order in sorted(candidates)]
+
+    def _index(self):
+        if self._index_cache is None:
+            keys = {}
+            grams = {}
+            for signature in self.signatures:
+                for pattern in signature.patterns:
+                    keys.setdefault(pattern.key, []).append(signature)
+                    if pattern.exact:
+                        length = min(len(pattern.data), MIN_PATTERN_BYTES)
+                        grams.setdefault(length, {}).setdefault(pattern.data[:length], []).append(signature)
+            self._index_cache = {'keys': keys, 'grams': grams}
+        return self._index_cache
+
+    @staticmethod
+    def _same(signature, other):
+        return (signature.logic == other.logic
+                and {pattern.key for pattern in signature.patterns} == {pattern.key for pattern in other.patterns})
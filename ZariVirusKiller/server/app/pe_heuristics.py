@@ -0,0 +1,445 @@
+"""
+Static heuristics for submitted files, the server-side counterpart of the
+client's HeuristicAnalyzer.
+
+The sample is viewed once as a NumPy uint8 array and the byte histogram
+of every BLOCK_SIZE block is counted with ``np.bincount`` over that view.
+Histograms of the whole file, of each PE section and of the overlay are
+assembled from the block histograms, and Shannon entropy is computed from
+them as array operations; no Python loop touches individual bytes. PE
+headers, the section table and the import table are parsed with
+``struct``. Each finding adds risk points the way the client does, and the
+same thresholds (25 and 50) give the medium and high risk levels.
+"""
+import struct
+
+import numpy as np
+
+BLOCK_SIZE = 4096
+# Blocks counted per bincount call; 16 keeps the pass in cache and its keys in uint16
+BLOCKS_PER_PASS = 16
+HISTOGRAM_CHUNK = 64 * 1024
+HIGH_ENTROPY = 7.2
+FILE_ENTROPY_THRESHOLD = 7.5
+MAX_SECTIONS = 96
+MAX_IMPORT_DESCRIPTORS = 1024
+MAX_IMPORTS_PER_DLL = 4096
+# Cap on names parsed over all descriptors, so crafted tables cannot multiply the work
+MAX_IMPORTS = 4096
+MAX_NAME_LENGTH = 256
+
+# API names from the client's list plus common injection, anti-analysis and download calls.
+# Imported names match by prefix, so LoadLibrary covers LoadLibraryA, LoadLibraryExW, ...
+SUSPICIOUS_IMPORTS = (
+    'CreateRemoteThread',
+    'VirtualAllocEx',
+    'WriteProcessMemory',
+    'SetWindowsHookEx',
+    'GetProcAddress',
+    'LoadLibrary',
+    'WinExec',
+    'ShellExecute',
+    'CreateProcess',
+    'ReadProcessMemory',
+    'NtUnmapViewOfSection',
+    'ZwUnmapViewOfSection',
+    'SetThreadContext',
+    'QueueUserAPC',
+    'IsDebuggerPresent',
+    'URLDownloadToFile',
+    'InternetOpenUrl',
+    'AdjustTokenPrivileges',
+)
+RUNTIME_LINKING_IMPORTS = ('LoadLibrary', 'GetProcAddress')
+
+PACKER_SECTION_NAMES = {
+    'UPX0', 'UPX1', 'UPX2', '.aspack', '.adata', '.packed', '.petite', '.nsp0', '.nsp1',
+    '.MPRESS1', '.MPRESS2', '.themida', '.vmp0', '.vmp1', '.enigma1'
+}
+
+IMAGE_FILE_DLL = 0x2000
+IMAGE_SCN_CNT_CODE = 0x00000020
+IMAGE_SCN_MEM_EXECUTE = 0x20000000
+IMAGE_SCN_MEM_WRITE = 0x80000000
+
+COFF_HEADER = struct.Struct('<HHIIIHH')
+SECTION_HEADER = struct.Struct('<8sIIIIIIHHI')
+IMPORT_DESCRIPTOR = struct.Struct('<IIIII')
+
+PRINTABLE = np.zeros(256, dtype=bool)
+PRINTABLE[0x20:0x7f] = True
+PRINTABLE[[0x09, 0x0a, 0x0d]] = True
+
+
+def byte_histogram(buffer):
+    """
+    256-bin histogram of a uint8 array, counted in cache-sized chunks
+    """
+    counts = np.zeros(256, dtype=np.int64)
+    for start in range(0, len(buffer), HISTOGRAM_CHUNK):
+        counts += np.bincount(buffer[start:start + HISTOGRAM_CHUNK], minlength=256)
+    return counts
+
+
+def entropy(counts):
+    """
+    Shannon entropy, in bits per byte, of histograms along the last axis
+    """
+    counts = np.asarray(counts, dtype=np.float64)
+    totals = counts.sum(axis=-1, keepdims=True)
+    probabilities = counts / np.maximum(totals, 1)
+    logs = np.log2(probabilities, out=np.zeros_like(probabilities), where=probabilities > 0)
+    # Adding 0.0 turns the -0.0 of constant data into 0.0
+    return -(probabilities * logs).sum(axis=-1) + 0.0
+
+
+class BlockHistograms:
+    """
+    Byte histograms of every full BLOCK_SIZE block of a buffer. The buffer
+    is counted once; the histogram of any byte range (a section, the
+    overlay, the whole file) is then the sum of its blocks plus the bytes
+    of the partial blocks at its ends.
+    """
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        full_blocks = len(buffer) // BLOCK_SIZE
+        self.counts = np.empty((full_blocks, 256), dtype=np.int32)
+
+        # Each block's bytes are shifted into its own 256-bin range so one bincount counts them all
+        offsets = (np.arange(BLOCKS_PER_PASS, dtype=np.uint16) * 256)[:, None]
+        for first in range(0, full_blocks, BLOCKS_PER_PASS):
+            count = min(BLOCKS_PER_PASS, full_blocks - first)
+            blocks = buffer[first * BLOCK_SIZE:(first + count) * BLOCK_SIZE].reshape(count, BLOCK_SIZE)
+            self.counts[first:first + count] = np.bincount(
+                (blocks + offsets[:count]).ravel(), minlength=count * 256
+            ).reshape(count, 256)
+
+    def entropies(self):
+        return entropy(self.counts)
+
+    def histogram(self, start=0, end=None):
+        end = len(self.buffer) if end is None else min(end, len(self.buffer))
+        start = min(start, end)
+        first, last = -(-start // BLOCK_SIZE), end // BLOCK_SIZE
+        if first >= last:
+            return byte_histogram(self.buffer[start:end])
+
+        counts = self.counts[first:last].sum(axis=0, dtype=np.int64)
+        counts += byte_histogram(self.buffer[start:first * BLOCK_SIZE])
+        counts += byte_histogram(self.buffer[last * BLOCK_SIZE:end])
+        return counts
+
+
+class Section:
+    def __init__(self, name, virtual_address, virtual_size, raw_size, raw_pointer, characteristics):
+        self.name = name
+        self.virtual_address = virtual_address
+        self.virtual_size = virtual_size
+        self.raw_size = raw_size
+        self.raw_pointer = raw_pointer
+        self.characteristics = characteristics
+        self.histogram = None
+        self.entropy = 0.0
+
+    @property
+    def executable(self):
+        return bool(self.characteristics & (IMAGE_SCN_MEM_EXECUTE | IMAGE_SCN_CNT_CODE))
+
+    @property
+    def writable(self):
+        return bool(self.characteristics & IMAGE_SCN_MEM_WRITE)
+
+    def contains_rva(self, rva):
+        return self.virtual_address <= rva < self.virtual_address + max(self.virtual_size, self.raw_size)
+
+    def to_json(self):
+        total = int(self.histogram.sum()) if self.histogram is not None else 0
+        return {
+            'name': self.name,
+            'virtual_address': self.virtual_address,
+            'virtual_size': self.virtual_size,
+            'raw_size': self.raw_size,
+            'entropy': round(float(self.entropy), 3),
+            'zero_ratio': round(int(self.histogram[0]) / total, 3) if total else 0.0,
+            'printable_ratio': round(int(self.histogram[PRINTABLE].sum()) / total, 3) if total else 0.0,
+            'executable': self.executable,
+            'writable': self.writable
+        }
+
+
+class PEFile:
+    """
+    Headers, sections and imports of a PE image. Raises ValueError when the
+    data starts like a PE but its headers are broken.
+    """
+
+    def __init__(self, data):
+        self.data = data
+        pe_offset = struct.unpack_from('<I', data, 0x3C)[0]
+        if data[pe_offset:pe_offset + 4] != b'PE\0\0':
+            raise ValueError('Missing PE signature')
+
+        try:
+            (self.machine, section_count, self.timestamp, _, _,
+             optional_size, self.characteristics) = COFF_HEADER.unpack_from(data, pe_offset + 4)
+            optional = pe_offset + 4 + COFF_HEADER.size
+            magic = struct.unpack_from('<H', data, optional)[0]
+            if magic not in (0x10B, 0x20B):
+                raise ValueError(f'Unknown optional header magic {magic:#x}')
+            self.pe32_plus = magic == 0x20B
+            self.entry_point = struct.unpack_from('<I', data, optional + 16)[0]
+
+            directories = optional + (112 if self.pe32_plus else 96)
+            directory_count = struct.unpack_from('<I', data, directories - 4)[0]
+            self.import_rva, self.import_size = (
+                struct.unpack_from('<II', data, directories + 8) if directory_count > 1 else (0, 0)
+            )
+
+            self.sections = []
+            table = optional + optional_size
+            for index in range(min(section_count, MAX_SECTIONS)):
+                (name, virtual_size, virtual_address, raw_size, raw_pointer,
+                 _, _, _, _, characteristics) = SECTION_HEADER.unpack_from(data, table + index * SECTION_HEADER.size)
+                self.sections.append(Section(
+                    name.rstrip(b'\0').decode('latin-1'), virtual_address, virtual_size,
+                    raw_size, raw_pointer, characteristics
+                ))
+        except struct.error:
+            raise ValueError('Truncated PE headers')
+
+        self._strings = {}
+        self.imports = self._parse_imports()
+
+    @property
+    def dll(self):
+        return bool(self.characteristics & IMAGE_FILE_DLL)
+
+    @property
+    def end_of_sections(self):
+        return max((s.raw_pointer + s.raw_size for s in self.sections if s.raw_size), default=0)
+
+    def section_at(self, rva):
+        for section in self.sections:
+            if section.contains_rva(rva):
+                return section
+        return None
+
+    def offset(self, rva):
+        """
+        File offset of an RVA, or None when it is outside the data
+        """
+        section = self.section_at(rva)
+        offset = section.raw_pointer + rva - section.virtual_address if section else rva
+        return offset if 0 <= offset < len(self.data) else None
+
+    def _string(self, rva):
+        if rva in self._strings:
+            return self._strings[rva]
+        offset = self.offset(rva)
+        value = None
+        if offset is not None:
+            end = self.data.find(b'\0', offset, offset + MAX_NAME_LENGTH)
+            value = self.data[offset:end if end != -1 else offset + MAX_NAME_LENGTH].decode('latin-1')
+        self._strings[rva] = value
+        return value
+
+    def _parse_imports(self):
+        """
+        Returns {dll name: [function names]}; imports by ordinal are skipped.
+        Each thunk array is parsed once even when several descriptors point
+        to it, and parsing stops after MAX_IMPORTS names.
+        """
+        imports = {}
+        parsed_thunks = set()
+        remaining = MAX_IMPORTS
+        offset = self.offset(self.import_rva) if self.import_rva else None
+        if offset is None:
+            return imports
+
+        width, dtype, ordinal_flag = (8, '<u8', 1 << 63) if self.pe32_plus else (4, '<u4', 1 << 31)
+        for index in range(MAX_IMPORT_DESCRIPTORS):
+            position = offset + index * IMPORT_DESCRIPTOR.size
+            if position + IMPORT_DESCRIPTOR.size > len(self.data):
+                break
+            original_thunk, _, _, name_rva, first_thunk = IMPORT_DESCRIPTOR.unpack_from(self.data, position)
+            if not name_rva and not first_thunk:
+                break
+
+            dll = self._string(name_rva)
+            thunk_offset = self.offset(original_thunk or first_thunk)
+            if dll is None or thunk_offset is None or thunk_offset in parsed_thunks:
+                continue
+            parsed_thunks.add(thunk_offset)
+
+            # The whole thunk array is read as one integer array and cut at its terminator
+            count = min(MAX_IMPORTS_PER_DLL, remaining, (len(self.data) - thunk_offset) // width)
+            thunks = np.frombuffer(self.data, dtype=dtype, count=count, offset=thunk_offset)
+            terminators = np.flatnonzero(thunks == 0)
+            thunks = thunks[:terminators[0]] if len(terminators) else thunks
+            by_name = thunks[(thunks & np.array(ordinal_flag, dtype=thunks.dtype)) == 0]
+
+            names = imports.setdefault(dll.lower(), [])
+            for hint_rva in by_name.tolist():
+                name = self._string((hint_rva & 0x7FFFFFFF) + 2)
+                if name:
+                    names.append(name)
+            remaining -= len(thunks)
+            if remaining <= 0:
+                break
+        return imports
+
+
+def suspicious_names(names):
+    """
+    SUSPICIOUS_IMPORTS entries that prefix one of ``names``
+    """
+    return [api for api in SUSPICIOUS_IMPORTS if any(name.startswith(api) for name in names)]
+
+
+class HeuristicAnalysis:
+    """
+    Static features and risk score of one sample
+    """
+
+    def __init__(self, data):
+        self.size = len(data)
+        self.findings = []
+        self.score = 0
+        self.pe = None
+        self.suspicious_imports = []
+
+        self.blocks = BlockHistograms(np.frombuffer(data, dtype=np.uint8))
+        self.block_entropies = self.blocks.entropies()
+        self.histogram = self.blocks.histogram()
+        self.entropy = float(entropy(self.histogram)) if self.size else 0.0
+        self.high_entropy_ratio = float((self.block_entropies > HIGH_ENTROPY).mean()) if len(self.block_entropies) else 0.0
+
+        if data[:2] == b'MZ' and self.size >= 64:
+            try:
+                self.pe = PEFile(data)
+            except ValueError as e:
+                self._add('MalformedPE', f'MZ file with invalid PE headers: {e}', 10)
+
+        if self.pe is not None:
+            self._analyze_pe()
+        else:
+            # Same raw string search as the client when there is no import table to read
+            self.suspicious_imports = [api for api in SUSPICIOUS_IMPORTS if api.encode('ascii') in data]
+            self._add_suspicious_imports('strings')
+
+        self._analyze_entropy()
+        self.score = min(self.score, 100)
+
+    @property
+    def risk_level(self):
+        if self.score >= 50:
+            return 'high'
+        if self.score >= 25:
+            return 'medium'
+        if self.score > 0:
+            return 'low'
+        return 'none'
+
+    def _add(self, finding_type, description, risk):
+        if risk <= 0:
+            return
+        self.score += risk
+        self.findings.append({'type': finding_type, 'description': description, 'risk': risk})
+
+    def _analyze_pe(self):
+        pe = self.pe
+        kind = ('PE32+' if pe.pe32_plus else 'PE32') + (' DLL' if pe.dll else '')
+        self._add('FileType', f'Executable file type: {kind}', 10)
+        if self.size < 1024:
+            self._add('FileSize', f'Suspiciously small executable: {self.size} bytes', 15)
+
+        for section in pe.sections:
+            section.histogram = self.blocks.histogram(section.raw_pointer, section.raw_pointer + section.raw_size)
+        if pe.sections:
+            entropies = entropy(np.stack([section.histogram for section in pe.sections]))
+            for section, value in zip(pe.sections, entropies):
+                section.entropy = float(value)
+
+        packed = [s.name for s in pe.sections if s.executable and s.entropy > HIGH_ENTROPY]
+        if packed:
+            self._add('PackedSection', f"High entropy code section: {', '.join(packed)}", 15)
+
+        writable_code = [s.name for s in pe.sections if s.executable and s.writable]
+        if writable_code:
+            self._add('WritableCode', f"Writable and executable section: {', '.join(writable_code)}", 15)
+
+        packer_names = [s.name for s in pe.sections if s.name in PACKER_SECTION_NAMES]
+        if packer_names:
+            self._add('PackerSection', f"Packer section names: {', '.join(packer_names)}", 20)
+
+        unpacked_at_runtime = [s.name for s in pe.sections if s.executable and not s.raw_size and s.virtual_size]
+        if unpacked_at_runtime:
+            self._add('EmptyCodeSection', f"Code section filled at runtime: {', '.join(unpacked_at_runtime)}", 10)
+
+        entry_section = pe.section_at(pe.entry_point)
+        if pe.entry_point and (entry_section is None or not entry_section.executable):
+            where = f'section {entry_section.name}' if entry_section else 'no section'
+            self._add('EntryPoint', f'Entry point {pe.entry_point:#x} is in {where}', 10)
+
+        names = [name for functions in pe.imports.values() for name in functions]
+        self.suspicious_imports = suspicious_names(names)
+        self._add_suspicious_imports('imports')
+        runtime_linking = any(api in self.suspicious_imports for api in RUNTIME_LINKING_IMPORTS)
+        # A table past the end of truncated data says nothing about the imports
+        imports_known = not pe.import_rva or pe.offset(pe.import_rva) is not None
+        if not pe.dll and imports_known and (not names or (len(names) <= 3 and runtime_linking)):
+            self._add('FewImports', f'Only {len(names)} imported functions; imports are resolved at runtime', 10)
+
+        overlay_start = pe.end_of_sections
+        if overlay_start and self.size - overlay_start > BLOCK_SIZE:
+            overlay_entropy = float(entropy(self.blocks.histogram(overlay_start)))
+            if overlay_entropy > HIGH_ENTROPY:
+                self._add('Overlay', f'{self.size - overlay_start} bytes of high entropy ({overlay_entropy:.2f}) '
+                                     f'data after the last section', 10)
+
+    def _add_suspicious_imports(self, source):
+        if self.suspicious_imports:
+            self._add('SuspiciousAPI', f'Found {len(self.suspicious_imports)} suspicious API calls ({source}): '
+                                       f"{', '.join(self.suspicious_imports[:5])}",
+                      min(len(self.suspicious_imports) * 5, 30))
+
+    def _analyze_entropy(self):
+        if self.entropy > FILE_ENTROPY_THRESHOLD:
+            self._add('Entropy', f'High entropy ({self.entropy:.2f}) suggests encryption or packing',
+                      int((self.entropy - FILE_ENTROPY_THRESHOLD) * 20))
+        elif len(self.block_entropies) >= 16 and self.high_entropy_ratio >= 0.25:
+            self._add('HighEntropyRegion', f'{self.high_entropy_ratio:.0%} of the file is encrypted or '
+                                           f'compressed data', 10)
+
+    def to_json(self):
+        pe = None
+        if self.pe is not None:
+            pe = {
+                'pe32_plus': self.pe.pe32_plus,
+                'dll': self.pe.dll,
+                'machine': self.pe.machine,
+                'timestamp': self.pe.timestamp,
+                'entry_point': self.pe.entry_point,
+                'sections': [section.to_json() for section in self.pe.sections],
+                'imported_dlls': len(self.pe.imports),
+                'imported_functions': sum(len(names) for names in self.pe.imports.values()),
+                'overlay_size': max(self.size - self.pe.end_of_sections, 0) if self.pe.end_of_sections else 0
+            }
+        return {
+            'score': self.score,
+            'risk_level': self.risk_level,
+            'findings': self.findings,
+            'size': self.size,
+            'entropy': round(self.entropy, 3),
+            'high_entropy_ratio': round(self.high_entropy_ratio, 3),
+            'suspicious_imports': self.suspicious_imports,
+            'pe': pe
+        }
+
+
+def analyze(data):
+    """
+    Runs the heuristics over a sample's bytes
+    """
+    return HeuristicAnalysis(data)
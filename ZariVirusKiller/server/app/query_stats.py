@@ -0,0 +1,69 @@
+import threading
+import time
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+class QueryStats:
+    """
+    Counts the SQL statements this process sends to any database.
+
+    Listens on every Engine, so replica and partition shard engines are
+    counted along with the primary. Counters are per process; load tests
+    should diff two snapshots of ``metrics()`` taken from the same worker.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self._installed = False
+
+    def init_app(self, app):
+        if self._installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before)
+        event.listen(Engine, 'after_cursor_execute', self._after)
+        event.listen(Engine, 'handle_error', self._error)
+        self._installed = True
+
+    def metrics(self):
+        """
+        Returns statement counts and time spent, per statement kind
+        """
+        with self._lock:
+            by_kind = {kind: dict(stats, time_ms=round(stats['time_ms'], 3)) for kind, stats in self._stats.items()}
+
+        return {
+            'total': sum(stats['count'] for stats in by_kind.values()),
+            'time_ms': round(sum(stats['time_ms'] for stats in by_kind.values()), 3),
+            'by_kind': by_kind
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def _before(self, conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+    def _after(self, conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['query_started'].pop()
+        elapsed = (time.perf_counter() - started) * 1000
+        kind = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else 'OTHER'
+
+        with self._lock:
+            stats = self._stats.setdefault(kind, {'count': 0, 'time_ms': 0.0})
+            stats['count'] += 1
+            stats['time_ms'] += elapsed
+
+    def _error(self, context):
+        # Failed statements never reach after_cursor_execute
+        if context.connection is not None and context.connection.info.get('query_started'):
+            context.connection.info['query_started'].pop()
+            with self._lock:
+                stats = self._stats.setdefault('ERROR', {'count': 0, 'time_ms': 0.0})
+                stats['count'] += 1
+
+
+# Shared counters for the whole process
+query_stats = QueryStats()
@@ -1,14 +1,29 @@
-from flask import Blueprint, request, jsonify, send_file, current_app
+from flask import Blueprint, request, jsonify, send_file, current_app, Response, stream_with_context
 import os
 import json
+import math
+import time
+from datetime import datetime, timedelta
 from app import db
-from models import LicenseKey, DefinitionUpdate, VirusSignature
-from signature_manager import SignatureManager
+from models import LicenseKey, DefinitionUpdate, VirusSignature, DeviceHeartbeat
+from app.signature_manager import SignatureManager
+from app.definitions_notifier import definitions_notifier, download_jitter
+from app.single_flight import single_flight
+from app.heartbeats import heartbeats, record_heartbeat
+from app.telemetry import detection_summary
+from app.db_routing import replica_router, replica_reads, primary_reads
+from app.snapshot import definitions_cache
+from app.hash_partitions import hash_partitions, normalize_hash
+from app.similarity import compute_similarity_hash, similarity_index
+from app.signature_search import SignatureSearch
+from app.query_stats import query_stats
+from app.serialization import RowEncoder, DATETIME, RAW, json_response
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 api = Blueprint('api', __name__)
 
 @api.route('/verify-license', methods=['POST'])
+@replica_reads
 def verify_license():
     """
     Verifies a license key
@@ -21,61 +36,268 @@ def verify_license():
         return jsonify({'error': 'License key is required'}), 400
     
     # Check if license exists and is valid
-    license = LicenseKey.query.filter_by(key=key).first()
+    license = single_flight.do(('verify-license', key), _load_license, key)
     if not license:
         return jsonify({'valid': False, 'message': 'Invalid license key'}), 200
     
     # Check if license has expired
-    if license.expires_at < db.func.now():
+    if license['expires_at'] < datetime.utcnow():
         return jsonify({'valid': False, 'message': 'License has expired'}), 200
     
     # Update device ID if provided
-    if device_id and not license.device_id:
-        license.device_id = device_id
-        db.session.commit()
+    bound_device_id = license['device_id']
+    if device_id and not bound_device_id:
+        # Activation must see the latest state, not a lagging replica
+        with primary_reads():
+            activated = LicenseKey.query.filter_by(key=key).populate_existing().first()
+            if not activated.device_id:
+                activated.device_id = device_id
+                db.session.commit()
+            bound_device_id = activated.device_id
     
     # Check if device ID matches
-    if license.device_id and license.device_id != device_id:
+    if bound_device_id and bound_device_id != device_id:
         return jsonify({'valid': False, 'message': 'License is already in use on another device'}), 200
     
+    if device_id:
+        try:
+            record_heartbeat(device_id, license_key=key, client_version=data.get('client_version'))
+        except ValueError:
+            # A bad client_version must not fail a valid license check
+            pass
+    
     return jsonify({
         'valid': True,
-        'expires_at': license.expires_at.isoformat()
+        'expires_at': license['expires_at'].isoformat()
     }), 200
 
+def _load_license(key):
+    """
+    Loads the fields of a license needed to verify it
+    """
+    license = LicenseKey.query.filter_by(key=key).first()
+    if not license:
+        return None
+    
+    return {
+        'expires_at': license.expires_at,
+        'device_id': license.device_id
+    }
+
+@api.route('/heartbeat', methods=['POST'])
+def heartbeat():
+    """
+    Records that a device is alive and which client version it runs. The
+    license key of a device is only stored by verify-license, once verified.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object is required'}), 400
+    
+    device_id = data.get('device_id')
+    if not device_id:
+        return jsonify({'error': 'Device ID is required'}), 400
+    
+    try:
+        record_heartbeat(device_id, client_version=data.get('client_version'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'accepted': True}), 202
+
 @api.route('/definitions', methods=['GET'])
+@replica_reads
 def get_definitions():
     """
     Gets the latest virus definitions
     """
     try:
-        # Get latest definitions info
-        definitions_info = SignatureManager.get_latest_definitions()
+        # Get latest definitions info from memory; reloads are shared by concurrent pollers
+        definitions_info = definitions_cache.get(lambda: single_flight.do(
+            ('definitions', definitions_notifier.sequence),
+            SignatureManager.get_latest_definitions
+        ))
         
         return jsonify(definitions_info), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@api.route('/definitions/watch', methods=['GET'])
+@replica_reads
+def watch_definitions():
+    """
+    Long-polls until a definitions version newer than the client's is published
+    
+    Clients pass the versions they hold as ``hash``, ``pattern``,
+    ``similarity`` and ``filter`` query parameters. Returns 200 with the new versions as
+    soon as one changes, or 204 when the timeout expires with nothing new.
+    """
+    known = _known_versions()
+    max_timeout = current_app.config['DEFINITIONS_LONGPOLL_TIMEOUT']
+    try:
+        timeout = float(request.args.get('timeout', max_timeout))
+    except ValueError:
+        timeout = math.nan
+    if not math.isfinite(timeout):
+        return jsonify({'error': 'timeout must be a finite number of seconds'}), 400
+    timeout = max(0.0, min(timeout, max_timeout))
+    
+    try:
+        versions = definitions_notifier.wait_for_change(
+            known,
+            timeout,
+            loader=SignatureManager.get_latest_versions,
+            refresh_interval=current_app.config['DEFINITIONS_REFRESH_INTERVAL']
+        )
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    if versions is None:
+        return Response(status=204)
+    
+    return jsonify(_definitions_event(versions)), 200
+
+@api.route('/definitions/events', methods=['GET'])
+def stream_definitions():
+    """
+    Streams definitions version changes as Server-Sent Events
+    
+    The current versions are sent right away, then one event per publish.
+    The stream ends after DEFINITIONS_SSE_MAX_DURATION seconds and the
+    client reconnects using the advertised retry delay.
+    """
+    config = current_app.config
+    known = _known_versions()
+    last_event_id = request.headers.get('Last-Event-ID')
+    
+    def generate():
+        deadline = time.monotonic() + config['DEFINITIONS_SSE_MAX_DURATION']
+        retry_ms = int(config['DEFINITIONS_SSE_RETRY'] * 1000)
+        yield f'retry: {retry_ms}\n\n'
+        
+        # Tell a fresh client what is current before waiting on changes
+        current = known
+        if last_event_id is None:
+            definitions_notifier.refresh(SignatureManager.get_latest_versions)
+            current = definitions_notifier.versions()
+            yield _sse_message(current)
+        
+        while time.monotonic() < deadline:
+            versions = definitions_notifier.wait_for_change(
+                current,
+                min(config['DEFINITIONS_SSE_KEEPALIVE'], max(deadline - time.monotonic(), 0)),
+                loader=SignatureManager.get_latest_versions,
+                refresh_interval=config['DEFINITIONS_REFRESH_INTERVAL']
+            )
+            
+            if versions is None:
+                # Comment line keeps proxies from closing an idle connection
+                yield ': keepalive\n\n'
+                continue
+            
+            current = versions
+            yield _sse_message(versions)
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def _known_versions():
+    """
+    Reads the definitions versions a client already has from the query string
+    """
+    return {
+        update_type: request.args.get(update_type)
+        for update_type in ('hash', 'pattern', 'similarity', 'filter')
+        if update_type in request.args
+    }
+
+def _definitions_event(versions):
+    """
+    Builds the payload announcing a definitions version to clients
+    """
+    return {
+        'versions': versions,
+        'sequence': definitions_notifier.sequence,
+        'download_jitter': download_jitter(current_app.config['DEFINITIONS_DOWNLOAD_JITTER'])
+    }
+
+def _sse_message(versions):
+    """
+    Formats a definitions event as a Server-Sent Events message
+    """
+    payload = json.dumps(_definitions_event(versions))
+    return f'id: {definitions_notifier.sequence}\nevent: definitions\ndata: {payload}\n\n'
+
 @api.route('/download-definitions/<type>', methods=['GET'])
+@replica_reads
 def download_definitions(type):
     """
     Downloads the latest virus definitions file
     """
     try:
-        if type not in ['hash', 'pattern']:
+        if type not in ['hash', 'pattern', 'similarity', 'filter']:
             return jsonify({'error': 'Invalid definition type'}), 400
             
         # Get latest definition update
-        update = DefinitionUpdate.query.filter_by(update_type=type).order_by(DefinitionUpdate.id.desc()).first()
+        path = single_flight.do(
+            ('download-definitions', type, definitions_notifier.sequence),
+            _latest_definitions_path,
+            type
+        )
         
-        if not update or not os.path.exists(update.path):
+        if not path:
             return jsonify({'error': 'Definitions file not found'}), 404
         
-        return send_file(update.path, as_attachment=True)
+        return send_file(path, as_attachment=True, download_name=DOWNLOAD_NAMES.get(type, os.path.basename(path)))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+# Merged hash files are stored per build version but downloaded under their usual names
+DOWNLOAD_NAMES = {'hash': 'signatures.json', 'filter': 'hashes.bloom'}
+
+def _latest_definitions_path(update_type):
+    """
+    Gets the path of the latest definitions file of a type, if it exists
+    """
+    update = DefinitionUpdate.query.filter_by(update_type=update_type).order_by(DefinitionUpdate.id.desc()).first()
+    
+    if not update:
+        return None
+    
+    if update_type in DOWNLOAD_NAMES:
+        return SignatureManager.merged_definitions_file(update_type, update.path)
+    
+    if not os.path.exists(update.path):
+        return None
+    
+    return update.path
+
+@api.route('/download-definitions/hash/<prefix>', methods=['GET'])
+def download_hash_partition(prefix):
+    """
+    Downloads one hash partition, or with ``manifest`` the generation and
+    signature count of every partition, so clients can fetch only the
+    partitions that changed
+    """
+    prefix = prefix.lower()
+    if prefix == 'manifest':
+        filename = 'manifest.json'
+    elif prefix in hash_partitions.prefixes():
+        filename = f'{prefix}.json'
+    else:
+        return jsonify({'error': 'Unknown hash partition'}), 404
+    
+    path = os.path.join(current_app.config['DEFINITIONS_FOLDER'], 'hash', filename)
+    if not os.path.exists(path):
+        return jsonify({'error': 'Definitions file not found'}), 404
+    
+    return send_file(path, as_attachment=True)
+
 @api.route('/check-file', methods=['POST'])
+@replica_reads
 def check_file():
     """
     Checks if a file hash matches any known virus
@@ -86,14 +308,18 @@ def check_file():
     if not file_hash:
         return jsonify({'error': 'File hash is required'}), 400
     
-    # Check if hash matches any known virus
-    signature = VirusSignature.query.filter_by(hash_value=file_hash).first()
+    file_hash = normalize_hash(file_hash)
+    if file_hash is None:
+        return jsonify({'error': 'File hash must be a hex digest of 32 to 64 digits'}), 400
+    
+    # Check if hash matches any known virus; only the hash's partition is read
+    signature = hash_partitions.lookup(file_hash)
     
     if signature:
         return jsonify({
             'is_infected': True,
-            'threat_name': signature.name,
-            'severity': signature.severity
+            'threat_name': signature['name'],
+            'severity': signature['severity']
         }), 200
     
     return jsonify({'is_infected': False}), 200
@@ -117,6 +343,8 @@ def add_signature():
         hash_value = data.get('hash')
         if not hash_value:
             return jsonify({'error': 'Hash value is required'}), 400
+        if normalize_hash(hash_value) is None:
+            return jsonify({'error': 'Hash value must be a hex digest of 32 to 64 digits'}), 400
             
         success, message = SignatureManager.add_hash_signature(
             name=name,
@@ -138,6 +366,17 @@ def add_signature():
             severity=severity,
             description=description
         )
+    elif signature_type == 'similarity':
+        similarity_hash = data.get('similarity_hash')
+        if not similarity_hash:
+            return jsonify({'error': 'Similarity hash is required'}), 400
+            
+        success, message = SignatureManager.add_similarity_signature(
+            name=name,
+            similarity_hash=similarity_hash,
+            severity=severity,
+            description=description
+        )
     else:
         return jsonify({'error': 'Invalid signature type'}), 400
     
@@ -146,8 +385,107 @@ def add_signature():
     else:
         return jsonify({'error': message}), 400
 
+@api.route('/add-signature/sample', methods=['POST'])
+@jwt_required()
+def add_signature_from_sample():
+    """
+    Adds a similarity signature computed from an uploaded sample
+    """
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file part'}), 400
+    
+    name = request.form.get('name')
+    if not name:
+        return jsonify({'error': 'Signature name is required'}), 400
+    
+    similarity_hash = compute_similarity_hash(
+        request.files['file'].read(),
+        max_bytes=current_app.config['SIMILARITY_MAX_BYTES']
+    )
+    
+    success, message = SignatureManager.add_similarity_signature(
+        name=name,
+        similarity_hash=similarity_hash,
+        severity=request.form.get('severity', 'medium'),
+        description=request.form.get('description')
+    )
+    
+    if success:
+        return jsonify({'message': message, 'similarity_hash': similarity_hash}), 201
+    else:
+        return jsonify({'error': message}), 400
+
+@api.route('/similarity/search', methods=['POST'])
+@jwt_required()
+def search_similar():
+    """
+    Finds similarity signatures within a distance of a sketch or an uploaded sample
+    """
+    try:
+        if 'file' in request.files:
+            similarity_hash = compute_similarity_hash(
+                request.files['file'].read(),
+                max_bytes=current_app.config['SIMILARITY_MAX_BYTES']
+            )
+            params = request.form
+        else:
+            params = request.get_json() or {}
+            similarity_hash = params.get('similarity_hash')
+            if not similarity_hash:
+                return jsonify({'error': 'Similarity hash or file is required'}), 400
+        
+        max_distance = float(params.get('max_distance', current_app.config['SIMILARITY_MAX_DISTANCE']))
+        limit = int(params.get('limit', 10))
+        
+        index = similarity_index.get(os.path.join(current_app.config['DEFINITIONS_FOLDER'], 'similarity.json'))
+        matches = index.query(similarity_hash, max_distance=max_distance, limit=limit)
+        
+        return jsonify({
+            'similarity_hash': similarity_hash,
+            'matches': matches
+        }), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@api.route('/signatures/search', methods=['GET'])
+@jwt_required()
+@replica_reads
+def search_signatures():
+    """
+    Searches signatures by name, description or hex pattern content
+    """
+    try:
+        results = SignatureSearch.search(
+            query=request.args.get('q', '').strip() or None,
+            field=request.args.get('field', 'all'),
+            mode=request.args.get('mode', 'substring'),
+            hex_pattern=request.args.get('hex', '').strip() or None,
+            severity=request.args.get('severity'),
+            signature_type=request.args.get('type'),
+            page=request.args.get('page', 1, type=int),
+            per_page=request.args.get('per_page', 25, type=int)
+        )
+        
+        return jsonify(results), 200
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+SIGNATURE_LIST_ENCODER = RowEncoder(
+    [('id', 0), ('name', 1), ('type', 2), ('severity', 3), ('created_at', 4, DATETIME)],
+    variant=(2, {
+        'hash': [('hash_value', 5)],
+        'pattern': [('signature_id', 6), ('pattern_data', 7, RAW)],
+        'similarity': [('similarity_hash', 8)]
+    })
+)
+
 @api.route('/signatures', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_signatures():
     """
     Gets all virus signatures
@@ -156,73 +494,92 @@ def get_signatures():
         # Get query parameters
         signature_type = request.args.get('type')
         
-        # Build query
-        query = VirusSignature.query
+        # Only the returned columns, as tuples; pattern_data is passed through as stored JSON
+        query = db.session.query(
+            VirusSignature.id,
+            VirusSignature.name,
+            VirusSignature.signature_type,
+            VirusSignature.severity,
+            VirusSignature.created_at,
+            VirusSignature.hash_value,
+            VirusSignature.signature_id,
+            VirusSignature.pattern_data,
+            VirusSignature.similarity_hash
+        )
         
         if signature_type:
-            query = query.filter_by(signature_type=signature_type)
+            query = query.filter(VirusSignature.signature_type == signature_type)
         
-        signatures = query.all()
-        
-        # Format response
-        result = []
-        for sig in signatures:
-            signature_data = {
-                'id': sig.id,
-                'name': sig.name,
-                'type': sig.signature_type,
-                'severity': sig.severity,
-                'created_at': sig.created_at.isoformat()
-            }
-            
-            if sig.signature_type == 'hash':
-                signature_data['hash_value'] = sig.hash_value
-            elif sig.signature_type == 'pattern':
-                signature_data['signature_id'] = sig.signature_id
-                signature_data['pattern_data'] = json.loads(sig.pattern_data) if sig.pattern_data else None
-            
-            result.append(signature_data)
-        
-        return jsonify(result), 200
+        return json_response(SIGNATURE_LIST_ENCODER.dumps(query.all()))
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @api.route('/statistics', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_statistics():
     """
     Gets system statistics
     """
     try:
-        # Get license statistics
-        total_licenses = LicenseKey.query.count()
-        active_licenses = LicenseKey.query.filter(LicenseKey.expires_at > db.func.now()).count()
-        used_licenses = LicenseKey.query.filter(LicenseKey.device_id != None).count()
-        
-        # Get signature statistics
-        total_signatures = VirusSignature.query.count()
-        hash_signatures = VirusSignature.query.filter_by(signature_type='hash').count()
-        pattern_signatures = VirusSignature.query.filter_by(signature_type='pattern').count()
-        
-        # Get definition update statistics
-        latest_update = DefinitionUpdate.query.order_by(DefinitionUpdate.id.desc()).first()
-        
-        return jsonify({
-            'licenses': {
-                'total': total_licenses,
-                'active': active_licenses,
-                'used': used_licenses
-            },
-            'signatures': {
-                'total': total_signatures,
-                'hash_based': hash_signatures,
-                'pattern_based': pattern_signatures
-            },
-            'definitions': {
-                'latest_update': latest_update.uploaded_at.isoformat() if latest_update else None,
-                'version': latest_update.version if latest_update else None,
-                'signature_count': latest_update.signature_count if latest_update else 0
-            }
-        }), 200
+        return jsonify(single_flight.do(('statistics',), _collect_statistics)), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def _collect_statistics():
+    """
+    Counts licenses, signatures and definition updates
+    """
+    # Get license statistics
+    total_licenses = LicenseKey.query.count()
+    active_licenses = LicenseKey.query.filter(LicenseKey.expires_at > db.func.now()).count()
+    used_licenses = LicenseKey.query.filter(LicenseKey.device_id != None).count()
+    
+    # Get signature statistics
+    total_signatures = VirusSignature.query.count()
+    hash_signatures = VirusSignature.query.filter_by(signature_type='hash').count()
+    pattern_signatures = VirusSignature.query.filter_by(signature_type='pattern').count()
+    
+    # Get device statistics
+    active_since = datetime.utcnow() - timedelta(seconds=current_app.config['HEARTBEAT_ACTIVE_WINDOW'])
+    total_devices = DeviceHeartbeat.query.count()
+    active_devices = DeviceHeartbeat.query.filter(DeviceHeartbeat.last_seen >= active_since).count()
+    
+    # Get definition update statistics
+    latest_update = DefinitionUpdate.query.order_by(DefinitionUpdate.id.desc()).first()
+    
+    return {
+        'licenses': {
+            'total': total_licenses,
+            'active': active_licenses,
+            'used': used_licenses
+        },
+        'signatures': {
+            'total': total_signatures,
+            'hash_based': hash_signatures,
+            'pattern_based': pattern_signatures
+        },
+        'devices': {
+            'total': total_devices,
+            'active': active_devices
+        },
+        'detections': detection_summary(),
+        'definitions': {
+            'latest_update': latest_update.uploaded_at.isoformat() if latest_update else None,
+            'version': latest_update.version if latest_update else None,
+            'signature_count': latest_update.signature_count if latest_update else 0
+        }
+    }
+
+@api.route('/metrics', methods=['GET'])
+@jwt_required()
+def get_metrics():
+    """
+    Gets in-process performance metrics for this worker
+    """
+    return jsonify({
+        'single_flight': single_flight.metrics(),
+        'heartbeats': heartbeats.metrics(),
+        'replicas': replica_router.metrics(),
+        'queries': query_stats.metrics()
+    }), 200
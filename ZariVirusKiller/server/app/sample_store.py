@@ -0,0 +1,210 @@
+"""
+Content-addressed store of submitted samples.
+
+Each unique sample is kept once, gzip-compressed, under its SHA-256 and
+sharded by the first two bytes of the hash::
+
+    <folder>/ab/cd/abcd...ef.gz
+
+The files are plain gzip (``zcat`` works) written with a fixed header, so
+the same sample always produces the same stored bytes. What is stored and
+when it may be evicted is tracked by the caller; the store only deals with
+files. ``files`` lists them so the caller can sweep files it has no record
+of.
+"""
+import gzip
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+SHA256_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+COPY_BUFFER_SIZE = 1024 * 1024
+TEMP_PREFIX = '.sample-'
+
+
+class SampleStore:
+    def __init__(self, folder, compression_level=6):
+        self.folder = folder
+        self.compression_level = compression_level
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, sha256):
+        sha256 = (sha256 or '').lower()
+        if not SHA256_PATTERN.match(sha256):
+            raise ValueError('Sample key must be a hex SHA-256')
+        return os.path.join(self.folder, sha256[:2], sha256[2:4], f'{sha256}.gz')
+
+    def exists(self, sha256):
+        return os.path.exists(self.path(sha256))
+
+    def put_file(self, source_path, sha256):
+        """
+        Stores the file at ``source_path`` under ``sha256`` unless it is
+        already there. Returns ``(stored_size, created)``.
+        """
+        destination = self.path(sha256)
+        if os.path.exists(destination):
+            return os.path.getsize(destination), False
+
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(destination), prefix=TEMP_PREFIX, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, open(source_path, 'rb') as source:
+                with gzip.GzipFile(filename='', mode='wb', fileobj=raw,
+                                   compresslevel=self.compression_level, mtime=0) as compressed:
+                    shutil.copyfileobj(source, compressed, COPY_BUFFER_SIZE)
+
+            # Another worker may have stored the same sample meanwhile; either copy is identical
+            if os.path.exists(destination):
+                return os.path.getsize(destination), False
+            os.replace(temp_path, destination)
+            return os.path.getsize(destination), True
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def open(self, sha256):
+        """
+        Opens a stored sample for reading its original bytes; raises
+        FileNotFoundError when it is not stored
+        """
+        return gzip.open(self.path(sha256), 'rb')
+
+    def read(self, sha256, max_bytes=-1):
+        with self.open(sha256) as f:
+            return f.read(max_bytes)
+
+    def remove(self, sha256):
+        """
+        Deletes a stored sample; returns the bytes freed
+        """
+        path = self.path(sha256)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return 0
+        return size
+
+    def files(self):
+        """
+        Yields ``(sha256, modified_time)`` for every stored sample; temp
+        files left by interrupted writes are yielded with ``sha256`` None
+        """
+        for directory, _, filenames in os.walk(self.folder):
+            for filename in filenames:
+                if filename.startswith(TEMP_PREFIX):
+                    sha256 = None
+                elif filename.endswith('.gz') and SHA256_PATTERN.match(filename[:-3]):
+                    sha256 = filename[:-3]
+                else:
+                    continue
+                try:
+                    yield sha256, os.path.getmtime(os.path.join(directory, filename))
+                except FileNotFoundError:
+                    continue
+
+    def remove_temp_files(self, older_than):
+        """
+        Deletes temp files last modified before ``older_than``; returns how many
+        """
+        removed = 0
+        for directory, _, filenames in os.walk(self.folder):
+            for filename in filenames:
+                path = os.path.join(directory, filename)
+                try:
+                    if filename.startswith(TEMP_PREFIX) and os.path.getmtime(path) < older_than:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    continue
+        return removed
+
+
+class RescanScheduler:
+    """
+    Runs ``job(version)`` on a background thread for each requested
+    definitions version. Requests made while a run is in progress are
+    coalesced: one more run follows, for the newest version requested.
+    """
+
+    def __init__(self, job):
+        self._job = job
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pending = None
+        self._status = {'running': False, 'version': None, 'pending_version': None,
+                        'started_at': None, 'finished_at': None, 'last_run': None, 'error': None}
+
+    def request(self, version):
+        with self._lock:
+            self._pending = version
+            self._status['pending_version'] = version
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sample-rescan', daemon=True)
+                self._thread.start()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                version, self._pending = self._pending, None
+                if version is None:
+                    # Cleared under the lock, so a later request starts a new thread
+                    self._thread = None
+                    self._status['running'] = False
+                    return
+                self._status.update(running=True, version=version, pending_version=None,
+                                    started_at=time.time(), error=None)
+
+            result, error = None, None
+            try:
+                result = self._job(version)
+            except Exception as e:
+                error = str(e)
+
+            with self._lock:
+                self._status.update(finished_at=time.time(), last_run=result, error=error)
+
+
+class PeriodicTask:
+    """
+    Runs ``job()`` every ``interval`` seconds on a daemon thread, started by
+    the first call to ``start``. Errors are kept in ``status`` and the next
+    run happens on schedule.
+    """
+
+    def __init__(self, job, interval, name='periodic-task'):
+        self._job = job
+        self.interval = interval
+        self._name = name
+        self._lock = threading.Lock()
+        self._thread = None
+        self._status = {'last_run': None, 'finished_at': None, 'error': None}
+
+    def start(self):
+        with self._lock:
+            if self._thread is None and self.interval > 0:
+                self._thread = threading.Thread(target=self._run, name=self._name, daemon=True)
+                self._thread.start()
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            result, error = None, None
+            try:
+                result = self._job()
+            except Exception as e:
+                error = str(e)
+            with self._lock:
+                self._status.update(finished_at=time.time(), last_run=result, error=error)
@@ -0,0 +1,143 @@
+"""
+Bulk JSON encoding of column rows for the list endpoints.
+
+List endpoints select only the columns they return (``db.session.query(...)``
+rows are plain tuples, no ORM objects) and hand the rows to a ``RowEncoder``,
+which encodes the whole list in one call. With orjson installed the rows go
+through orjson; otherwise each row is rendered from a precomputed template
+with the C string escaper from the standard library. Both write UTF-8 with
+non-ASCII characters unescaped and produce the same bytes for str, int,
+bool, None and datetime values. Columns that already hold JSON
+(``pattern_data``) are inserted as-is instead of being parsed and encoded
+again, so they must be valid JSON when written (see
+``VirusSignature.validate_pattern_data``).
+"""
+import json
+from datetime import date, datetime
+
+from flask import current_app
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# orjson.Fragment (3.9+) embeds pre-encoded JSON; older versions use the fallback
+FAST_JSON = orjson is not None and hasattr(orjson, 'Fragment')
+
+VALUE, DATETIME, RAW = 'value', 'datetime', 'raw'
+
+# Escapes like orjson: quotes, backslashes and control characters only
+_encode_string = json.encoder.encode_basestring
+
+
+def _encode_value(value):
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if type(value) is str:
+        return _encode_string(value)
+    if type(value) is int:
+        return int.__repr__(value)
+    if isinstance(value, (datetime, date)):
+        return _encode_string(value.isoformat())
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _encode_datetime(value):
+    return 'null' if value is None else _encode_string(value.isoformat())
+
+
+def _encode_raw(value):
+    return value or 'null'
+
+
+_TEMPLATE_ENCODERS = {VALUE: _encode_value, DATETIME: _encode_datetime, RAW: _encode_raw}
+
+
+def _fragment(value):
+    return orjson.Fragment(value) if value else None
+
+
+class RowEncoder:
+    """
+    Encodes result rows as a JSON array of objects.
+
+    ``fields`` is a list of ``(key, index)`` or ``(key, index, kind)``: the
+    object key, the position of the column in the row, and ``VALUE`` (str,
+    int, bool or None), ``DATETIME`` (ISO 8601, as ``.isoformat()``) or
+    ``RAW`` (text that is already JSON). ``variant`` adds fields depending on
+    one column, as ``(index, {column value: fields})``.
+    """
+
+    def __init__(self, fields, variant=None):
+        self.fields = [self._field(field) for field in fields]
+        self.variant_index = None
+        self.variants = {}
+        if variant is not None:
+            self.variant_index, variants = variant
+            self.variants = {
+                value: [self._field(field) for field in extra]
+                for value, extra in variants.items()
+            }
+
+    @staticmethod
+    def _field(field):
+        key, index, kind = field if len(field) == 3 else (*field, VALUE)
+        if kind not in _TEMPLATE_ENCODERS:
+            raise ValueError(f'Unknown field kind: {kind}')
+        return key, index, kind
+
+    def _fields_for(self, row):
+        if self.variant_index is None:
+            return self.fields
+        return self.fields + self.variants.get(row[self.variant_index], [])
+
+    def dumps(self, rows):
+        """
+        Returns the rows as UTF-8 encoded JSON
+        """
+        if FAST_JSON:
+            return orjson.dumps(self._fast_objects(rows))
+        return self._template_dumps(rows).encode('utf-8')
+
+    def _fast_objects(self, rows):
+        plans = {}
+        objects = []
+        for row in rows:
+            variant = row[self.variant_index] if self.variant_index is not None else None
+            plan = plans.get(variant)
+            if plan is None:
+                plan = plans[variant] = [
+                    (key, index, _fragment if kind == RAW else None)
+                    for key, index, kind in self._fields_for(row)
+                ]
+            objects.append({
+                key: convert(row[index]) if convert else row[index]
+                for key, index, convert in plan
+            })
+        return objects
+
+    def _template_dumps(self, rows):
+        plans = {}
+        parts = []
+        for row in rows:
+            variant = row[self.variant_index] if self.variant_index is not None else None
+            plan = plans.get(variant)
+            if plan is None:
+                plan = plans[variant] = [
+                    (('{' if position == 0 else ',') + _encode_string(key) + ':', index, _TEMPLATE_ENCODERS[kind])
+                    for position, (key, index, kind) in enumerate(self._fields_for(row))
+                ]
+            parts.append(''.join([prefix + encode(row[index]) for prefix, index, encode in plan]) + '}')
+        return '[' + ','.join(parts) + ']'
+
+
+def json_response(body, status=200):
+    """
+    Wraps JSON already encoded by ``RowEncoder.dumps`` in a response
+    """
+    return current_app.response_class(body, status=status, mimetype='application/json')
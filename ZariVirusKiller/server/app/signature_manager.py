@@ -4,6 +4,19 @@ import datetime
 from flask import current_app
 from app import db
 from models import VirusSignature, DefinitionUpdate
+from app.definitions_notifier import definitions_notifier
+from app.snapshot import definitions_cache, snapshot_versions, write_snapshot
+from app.hash_partitions import hash_partitions, normalize_hash
+from app.similarity import decode_similarity_hash
+from app.signature_search import SignatureSearch
+from app.json_stream import (atomic_file, iter_json_object_members, stream_rows,
+                             write_json_array, write_json_object)
+from app.pattern_compiler import PatternCompiler, normalize_patterns
+from app.hash_filter import HashFilter
+from sqlalchemy import select
+
+# Files assembled from the hash partitions per build: (name prefix, extension) by update type
+MERGED_HASH_FILES = {"hash": ("signatures-", ".json"), "filter": ("hashes-", ".bloom")}
 
 class SignatureManager:
     """
@@ -16,9 +29,13 @@ class SignatureManager:
         Adds a hash-based signature to the database
         """
         try:
+            normalized = normalize_hash(hash_value)
+            if normalized is None:
+                return False, "Hash value must be a hex digest of 32 to 64 digits"
+            hash_value = normalized
+            
             # Check if signature already exists
-            existing = VirusSignature.query.filter_by(hash_value=hash_value).first()
-            if existing:
+            if hash_partitions.lookup(hash_value):
                 return False, "Signature with this hash already exists"
             
             # Create new signature
@@ -31,8 +48,28 @@ class SignatureManager:
                 created_at=datetime.datetime.utcnow()
             )
             
+            # Flushed, not committed: the partition row needs the id, and the
+            # catalog row must not outlive a failed partition write
             db.session.add(signature)
-            db.session.commit()
+            db.session.flush()
+            
+            # Index the hash in its prefix partition for lookups and builds.
+            # On Postgres this commits both rows in one transaction; with
+            # SQLite shards the partition row is removed again if the catalog
+            # commit fails.
+            if not hash_partitions.add(hash_value, name, severity, signature_id=signature.id):
+                db.session.delete(signature)
+                db.session.commit()
+                return False, "Signature with this hash already exists"
+            try:
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                hash_partitions.remove(hash_value)
+                raise
+            
+            # Keep the search index in step with the catalog
+            SignatureSearch.index_signature(signature)
             
             # Update definitions file
             SignatureManager.generate_definitions_file()
@@ -48,9 +85,14 @@ class SignatureManager:
         Adds a pattern-based signature to the database
         """
         try:
-            # Validate patterns
-            if not patterns or not isinstance(patterns, list):
-                return False, "Invalid patterns format"
+            # Validate patterns and store them in canonical form
+            try:
+                patterns = normalize_patterns(patterns)
+            except ValueError as e:
+                return False, str(e)
+            
+            if logic not in ("all", "any"):
+                return False, "Logic must be 'all' or 'any'"
             
             # Create signature ID
             signature_id = f"ZARI-{VirusSignature.query.count() + 1:04d}"
@@ -72,6 +114,9 @@ class SignatureManager:
             db.session.add(signature)
             db.session.commit()
             
+            # Keep the search index in step with the catalog
+            SignatureSearch.index_signature(signature)
+            
             # Update definitions file
             SignatureManager.generate_pattern_definitions_file()
             
@@ -81,91 +126,375 @@ class SignatureManager:
             return False, str(e)
     
     @staticmethod
-    def generate_definitions_file():
+    def add_similarity_signature(name, similarity_hash, severity="medium", description=None):
         """
-        Generates the hash-based definitions file
+        Adds a similarity-based signature to the database
         """
         try:
-            # Get all hash-based signatures
-            signatures = VirusSignature.query.filter_by(signature_type="hash").all()
+            # Validate the sketch before storing it
+            try:
+                decode_similarity_hash(similarity_hash)
+            except ValueError as e:
+                return False, str(e)
             
-            # Create definitions dictionary
-            definitions = {}
-            for sig in signatures:
-                definitions[sig.name] = sig.hash_value
+            # Create new signature
+            signature = VirusSignature(
+                name=name,
+                signature_type="similarity",
+                similarity_hash=similarity_hash,
+                severity=severity,
+                description=description or f"Similarity-based signature for {name}",
+                created_at=datetime.datetime.utcnow()
+            )
+            
+            db.session.add(signature)
+            db.session.commit()
+            
+            # Keep the search index in step with the catalog
+            SignatureSearch.index_signature(signature)
+            
+            # Update definitions file
+            SignatureManager.generate_similarity_index_file()
             
+            return True, "Similarity signature added successfully"
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)
+    
+    @staticmethod
+    def generate_definitions_file():
+        """
+        Generates the hash-based definitions file
+        
+        Each digest-prefix partition is built into its own file under
+        definitions/hash/, and only partitions whose generation changed since
+        the last build are rebuilt. The partition files and manifest.json are
+        served as they are; the merged signatures.json is assembled from them
+        on first download (merged_definitions_file), not on every build.
+        
+        Each partition also keeps its own Bloom filter, built in the same pass
+        over its rows. All partition filters share one size, picked for a
+        capacity that only grows by doubling, so hashes.bloom is the OR of
+        them and a build only reads the rows of the changed partitions.
+        """
+        try:
             # Create definitions directory if it doesn't exist
             definitions_dir = current_app.config['DEFINITIONS_FOLDER']
-            os.makedirs(definitions_dir, exist_ok=True)
+            partitions_dir = os.path.join(definitions_dir, "hash")
+            os.makedirs(partitions_dir, exist_ok=True)
             
-            # Write definitions to file
-            definitions_file = os.path.join(definitions_dir, "signatures.json")
-            with open(definitions_file, 'w') as f:
-                json.dump(definitions, f, indent=2)
+            manifest_file = os.path.join(partitions_dir, "manifest.json")
+            manifest = {"prefix_length": hash_partitions.prefix_length, "partitions": {}}
+            if os.path.exists(manifest_file):
+                with open(manifest_file) as f:
+                    previous = json.load(f)
+                if previous.get("prefix_length") == hash_partitions.prefix_length:
+                    manifest = previous
             
-            # Create definition update record
-            version = datetime.datetime.utcnow().strftime("%Y%m%d%H%M")
+            fp_rate = current_app.config['HASH_FILTER_FP_RATE']
+            filter_capacity = manifest.get("filter", {}).get("capacity")
+            if manifest.get("filter", {}).get("fp_rate") != fp_rate:
+                filter_capacity = SignatureManager._filter_capacity(hash_partitions.count())
+            
+            # Rebuild only the partitions that changed, with their filters
+            rebuilt = 0
+            for prefix in hash_partitions.prefixes():
+                generation = hash_partitions.generation(prefix)
+                entry = manifest["partitions"].get(prefix)
+                partition_file = os.path.join(partitions_dir, f"{prefix}.json")
+                
+                if entry and entry["generation"] == generation and os.path.exists(partition_file):
+                    continue
+                
+                hash_filter = HashFilter.for_capacity(filter_capacity, fp_rate)
+                with atomic_file(partition_file) as f:
+                    signature_count = write_json_object(
+                        f, SignatureManager._add_to_filter(hash_filter, hash_partitions.partition_rows(prefix))
+                    )
+                with atomic_file(os.path.join(partitions_dir, f"{prefix}.bloom"), 'wb') as f:
+                    hash_filter.write(f)
+                
+                manifest["partitions"][prefix] = {
+                    "generation": generation,
+                    "signature_count": signature_count,
+                    "file": f"hash/{prefix}.json",
+                    "filter_capacity": filter_capacity
+                }
+                rebuilt += 1
+            
+            # Past capacity the filters are resized, read from the partition
+            # files; doubling keeps this rare
+            total = sum(entry["signature_count"] for entry in manifest["partitions"].values())
+            if total > filter_capacity:
+                filter_capacity = SignatureManager._filter_capacity(total)
+            for prefix, entry in manifest["partitions"].items():
+                filter_file = os.path.join(partitions_dir, f"{prefix}.bloom")
+                if entry.get("filter_capacity") != filter_capacity or not os.path.exists(filter_file):
+                    SignatureManager._write_partition_filter(
+                        os.path.join(partitions_dir, f"{prefix}.json"), filter_file, filter_capacity, fp_rate
+                    )
+                    entry["filter_capacity"] = filter_capacity
+            manifest["filter"] = {"capacity": filter_capacity, "fp_rate": fp_rate}
+            
+            with atomic_file(manifest_file) as f:
+                json.dump(manifest, f, indent=2)
+            
+            # Create definition update records. Their signatures.json and
+            # hashes.bloom (the filter clients use to skip clean files locally)
+            # are merged from the partition files when first downloaded.
+            signature_count = total
+            version = SignatureManager._new_version("hash")
+            definitions_file = SignatureManager._merged_path(partitions_dir, "hash", version)
+            filter_file = SignatureManager._merged_path(partitions_dir, "filter", version)
             update = DefinitionUpdate(
                 version=version,
                 path=definitions_file,
-                signature_count=len(signatures)
+                signature_count=signature_count
+            )
+            filter_update = DefinitionUpdate(
+                version=version,
+                path=filter_file,
+                signature_count=signature_count,
+                update_type="filter"
             )
             
             db.session.add(update)
+            db.session.add(filter_update)
             db.session.commit()
             
-            return True, "Definitions file generated successfully"
+            # Wake clients waiting for a new build
+            definitions_notifier.publish("hash", version)
+            definitions_notifier.publish("filter", version)
+            SignatureManager.publish_snapshot()
+            
+            return True, f"Definitions file generated successfully ({rebuilt} partitions rebuilt)"
         except Exception as e:
             db.session.rollback()
             return False, str(e)
     
+    @staticmethod
+    def _new_version(update_type):
+        """
+        Returns the version for a new build of ``update_type``: the UTC time to
+        the second, moved past the latest recorded version when needed, so
+        every build gets a version clients and the notifier see as new
+        """
+        version = int(datetime.datetime.utcnow().strftime("%Y%m%d%H%M%S"))
+        latest = db.session.execute(
+            select(DefinitionUpdate.version)
+            .where(DefinitionUpdate.update_type == update_type)
+            .order_by(DefinitionUpdate.id.desc())
+            .limit(1)
+        ).scalar()
+        if latest and latest.isdigit():
+            version = max(version, int(latest) + 1)
+        return str(version)
+    
+    @staticmethod
+    def _filter_capacity(count):
+        """
+        Hashes the partition filters are sized for: the next power of two,
+        at least 1024, so the size only changes when the count doubles
+        """
+        capacity = 1024
+        while capacity < count:
+            capacity *= 2
+        return capacity
+    
+    @staticmethod
+    def _add_to_filter(hash_filter, rows):
+        """
+        Passes ``(name, hash_value)`` rows through, adding each hash to ``hash_filter``
+        """
+        for row in rows:
+            hash_filter.add(row[1])
+            yield row
+    
+    @staticmethod
+    def _write_partition_filter(partition_file, filter_file, capacity, fp_rate):
+        """
+        Rebuilds a partition's Bloom filter from its definitions file
+        """
+        hash_filter = HashFilter.for_capacity(capacity, fp_rate)
+        for member in iter_json_object_members(partition_file):
+            hash_filter.add(json.loads(member.rsplit(': ', 1)[1]))
+        
+        with atomic_file(filter_file, 'wb') as f:
+            hash_filter.write(f)
+    
+    @staticmethod
+    def _merge_partition_filters(partitions_dir, prefixes, output_file):
+        """
+        ORs the partition Bloom filters into the published filter
+        """
+        merged = None
+        for prefix in prefixes:
+            hash_filter = HashFilter.load(os.path.join(partitions_dir, f"{prefix}.bloom"))
+            if merged is None:
+                merged = hash_filter
+            else:
+                merged.update(hash_filter)
+        
+        with atomic_file(output_file, 'wb') as f:
+            merged.write(f)
+        
+        return merged
+    
+    @staticmethod
+    def merged_definitions_file(update_type, path):
+        """
+        Returns ``path``, the signatures.json ("hash") or hashes.bloom
+        ("filter") of a hash build, merging it from the partition files the
+        first time it is asked for. Merged files of older builds are removed.
+        """
+        if os.path.exists(path):
+            return path
+        
+        partitions_dir = os.path.dirname(path)
+        if update_type == "hash":
+            SignatureManager._merge_partition_files(partitions_dir, hash_partitions.prefixes(), path)
+        else:
+            SignatureManager._merge_partition_filters(partitions_dir, hash_partitions.prefixes(), path)
+        
+        name_prefix, extension = MERGED_HASH_FILES[update_type]
+        for filename in os.listdir(partitions_dir):
+            stale = os.path.join(partitions_dir, filename)
+            if filename.startswith(name_prefix) and filename.endswith(extension) and stale != path:
+                try:
+                    os.remove(stale)
+                except OSError:
+                    # Still being sent (Windows) or removed by another worker
+                    pass
+        
+        return path
+    
+    @staticmethod
+    def _merged_path(partitions_dir, update_type, version):
+        name_prefix, extension = MERGED_HASH_FILES[update_type]
+        return os.path.join(partitions_dir, f"{name_prefix}{version}{extension}")
+    
+    @staticmethod
+    def _merge_partition_files(partitions_dir, prefixes, output_file):
+        """
+        Merges the per-partition JSON objects into a single JSON object
+        
+        Members are copied line by line, so only one line is held in memory.
+        """
+        signature_count = 0
+        with atomic_file(output_file) as f:
+            f.write('{')
+            for prefix in prefixes:
+                for member in iter_json_object_members(os.path.join(partitions_dir, f"{prefix}.json")):
+                    f.write(',\n' if signature_count else '\n')
+                    f.write(member)
+                    signature_count += 1
+            f.write('\n}\n' if signature_count else '}\n')
+        
+        return signature_count
+    
     @staticmethod
     def generate_pattern_definitions_file():
         """
         Generates the pattern-based definitions file
+        
+        Signatures are streamed into the pattern compiler, which drops
+        duplicate and subsumed patterns and signatures. patterns.json holds
+        the compiled signatures with their scan cost; patterns.report.json
+        lists what was dropped and the low-selectivity patterns to review.
         """
         try:
-            # Get all pattern-based signatures
-            signatures = VirusSignature.query.filter_by(signature_type="pattern").all()
+            compiler = PatternCompiler(
+                min_bytes=current_app.config['PATTERN_MIN_BYTES'],
+                max_matches_per_mb=current_app.config['PATTERN_MAX_MATCHES_PER_MB']
+            )
             
-            # Create signature container
-            signature_container = {
-                "signatures": []
-            }
+            # Stream pattern-based signatures into the compiler
+            rows = stream_rows(db.session, select(
+                VirusSignature.signature_id,
+                VirusSignature.name,
+                VirusSignature.severity,
+                VirusSignature.pattern_data
+            ).where(VirusSignature.signature_type == "pattern").order_by(VirusSignature.id))
+            for signature_id, name, severity, pattern_data in rows:
+                pattern_data = json.loads(pattern_data)
+                compiler.add(signature_id, name, severity, pattern_data.get("patterns"), pattern_data.get("logic", "all"))
             
-            # Add each signature
-            for sig in signatures:
-                pattern_data = json.loads(sig.pattern_data)
-                signature_container["signatures"].append({
-                    "id": sig.signature_id,
-                    "name": sig.name,
-                    "severity": sig.severity,
-                    "patterns": pattern_data["patterns"],
-                    "logic": pattern_data["logic"]
-                })
+            signatures, report = compiler.compile()
             
-            # Create definitions directory if it doesn't exist
+            # Write definitions and the compile report
             definitions_dir = current_app.config['DEFINITIONS_FOLDER']
-            os.makedirs(definitions_dir, exist_ok=True)
-            
-            # Write definitions to file
             patterns_file = os.path.join(definitions_dir, "patterns.json")
-            with open(patterns_file, 'w') as f:
-                json.dump(signature_container, f, indent=2)
+            with atomic_file(patterns_file) as f:
+                signature_count = write_json_array(f, signatures, key="signatures")
+            
+            with atomic_file(os.path.join(definitions_dir, "patterns.report.json")) as f:
+                json.dump(report, f, indent=2)
             
             # Create definition update record
-            version = datetime.datetime.utcnow().strftime("%Y%m%d%H%M")
+            version = SignatureManager._new_version("pattern")
             update = DefinitionUpdate(
                 version=version,
                 path=patterns_file,
-                signature_count=len(signatures),
+                signature_count=signature_count,
                 update_type="pattern"
             )
             
             db.session.add(update)
             db.session.commit()
             
-            return True, "Pattern definitions file generated successfully"
+            # Wake clients waiting for a new build
+            definitions_notifier.publish("pattern", version)
+            SignatureManager.publish_snapshot()
+            
+            return True, (
+                f"Pattern definitions file generated successfully "
+                f"({signature_count} of {report['source_signatures']} signatures, "
+                f"{len(report['flagged'])} flagged)"
+            )
+        except Exception as e:
+            db.session.rollback()
+            return False, str(e)
+    
+    @staticmethod
+    def generate_similarity_index_file():
+        """
+        Generates the similarity definitions file the LSH index is loaded from
+        """
+        try:
+            # Stream similarity-based signatures straight into the file
+            rows = stream_rows(db.session, select(
+                VirusSignature.id,
+                VirusSignature.name,
+                VirusSignature.severity,
+                VirusSignature.similarity_hash
+            ).where(VirusSignature.signature_type == "similarity").order_by(VirusSignature.id))
+            
+            # Write definitions to file
+            definitions_dir = current_app.config['DEFINITIONS_FOLDER']
+            similarity_file = os.path.join(definitions_dir, "similarity.json")
+            with atomic_file(similarity_file) as f:
+                signature_count = write_json_array(f, (
+                    {"id": id, "name": name, "severity": severity, "similarity_hash": similarity_hash}
+                    for id, name, severity, similarity_hash in rows
+                ), key="signatures")
+            
+            # Create definition update record
+            version = SignatureManager._new_version("similarity")
+            update = DefinitionUpdate(
+                version=version,
+                path=similarity_file,
+                signature_count=signature_count,
+                update_type="similarity"
+            )
+            
+            db.session.add(update)
+            db.session.commit()
+            
+            # Wake clients waiting for a new build
+            definitions_notifier.publish("similarity", version)
+            SignatureManager.publish_snapshot()
+            
+            return True, "Similarity definitions file generated successfully"
         except Exception as e:
             db.session.rollback()
             return False, str(e)
@@ -182,6 +511,12 @@ class SignatureManager:
             # Get latest pattern-based definitions
             pattern_update = DefinitionUpdate.query.filter_by(update_type="pattern").order_by(DefinitionUpdate.id.desc()).first()
             
+            # Get latest similarity-based definitions
+            similarity_update = DefinitionUpdate.query.filter_by(update_type="similarity").order_by(DefinitionUpdate.id.desc()).first()
+            
+            # Get latest hash filter
+            filter_update = DefinitionUpdate.query.filter_by(update_type="filter").order_by(DefinitionUpdate.id.desc()).first()
+            
             return {
                 "hash_definitions": {
                     "version": hash_update.version if hash_update else None,
@@ -192,7 +527,36 @@ class SignatureManager:
                     "version": pattern_update.version if pattern_update else None,
                     "signature_count": pattern_update.signature_count if pattern_update else 0,
                     "path": pattern_update.path if pattern_update else None
+                },
+                "similarity_definitions": {
+                    "version": similarity_update.version if similarity_update else None,
+                    "signature_count": similarity_update.signature_count if similarity_update else 0,
+                    "path": similarity_update.path if similarity_update else None
+                },
+                "filter_definitions": {
+                    "version": filter_update.version if filter_update else None,
+                    "signature_count": filter_update.signature_count if filter_update else 0,
+                    "path": filter_update.path if filter_update else None
                 }
             }
         except Exception as e:
-            return {"error": str(e)}
\ No newline at end of file
+            return {"error": str(e)}
+    
+    @staticmethod
+    def get_latest_versions():
+        """
+        Gets the latest published version of each definitions type
+        """
+        return snapshot_versions(SignatureManager.get_latest_definitions())
+    
+    @staticmethod
+    def publish_snapshot():
+        """
+        Refreshes the definitions cache and the snapshot loaded by workers at boot
+        """
+        info = SignatureManager.get_latest_definitions()
+        if "error" in info:
+            raise RuntimeError(info["error"])
+        
+        definitions_cache.set(info, "database")
+        write_snapshot(current_app.config['DEFINITIONS_FOLDER'], info)
@@ -0,0 +1,256 @@
+import json
+import re
+from sqlalchemy import text
+from models import db, VirusSignature
+from app.pattern_compiler import normalize_pattern
+
+MIN_QUERY_LENGTH = 3
+SEARCH_FIELDS = ('name', 'description', 'patterns')
+
+SQLITE_SCHEMA = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS signature_search USING fts5("
+    "name, description, patterns, tokenize='trigram')"
+]
+
+POSTGRES_SCHEMA = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE TABLE IF NOT EXISTS signature_search ("
+    "id INTEGER PRIMARY KEY REFERENCES virus_signature(id) ON DELETE CASCADE, "
+    "name TEXT NOT NULL, description TEXT NOT NULL DEFAULT '', patterns TEXT NOT NULL DEFAULT '')",
+    "CREATE INDEX IF NOT EXISTS ix_signature_search_name ON signature_search USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_signature_search_description ON signature_search USING gin (description gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_signature_search_patterns ON signature_search USING gin (patterns gin_trgm_ops)",
+]
+
+
+def normalize_hex(value):
+    """
+    Uppercases a hex pattern and strips separators, e.g. '4d 5a' -> '4D5A'
+    """
+    return re.sub(r'[^0-9A-Fa-f?]', '', value or '').upper()
+
+
+def hex_tokens(value):
+    """
+    Spells hex digits as space-delimited bytes, e.g. '4D5A' -> ' 4D 5A ', so
+    a substring search only matches whole bytes
+    """
+    return ' ' + ' '.join(value[i:i + 2] for i in range(0, len(value), 2)) + ' '
+
+
+def searchable_patterns(pattern_data):
+    """
+    Flattens a signature's patterns into byte tokens for substring search,
+    one pattern after another separated by '|' so no match spans two.
+    ASCII patterns are hex-encoded so a byte search finds them too.
+    """
+    if not pattern_data:
+        return ''
+
+    try:
+        patterns = json.loads(pattern_data).get('patterns', [])
+    except (ValueError, AttributeError):
+        return ''
+
+    parts = []
+    for pattern in patterns:
+        try:
+            pattern = normalize_pattern(pattern)
+        except ValueError:
+            continue
+        if pattern.kind != 'regex':
+            parts.append(hex_tokens(''.join('??' if byte is None else format(byte, '02X') for byte in pattern.data)))
+    return '|'.join(parts)
+
+
+class SignatureSearch:
+    """
+    Server-side signature search backed by an FTS5 trigram table on SQLite
+    and pg_trgm GIN indexes on Postgres.
+
+    The search table is kept in sync from Python when signatures are added,
+    so both backends index the same normalized text.
+    """
+
+    @staticmethod
+    def dialect():
+        return db.engine.dialect.name
+
+    @staticmethod
+    def ensure_index():
+        """
+        Creates the search table and indexes, then backfills existing signatures
+        """
+        statements = POSTGRES_SCHEMA if SignatureSearch.dialect() == 'postgresql' else SQLITE_SCHEMA
+        with db.engine.begin() as connection:
+            for statement in statements:
+                connection.execute(text(statement))
+
+        return SignatureSearch.rebuild()
+
+    @staticmethod
+    def rebuild(batch_size=5000):
+        """
+        Re-indexes every signature in batches
+        """
+        db.session.execute(text("DELETE FROM signature_search"))
+
+        indexed = 0
+        last_id = 0
+        while True:
+            batch = db.session.query(
+                VirusSignature.id,
+                VirusSignature.name,
+                VirusSignature.description,
+                VirusSignature.pattern_data
+            ).filter(VirusSignature.id > last_id).order_by(VirusSignature.id).limit(batch_size).all()
+            if not batch:
+                break
+
+            SignatureSearch._insert([SignatureSearch._document(*row) for row in batch])
+            indexed += len(batch)
+            last_id = batch[-1].id
+
+        db.session.commit()
+        return indexed
+
+    @staticmethod
+    def index_signature(signature):
+        """
+        Adds or refreshes one signature in the search table
+        """
+        db.session.execute(text("DELETE FROM signature_search WHERE " + SignatureSearch._id_column() + " = :id"),
+                           {'id': signature.id})
+        SignatureSearch._insert([SignatureSearch._document(
+            signature.id, signature.name, signature.description, signature.pattern_data
+        )])
+        db.session.commit()
+
+    @staticmethod
+    def search(query=None, field='all', mode='substring', hex_pattern=None,
+               severity=None, signature_type=None, page=1, per_page=25):
+        """
+        Searches signatures and returns a page of ranked results with facets.
+
+        ``query`` matches name and/or description (``field``) as a substring or,
+        with ``mode='prefix'``, at the start of the field. ``hex_pattern``
+        matches a byte sequence inside the signature's patterns.
+        """
+        terms = []
+        if query:
+            if len(query) < MIN_QUERY_LENGTH:
+                raise ValueError(f'Search terms need at least {MIN_QUERY_LENGTH} characters')
+            columns = ('name', 'description') if field == 'all' else (field,)
+            if any(column not in SEARCH_FIELDS for column in columns):
+                raise ValueError('Invalid search field')
+            terms.append((columns, query, mode == 'prefix'))
+        if hex_pattern:
+            hex_pattern = normalize_hex(hex_pattern)
+            if len(hex_pattern) < MIN_QUERY_LENGTH:
+                raise ValueError(f'Hex patterns need at least {MIN_QUERY_LENGTH} digits')
+            if len(hex_pattern) % 2:
+                raise ValueError('Hex patterns need an even number of digits (whole bytes)')
+            terms.append((('patterns',), hex_tokens(hex_pattern), False))
+        if not terms:
+            raise ValueError('A search query or hex pattern is required')
+
+        if SignatureSearch.dialect() == 'postgresql':
+            match_sql, score_sql, params = SignatureSearch._postgres_match(terms)
+            source = "signature_search ss JOIN virus_signature s ON s.id = ss.id"
+        else:
+            match_sql, score_sql, params = SignatureSearch._sqlite_match(terms)
+            source = "signature_search ss JOIN virus_signature s ON s.id = ss.rowid"
+
+        filters = [match_sql]
+        if severity:
+            filters.append("s.severity = :severity")
+            params['severity'] = severity
+        if signature_type:
+            filters.append("s.signature_type = :signature_type")
+            params['signature_type'] = signature_type
+        where = " AND ".join(filters)
+
+        per_page = max(1, min(per_page, 100))
+        page = max(page, 1)
+        params.update(limit=per_page, offset=(page - 1) * per_page)
+
+        rows = db.session.execute(text(
+            f"SELECT s.id, s.name, s.signature_type, s.severity, s.description, {score_sql} AS score "
+            f"FROM {source} WHERE {where} ORDER BY score DESC, s.id LIMIT :limit OFFSET :offset"
+        ), params).all()
+
+        total = db.session.execute(text(f"SELECT COUNT(*) FROM {source} WHERE {where}"), params).scalar()
+
+        # Facets describe the text matches regardless of the severity/type filters
+        facets = {}
+        for column, key in (('s.severity', 'severity'), ('s.signature_type', 'type')):
+            facets[key] = {
+                value: count for value, count in db.session.execute(text(
+                    f"SELECT {column}, COUNT(*) FROM {source} WHERE {match_sql} GROUP BY {column}"
+                ), params).all()
+            }
+
+        return {
+            'results': [
+                {
+                    'id': row.id,
+                    'name': row.name,
+                    'type': row.signature_type,
+                    'severity': row.severity,
+                    'description': row.description,
+                    'score': round(float(row.score), 6)
+                }
+                for row in rows
+            ],
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'facets': facets
+        }
+
+    @staticmethod
+    def _sqlite_match(terms):
+        # FTS5 query syntax: column filter, quoted trigram phrase, ^ anchors to the start
+        clauses = []
+        for columns, value, prefix in terms:
+            phrase = '"' + value.replace('"', '""') + '"'
+            clauses.append("{" + " ".join(columns) + "} : " + ("^" if prefix else "") + phrase)
+
+        # bm25() is lower for better matches
+        return "signature_search MATCH :match", "-bm25(signature_search)", {'match': " AND ".join(clauses)}
+
+    @staticmethod
+    def _postgres_match(terms):
+        clauses = []
+        scores = []
+        params = {}
+        for index, (columns, value, prefix) in enumerate(terms):
+            escaped = value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            params[f'like_{index}'] = escaped + '%' if prefix else '%' + escaped + '%'
+            params[f'term_{index}'] = value
+            clauses.append("(" + " OR ".join(f"ss.{column} ILIKE :like_{index}" for column in columns) + ")")
+            scores.extend(f"similarity(ss.{column}, :term_{index})" for column in columns)
+
+        return " AND ".join(clauses), "GREATEST(" + ", ".join(scores) + ")", params
+
+    @staticmethod
+    def _id_column():
+        return "id" if SignatureSearch.dialect() == 'postgresql' else "rowid"
+
+    @staticmethod
+    def _document(signature_id, name, description, pattern_data):
+        return {
+            'id': signature_id,
+            'name': name or '',
+            'description': description or '',
+            'patterns': searchable_patterns(pattern_data)
+        }
+
+    @staticmethod
+    def _insert(documents):
+        if not documents:
+            return
+        db.session.execute(text(
+            "INSERT INTO signature_search (" + SignatureSearch._id_column() + ", name, description, patterns) "
+            "VALUES (:id, :name, :description, :patterns)"
+        ), documents)
@@ -0,0 +1,175 @@
+import json
+import os
+import re
+import threading
+import zlib
+
+# Sketch layout: SIMILARITY_BINS 32-bit minimums, split into LSH bands of
+# SIMILARITY_ROWS values. Two samples with Jaccard similarity s share at least
+# one band with probability 1 - (1 - s ** ROWS) ** (BINS / ROWS): about 0.87
+# at s = 0.5 and 0.999 at s = 0.7.
+SIMILARITY_BINS = 128
+SIMILARITY_ROWS = 4
+SHINGLE_SIZE = 8
+SHINGLE_FALLBACK_BYTES = 256 * 1024
+MIN_CHUNKS = 4 * SIMILARITY_BINS
+# Chunk boundaries: call opcodes and 0xFF runs in code, spaces and newlines in text
+CHUNK_ANCHORS = re.compile(rb'[\xe8\xff\x20\x0a]')
+EMPTY_BIN = 0xFFFFFFFF
+HASH_PREFIX = 'mh1'
+
+
+def compute_similarity_hash(data, max_bytes=16 * 1024 * 1024):
+    """
+    Computes a MinHash sketch of the content-defined chunks of ``data``.
+
+    The data is split on a few anchor bytes, so an insertion or edit only
+    changes the chunks it touches. Inputs with too few chunks fall back to
+    byte 8-grams of their first SHINGLE_FALLBACK_BYTES.
+
+    Uses one-permutation hashing: every distinct feature is hashed once with
+    CRC-32, the low bits pick a bin and each bin keeps its minimum. Sorting
+    the hashes first means the bins fill after a few hundred values, so the
+    only per-feature work is done by C builtins (split, crc32, sorted).
+    """
+    data = bytes(data[:max_bytes])
+    features = set(CHUNK_ANCHORS.split(data))
+    if len(features) < MIN_CHUNKS:
+        data = data[:SHINGLE_FALLBACK_BYTES]
+        features = {data[i:i + SHINGLE_SIZE] for i in range(max(len(data) - SHINGLE_SIZE + 1, 1))}
+    features.discard(b'')
+
+    mask = SIMILARITY_BINS - 1
+    bins = [EMPTY_BIN] * SIMILARITY_BINS
+    remaining = SIMILARITY_BINS
+    for value in sorted(map(zlib.crc32, features)):
+        index = value & mask
+        if bins[index] == EMPTY_BIN:
+            bins[index] = value
+            remaining -= 1
+            if remaining == 0:
+                break
+
+    return encode_similarity_hash(bins)
+
+
+def encode_similarity_hash(bins):
+    return f"{HASH_PREFIX}:{len(bins)}:" + ''.join(format(value, '08x') for value in bins)
+
+
+def decode_similarity_hash(similarity_hash):
+    """
+    Parses a similarity hash; raises ValueError when it is malformed
+    """
+    try:
+        prefix, count, payload = similarity_hash.split(':')
+        count = int(count)
+    except (AttributeError, ValueError):
+        raise ValueError('Invalid similarity hash')
+
+    if prefix != HASH_PREFIX or count != SIMILARITY_BINS or len(payload) != count * 8:
+        raise ValueError('Invalid similarity hash')
+
+    return tuple(int(payload[i:i + 8], 16) for i in range(0, len(payload), 8))
+
+
+def similarity(bins_a, bins_b):
+    """
+    Estimates the Jaccard similarity of two sketches
+    """
+    compared = matches = 0
+    for a, b in zip(bins_a, bins_b):
+        if a == EMPTY_BIN and b == EMPTY_BIN:
+            continue
+        compared += 1
+        if a == b:
+            matches += 1
+    return matches / compared if compared else 0.0
+
+
+class LSHIndex:
+    """
+    Locality-sensitive hashing index over similarity sketches.
+
+    Each sketch is split into bands; sketches sharing any band are candidates
+    and only candidates are compared, so a query does not scan every
+    signature.
+    """
+
+    def __init__(self, rows=SIMILARITY_ROWS):
+        self.rows = rows
+        self._buckets = {}
+        self._entries = {}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, key, similarity_hash, metadata=None):
+        bins = decode_similarity_hash(similarity_hash)
+        self._entries[key] = (bins, metadata or {})
+        for band in self._bands(bins):
+            self._buckets.setdefault(band, []).append(key)
+
+    def query(self, similarity_hash, max_distance=0.5, limit=10):
+        """
+        Returns entries within ``max_distance`` (1 - Jaccard), nearest first
+        """
+        bins = decode_similarity_hash(similarity_hash)
+
+        candidates = set()
+        for band in self._bands(bins):
+            candidates.update(self._buckets.get(band, ()))
+
+        results = []
+        for key in candidates:
+            entry_bins, metadata = self._entries[key]
+            distance = 1.0 - similarity(bins, entry_bins)
+            if distance <= max_distance:
+                results.append(dict(metadata, id=key, distance=round(distance, 4)))
+
+        results.sort(key=lambda result: result['distance'])
+        return results[:limit]
+
+    def _bands(self, bins):
+        rows = self.rows
+        for start in range(0, len(bins), rows):
+            band = bins[start:start + rows]
+            # A band made only of empty bins says nothing about similarity
+            if all(value == EMPTY_BIN for value in band):
+                continue
+            yield (start, band)
+
+
+class SimilarityIndexFile:
+    """
+    LSH index loaded from the similarity definitions file and reloaded
+    whenever a newer build replaces it
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._index = LSHIndex()
+        self._mtime = None
+
+    def get(self, path):
+        try:
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return self._index
+
+        with self._lock:
+            if mtime != self._mtime:
+                index = LSHIndex()
+                with open(path) as f:
+                    for signature in json.load(f)['signatures']:
+                        index.add(signature['id'], signature['similarity_hash'], {
+                            'name': signature['name'],
+                            'severity': signature['severity']
+                        })
+                self._index = index
+                self._mtime = mtime
+            return self._index
+
+
+# Shared index for the whole process
+similarity_index = SimilarityIndexFile()
@@ -0,0 +1,99 @@
+import threading
+
+
+class _Call:
+    """
+    An in-flight execution whose result is shared with every waiter
+    """
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Collapses concurrent executions of the same work into one.
+
+    While a call for a key is running, further calls with that key wait for
+    it and receive its result (or its exception) instead of repeating the
+    work. Results must be plain data, not ORM objects, because they are
+    handed to other request threads.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Runs ``fn`` once for all concurrent callers using ``key``
+        """
+        group = key[0] if isinstance(key, tuple) else key
+
+        with self._lock:
+            stats = self._stats.setdefault(group, {'calls': 0, 'executions': 0})
+            stats['calls'] += 1
+
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                leader = False
+            else:
+                call = _Call()
+                self._calls[key] = call
+                stats['executions'] += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+        return call.result
+
+    def metrics(self):
+        """
+        Returns call counts and collapse ratio per key group.
+
+        The collapse ratio is the share of calls that were served by another
+        caller's execution.
+        """
+        with self._lock:
+            result = {}
+            for group, stats in self._stats.items():
+                calls = stats['calls']
+                executions = stats['executions']
+                result[group] = {
+                    'calls': calls,
+                    'executions': executions,
+                    'collapsed': calls - executions,
+                    'collapse_ratio': round((calls - executions) / calls, 4) if calls else 0.0,
+                    'in_flight': sum(1 for key in self._calls if (key[0] if isinstance(key, tuple) else key) == group)
+                }
+            return result
+
+    def reset_metrics(self):
+        """
+        Clears the collected counters
+        """
+        with self._lock:
+            self._stats.clear()
+
+
+# Shared instance for the whole process
+single_flight = SingleFlight()
@@ -0,0 +1,132 @@
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from app.definitions_notifier import definitions_notifier
+from app.json_stream import atomic_file
+
+SNAPSHOT_FILENAME = 'snapshot.json'
+
+
+class DefinitionsCache:
+    """
+    Keeps the latest definitions info in memory for the definitions endpoints.
+
+    Loaded from the prebuilt snapshot at boot, replaced when this process sees
+    a new publish, and reloaded at least every ``ttl`` seconds so builds
+    published by other workers are picked up.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._info = None
+        self._sequence = None
+        self._loaded_at = 0.0
+        self.source = None
+        self.ttl = 5.0
+
+    @property
+    def ready(self):
+        return self._info is not None
+
+    def get(self, loader):
+        """
+        Returns the cached info, calling ``loader`` when it is stale
+        """
+        with self._lock:
+            fresh = (
+                self._info is not None
+                and self._sequence == definitions_notifier.sequence
+                and time.monotonic() - self._loaded_at < self.ttl
+            )
+            if fresh:
+                return self._info
+
+        sequence = definitions_notifier.sequence
+        info = loader()
+        if 'error' not in info:
+            self.set(info, 'database', sequence)
+        return info
+
+    def set(self, info, source, sequence=None):
+        with self._lock:
+            self._info = info
+            self._sequence = definitions_notifier.sequence if sequence is None else sequence
+            self._loaded_at = time.monotonic()
+            self.source = source
+
+
+def snapshot_versions(info):
+    """
+    Extracts the version of each definitions type from definitions info
+    """
+    return {
+        'hash': (info.get('hash_definitions') or {}).get('version'),
+        'pattern': (info.get('pattern_definitions') or {}).get('version'),
+        'similarity': (info.get('similarity_definitions') or {}).get('version'),
+        'filter': (info.get('filter_definitions') or {}).get('version')
+    }
+
+
+def write_snapshot(definitions_dir, info):
+    """
+    Atomically writes the definitions snapshot loaded by workers at boot
+    """
+    snapshot = {
+        'created_at': datetime.utcnow().isoformat(),
+        'definitions': info
+    }
+
+    with atomic_file(os.path.join(definitions_dir, SNAPSHOT_FILENAME)) as f:
+        json.dump(snapshot, f)
+
+
+def load_snapshot(app):
+    """
+    Warms the definitions cache and notifier from the snapshot, without
+    touching the database. Returns False when no usable snapshot exists.
+    """
+    path = os.path.join(app.config['DEFINITIONS_FOLDER'], SNAPSHOT_FILENAME)
+    if not os.path.exists(path):
+        return False
+
+    try:
+        with open(path) as f:
+            info = json.load(f)['definitions']
+    except (OSError, ValueError, KeyError) as e:
+        app.logger.warning('Ignoring unreadable definitions snapshot %s: %s', path, e)
+        return False
+
+    definitions_notifier.seed(snapshot_versions(info))
+    definitions_cache.set(info, 'snapshot')
+    return True
+
+
+def start_warmup(app, loader, max_delay=30.0):
+    """
+    Loads the definitions cache with ``loader`` in a background thread,
+    retrying with backoff until it succeeds. Used by workers booted without
+    a snapshot; /ready reports 503 until the cache is loaded.
+    """
+    def warm():
+        delay = 1.0
+        while not definitions_cache.ready:
+            try:
+                with app.app_context():
+                    info = definitions_cache.get(loader)
+                if 'error' in info:
+                    app.logger.warning('Definitions cache warm-up failed: %s', info['error'])
+            except Exception as e:
+                app.logger.warning('Definitions cache warm-up failed: %s', e)
+            if not definitions_cache.ready:
+                time.sleep(delay)
+                delay = min(delay * 2, max_delay)
+
+    thread = threading.Thread(target=warm, name='definitions-warmup', daemon=True)
+    thread.start()
+    return thread
+
+
+# Shared cache for the whole process
+definitions_cache = DefinitionsCache()
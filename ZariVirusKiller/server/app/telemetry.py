@@ -0,0 +1,188 @@
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import jwt_required
+from sqlalchemy import insert, func
+from models import db, DetectionEvent, DetectionRollup
+from app.db_utils import dialect_insert
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+telemetry_bp = Blueprint('telemetry', __name__)
+
+GRANULARITIES = ('minute', 'hour', 'day')
+
+# Longest accepted value of each event field, from the DetectionEvent columns
+FIELD_LENGTHS = {
+    'signature_id': DetectionEvent.signature_id.type.length,
+    'hash': DetectionEvent.file_hash.type.length,
+    'device_id': DetectionEvent.device_id.type.length
+}
+
+@telemetry_bp.route('/detections', methods=['POST'])
+def ingest_detections():
+    """Ingest a batch of detection events reported by a client"""
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({'error': 'A JSON object with a list of events is required'}), 400
+    events = data.get('events')
+
+    if not events or not isinstance(events, list):
+        return jsonify({'error': 'A list of events is required'}), 400
+
+    default_device_id = data.get('device_id')
+    if default_device_id is not None and not isinstance(default_device_id, str):
+        return jsonify({'error': 'device_id must be a string'}), 400
+    if default_device_id and len(default_device_id) > FIELD_LENGTHS['device_id']:
+        return jsonify({'error': f"device_id is longer than {FIELD_LENGTHS['device_id']} characters"}), 400
+
+    if len(events) > current_app.config['TELEMETRY_MAX_BATCH']:
+        return jsonify({'error': f"At most {current_app.config['TELEMETRY_MAX_BATCH']} events per batch"}), 413
+
+    # Validate and normalize every event before writing anything
+    received_at = datetime.utcnow()
+    oldest = received_at - timedelta(days=current_app.config['TELEMETRY_MAX_EVENT_AGE_DAYS'])
+    newest = received_at + timedelta(seconds=current_app.config['TELEMETRY_MAX_CLOCK_SKEW'])
+    rows = []
+    for index, event in enumerate(events):
+        if not isinstance(event, dict):
+            return jsonify({'error': f'Event {index}: must be an object'}), 400
+
+        signature_id = event.get('signature_id')
+        if not signature_id or not isinstance(signature_id, str):
+            return jsonify({'error': f'Event {index}: signature_id is required'}), 400
+
+        for field in ('hash', 'device_id'):
+            if event.get(field) is not None and not isinstance(event[field], str):
+                return jsonify({'error': f'Event {index}: {field} must be a string'}), 400
+
+        for field, max_length in FIELD_LENGTHS.items():
+            if event.get(field) and len(event[field]) > max_length:
+                return jsonify({'error': f'Event {index}: {field} is longer than {max_length} characters'}), 400
+
+        timestamp = event.get('timestamp')
+        if timestamp is not None and not isinstance(timestamp, str):
+            return jsonify({'error': f'Event {index}: timestamp must be an ISO 8601 string'}), 400
+        try:
+            detected_at = parse_timestamp(timestamp) if timestamp else received_at
+        except (ValueError, OverflowError):
+            return jsonify({'error': f'Event {index}: invalid timestamp'}), 400
+        if not oldest <= detected_at <= newest:
+            # A far-off client clock would otherwise create rollup buckets nobody queries
+            return jsonify({'error': f'Event {index}: timestamp is outside the accepted window'}), 400
+
+        rows.append({
+            'signature_id': signature_id,
+            'file_hash': event.get('hash'),
+            'device_id': event.get('device_id', default_device_id),
+            'detected_at': detected_at,
+            'received_at': received_at
+        })
+
+    try:
+        db.session.execute(insert(DetectionEvent), rows)
+        apply_rollups(rows)
+        db.session.commit()
+
+        return jsonify({'accepted': len(rows)}), 202
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@telemetry_bp.route('/trends', methods=['GET'])
+@jwt_required()
+def get_trends():
+    """Get detection counts per time bucket from the rollup tables"""
+    try:
+        granularity = request.args.get('granularity', 'hour')
+        if granularity not in GRANULARITIES:
+            return jsonify({'error': 'Invalid granularity'}), 400
+
+        until = parse_timestamp(request.args['until']) if request.args.get('until') else datetime.utcnow()
+        since = parse_timestamp(request.args['since']) if request.args.get('since') else until - timedelta(days=1)
+        signature_id = request.args.get('signature_id')
+
+        query = db.session.query(
+            DetectionRollup.bucket_start,
+            DetectionRollup.signature_id,
+            DetectionRollup.count
+        ).filter(
+            DetectionRollup.granularity == granularity,
+            DetectionRollup.bucket_start >= bucket_start(since, granularity),
+            DetectionRollup.bucket_start <= until
+        )
+
+        if signature_id:
+            query = query.filter(DetectionRollup.signature_id == signature_id)
+
+        result = [
+            {'bucket': bucket.isoformat(), 'signature_id': sig_id, 'count': count}
+            for bucket, sig_id, count in query.order_by(DetectionRollup.bucket_start).all()
+        ]
+
+        return jsonify({
+            'granularity': granularity,
+            'since': since.isoformat(),
+            'until': until.isoformat(),
+            'buckets': result
+        }), 200
+    except ValueError:
+        return jsonify({'error': 'Invalid timestamp'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def apply_rollups(rows):
+    """Add a batch of events to the per-signature minute, hour and day rollups"""
+    counts = Counter()
+    for row in rows:
+        for granularity in GRANULARITIES:
+            counts[(granularity, bucket_start(row['detected_at'], granularity), row['signature_id'])] += 1
+
+    table = DetectionRollup.__table__
+    stmt = dialect_insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[table.c.granularity, table.c.bucket_start, table.c.signature_id],
+        set_={'count': table.c.count + stmt.excluded.count}
+    )
+
+    # Upsert in key order so concurrent batches lock the same rows in the
+    # same order instead of deadlocking on Postgres
+    db.session.execute(stmt, [
+        {'granularity': granularity, 'bucket_start': bucket, 'signature_id': signature_id, 'count': count}
+        for (granularity, bucket, signature_id), count in sorted(counts.items())
+    ])
+
+def detection_summary():
+    """Summarize the last 24 hours of detections using the hourly rollups"""
+    since = bucket_start(datetime.utcnow() - timedelta(days=1), 'hour')
+
+    top = db.session.query(
+        DetectionRollup.signature_id,
+        func.sum(DetectionRollup.count).label('total')
+    ).filter(
+        DetectionRollup.granularity == 'hour',
+        DetectionRollup.bucket_start >= since
+    ).group_by(DetectionRollup.signature_id).order_by(func.sum(DetectionRollup.count).desc()).limit(10).all()
+
+    recent = db.session.query(func.coalesce(func.sum(DetectionRollup.count), 0)).filter(
+        DetectionRollup.granularity == 'hour',
+        DetectionRollup.bucket_start >= since
+    ).scalar()
+
+    return {
+        'last_24h': int(recent),
+        'top_signatures': [{'signature_id': sig_id, 'count': int(total)} for sig_id, total in top]
+    }
+
+def bucket_start(timestamp, granularity):
+    """Truncate a timestamp to the start of its minute, hour or day bucket"""
+    if granularity == 'minute':
+        return timestamp.replace(second=0, microsecond=0)
+    if granularity == 'hour':
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+
+def parse_timestamp(value):
+    """Parse an ISO 8601 timestamp into a naive UTC datetime"""
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
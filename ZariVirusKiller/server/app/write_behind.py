@@ -0,0 +1,131 @@
+import atexit
+import threading
+import time
+
+
+def _merge(older, newer):
+    if older is None:
+        return newer
+    if newer is None:
+        return older
+    return dict(older, **{field: value for field, value in newer.items() if value is not None})
+
+
+class WriteBehindBuffer:
+    """
+    Buffers rows in memory and writes them to the database in batches.
+
+    Rows are coalesced by key, so a device reporting many times between two
+    flushes costs a single upsert. A background thread flushes every
+    ``flush_interval`` seconds, or earlier once ``flush_rows`` rows are
+    pending. Together these bound what a crash can lose. ``max_buffered`` is
+    a hard cap: while the database is unreachable and the buffer is full,
+    rows for new keys are dropped instead of growing memory without limit.
+    """
+
+    def __init__(self, writer, flush_interval=30.0, flush_rows=5000, max_buffered=50000):
+        self._writer = writer
+        self._app = None
+        self.flush_interval = flush_interval
+        self.flush_rows = flush_rows
+        self.max_buffered = max_buffered
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._rows = {}
+        self._thread = None
+        self._stats = {'recorded': 0, 'coalesced': 0, 'dropped': 0, 'flushes': 0,
+                       'flushed_rows': 0, 'failed_flushes': 0}
+
+    def init_app(self, app, prefix):
+        """
+        Binds the buffer to an app and reads ``<prefix>_*`` settings from its config
+        """
+        self._app = app
+        self.flush_interval = app.config.get(f'{prefix}_FLUSH_INTERVAL', self.flush_interval)
+        self.flush_rows = app.config.get(f'{prefix}_FLUSH_ROWS', self.flush_rows)
+        self.max_buffered = app.config.get(f'{prefix}_MAX_BUFFERED', self.max_buffered)
+        atexit.register(self._flush_at_exit)
+
+    def record(self, key, row):
+        """
+        Queues a row. A newer row for the same key is merged into the pending
+        one: its non-None fields win and its None fields keep the pending values.
+        """
+        with self._lock:
+            self._stats['recorded'] += 1
+
+            if key in self._rows:
+                self._stats['coalesced'] += 1
+            elif len(self._rows) >= self.max_buffered:
+                self._stats['dropped'] += 1
+                self._wakeup.set()
+                return False
+
+            self._rows[key] = _merge(self._rows.get(key), row)
+            if len(self._rows) >= self.flush_rows:
+                self._wakeup.set()
+
+            # Started lazily so it runs in the worker process, not a pre-fork master
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='write-behind-flusher', daemon=True)
+                self._thread.start()
+
+        return True
+
+    def flush(self):
+        """
+        Writes every pending row in one batch; failed rows are put back
+        """
+        with self._flush_lock:
+            with self._lock:
+                rows, self._rows = self._rows, {}
+
+            if not rows:
+                return 0
+
+            try:
+                if self._app is not None:
+                    with self._app.app_context():
+                        self._writer(list(rows.values()))
+                else:
+                    self._writer(list(rows.values()))
+            except Exception:
+                with self._lock:
+                    self._stats['failed_flushes'] += 1
+                    # Rows recorded since the swap are newer and win
+                    for key, row in rows.items():
+                        self._rows[key] = _merge(row, self._rows.get(key))
+                raise
+
+            with self._lock:
+                self._stats['flushes'] += 1
+                self._stats['flushed_rows'] += len(rows)
+
+            return len(rows)
+
+    def metrics(self):
+        """
+        Returns buffer counters and the number of rows at risk
+        """
+        with self._lock:
+            return dict(self._stats, pending=len(self._rows))
+
+    def _flush_at_exit(self):
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                if self._app is not None:
+                    self._app.logger.warning('Write-behind flush failed: %s', e)
+                # Back off before retrying against an unavailable database
+                time.sleep(min(self.flush_interval, 5.0))
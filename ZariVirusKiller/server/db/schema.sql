@@ -14,3 +14,36 @@ CREATE TABLE definition_update (
     path VARCHAR(256) NOT NULL,
     uploaded_at TIMESTAMP DEFAULT now()
 );
+
+-- Hash signatures partitioned by digest prefix (HASH_PARTITION_PREFIX_LENGTH = 1).
+-- `flask --app run init-db` creates the same layout for other prefix lengths.
+CREATE TABLE hash_signature (
+    prefix VARCHAR(4) NOT NULL,
+    hash_value VARCHAR(64) NOT NULL,
+    signature_id INTEGER,
+    name VARCHAR(128) NOT NULL,
+    severity VARCHAR(16) NOT NULL DEFAULT 'medium',
+    PRIMARY KEY (prefix, hash_value)
+) PARTITION BY LIST (prefix);
+
+CREATE TABLE hash_signature_p0 PARTITION OF hash_signature FOR VALUES IN ('0');
+CREATE TABLE hash_signature_p1 PARTITION OF hash_signature FOR VALUES IN ('1');
+CREATE TABLE hash_signature_p2 PARTITION OF hash_signature FOR VALUES IN ('2');
+CREATE TABLE hash_signature_p3 PARTITION OF hash_signature FOR VALUES IN ('3');
+CREATE TABLE hash_signature_p4 PARTITION OF hash_signature FOR VALUES IN ('4');
+CREATE TABLE hash_signature_p5 PARTITION OF hash_signature FOR VALUES IN ('5');
+CREATE TABLE hash_signature_p6 PARTITION OF hash_signature FOR VALUES IN ('6');
+CREATE TABLE hash_signature_p7 PARTITION OF hash_signature FOR VALUES IN ('7');
+CREATE TABLE hash_signature_p8 PARTITION OF hash_signature FOR VALUES IN ('8');
+CREATE TABLE hash_signature_p9 PARTITION OF hash_signature FOR VALUES IN ('9');
+CREATE TABLE hash_signature_pa PARTITION OF hash_signature FOR VALUES IN ('a');
+CREATE TABLE hash_signature_pb PARTITION OF hash_signature FOR VALUES IN ('b');
+CREATE TABLE hash_signature_pc PARTITION OF hash_signature FOR VALUES IN ('c');
+CREATE TABLE hash_signature_pd PARTITION OF hash_signature FOR VALUES IN ('d');
+CREATE TABLE hash_signature_pe PARTITION OF hash_signature FOR VALUES IN ('e');
+CREATE TABLE hash_signature_pf PARTITION OF hash_signature FOR VALUES IN ('f');
+
+CREATE TABLE hash_partition_state (
+    prefix VARCHAR(4) PRIMARY KEY,
+    generation INTEGER NOT NULL DEFAULT 0
+);
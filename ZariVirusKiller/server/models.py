@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime
+import json
 
 db = SQLAlchemy()
 
@@ -21,7 +23,7 @@ class DefinitionUpdate(db.Model):
     path = db.Column(db.String(256), nullable=False)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     signature_count = db.Column(db.Integer, default=0)
-    update_type = db.Column(db.String(16), default='hash')  # 'hash' or 'pattern'
+    update_type = db.Column(db.String(16), default='hash')  # 'hash', 'pattern', 'similarity' or 'filter'
     
     def __repr__(self):
         return f'<DefinitionUpdate {self.version}>'
@@ -30,14 +32,22 @@ class VirusSignature(db.Model):
     """Model for virus signatures"""
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(128), nullable=False)
-    signature_type = db.Column(db.String(16), default='hash')  # 'hash' or 'pattern'
+    signature_type = db.Column(db.String(16), default='hash')  # 'hash', 'pattern' or 'similarity'
     hash_value = db.Column(db.String(64), nullable=True)  # For hash-based signatures
     signature_id = db.Column(db.String(16), nullable=True)  # For pattern-based signatures
     pattern_data = db.Column(db.Text, nullable=True)  # JSON string for pattern-based signatures
+    similarity_hash = db.Column(db.Text, nullable=True)  # MinHash sketch for similarity-based signatures
     severity = db.Column(db.String(16), default='medium')
     description = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
+    @validates('pattern_data')
+    def validate_pattern_data(self, key, value):
+        # List endpoints embed pattern_data in their responses without parsing it
+        if value is not None:
+            json.loads(value)
+        return value
+    
     def __repr__(self):
         return f'<VirusSignature {self.name}>'
 
@@ -50,4 +60,41 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<User {self.username}>'
+
+class DeviceHeartbeat(db.Model):
+    """Model for device liveness and client version telemetry"""
+    device_id = db.Column(db.String(64), primary_key=True)
+    license_key = db.Column(db.String(128), nullable=True)
+    client_version = db.Column(db.String(32), nullable=True)
+    first_seen = db.Column(db.DateTime, default=datetime.utcnow)
+    last_seen = db.Column(db.DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<DeviceHeartbeat {self.device_id}>'
+
+class DetectionEvent(db.Model):
+    """Model for threat detections reported by clients"""
+    id = db.Column(db.Integer, primary_key=True)
+    signature_id = db.Column(db.String(128), nullable=False)
+    file_hash = db.Column(db.String(64), nullable=True)
+    device_id = db.Column(db.String(64), nullable=True)
+    detected_at = db.Column(db.DateTime, nullable=False, index=True)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<DetectionEvent {self.signature_id}>'
+
+class DetectionRollup(db.Model):
+    """Model for detection counts pre-aggregated per signature and time bucket"""
+    granularity = db.Column(db.String(8), primary_key=True)  # 'minute', 'hour' or 'day'
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    signature_id = db.Column(db.String(128), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    
+    __table_args__ = (
+        db.Index('ix_detection_rollup_signature', 'granularity', 'signature_id', 'bucket_start'),
+    )
+    
+    def __repr__(self):
+        return f'<DetectionRollup {self.granularity} {self.bucket_start} {self.signature_id}>'
\ No newline at end of file
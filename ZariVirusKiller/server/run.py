@@ -5,15 +5,11 @@ import sys
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app import create_app
-from models import db
 
-# Create the Flask application instance
+# Create the Flask application instance. The schema and the initial admin
+# user are created once with `flask --app run init-db`, not by every worker.
 app = create_app()
 
-# Create database tables if they don't exist
-with app.app_context():
-    db.create_all()
-
 if __name__ == '__main__':
     # Get port from environment variable or use default
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,63 @@
+"""
+Benchmarks size, false-positive rate and speed of the hash Bloom filter.
+
+For each signature count and target rate a filter is built from random
+SHA-256 hashes, serialized and parsed back, then queried with --queries
+hashes that are not in it. The measured false-positive rate should stay
+close to the target; the size is compared with signatures.json, which
+holds the same hashes with their names.
+
+    python scripts/bench_hash_filter.py --signatures 100000 1000000 --fp-rates 0.01 0.001 0.0001
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from hash_filter import HashFilter
+
+
+def random_hashes(count):
+    return [os.urandom(32).hex() for _ in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--signatures', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--fp-rates', type=float, nargs='+', default=[0.01, 0.001, 0.0001])
+    parser.add_argument('--queries', type=int, default=200000, help='absent hashes queried per filter')
+    args = parser.parse_args()
+
+    queries = random_hashes(args.queries)
+
+    print(f"{'signatures':>10}  {'target':>8}  {'k':>3}  {'size':>10}  {'bits/hash':>9}  "
+          f"{'json size':>10}  {'measured fp':>11}  {'build/s':>9}  {'query/s':>9}")
+    for count in args.signatures:
+        hashes = random_hashes(count)
+        # signatures.json line: "Name.Of.Signature": "<64 hex>",
+        json_size = count * (64 + 30)
+
+        for fp_rate in args.fp_rates:
+            started = time.perf_counter()
+            hash_filter = HashFilter.for_capacity(count, fp_rate)
+            for hash_value in hashes:
+                hash_filter.add(hash_value)
+            build_seconds = time.perf_counter() - started
+
+            payload = hash_filter.to_bytes()
+            loaded = HashFilter.from_bytes(payload)
+            assert all(hash_value in loaded for hash_value in hashes[:1000]), 'false negative'
+
+            started = time.perf_counter()
+            false_positives = sum(1 for hash_value in queries if hash_value in loaded)
+            query_seconds = time.perf_counter() - started
+
+            print(f'{count:>10}  {fp_rate:>8g}  {loaded.hash_functions:>3}  {len(payload) / 1024:>8.0f}KB  '
+                  f'{loaded.bits / count:>9.2f}  {json_size / 1024:>8.0f}KB  '
+                  f'{false_positives / len(queries):>11.5f}  {count / build_seconds:>9.0f}  '
+                  f'{len(queries) / query_seconds:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
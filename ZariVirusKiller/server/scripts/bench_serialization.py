@@ -0,0 +1,165 @@
+"""
+Benchmarks CPU time of the list endpoints' fetch and JSON encoding.
+
+A temporary SQLite database is filled with --rows signatures (a mix of
+hash, pattern and similarity) and licenses, then each list is produced
+three ways: ORM objects turned into dicts and encoded with json (the old
+code path), column tuples through RowEncoder with the standard library
+template encoder, and column tuples through RowEncoder with orjson (when
+installed). CPU time is reported per 10k rows, split into fetch (for the
+old path this includes building the dicts and parsing pattern_data) and
+encode, and every variant is checked to produce the same JSON.
+
+    python scripts/bench_serialization.py --rows 10000 100000
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from app import create_app, db
+from app import serialization
+from app.routes import SIGNATURE_LIST_ENCODER
+from app.license_manager import LICENSE_LIST_ENCODER
+from models import VirusSignature, LicenseKey
+
+
+def fill(count):
+    now = datetime.utcnow()
+    signatures, licenses = [], []
+    for i in range(count):
+        kind = random.choice(['hash', 'hash', 'pattern', 'similarity'])
+        row = {
+            'name': f'Trojan.Generic.{i}',
+            'signature_type': kind,
+            'severity': random.choice(['low', 'medium', 'high', 'critical']),
+            'created_at': now - timedelta(seconds=i)
+        }
+        if kind == 'hash':
+            row['hash_value'] = os.urandom(32).hex()
+        elif kind == 'pattern':
+            row['signature_id'] = f'P{i:06d}'
+            row['pattern_data'] = json.dumps({'patterns': [
+                {'type': 'hex', 'value': os.urandom(8).hex(), 'offset': 'any'},
+                {'type': 'ascii', 'value': f'evil-{i}', 'offset': 0}
+            ], 'logic': 'all'})
+        else:
+            row['similarity_hash'] = 'mh1:128:' + os.urandom(128).hex()
+        signatures.append(row)
+        licenses.append({
+            'key': f'ZARI-{i:08d}',
+            'created_at': now - timedelta(days=30),
+            'expires_at': now + timedelta(days=random.randint(-60, 300)),
+            'device_id': os.urandom(8).hex() if i % 3 else None
+        })
+    db.session.execute(db.insert(VirusSignature), signatures)
+    db.session.execute(db.insert(LicenseKey), licenses)
+    db.session.commit()
+
+
+def legacy_signatures():
+    result = []
+    for sig in VirusSignature.query.all():
+        data = {'id': sig.id, 'name': sig.name, 'type': sig.signature_type,
+                'severity': sig.severity, 'created_at': sig.created_at.isoformat()}
+        if sig.signature_type == 'hash':
+            data['hash_value'] = sig.hash_value
+        elif sig.signature_type == 'pattern':
+            data['signature_id'] = sig.signature_id
+            data['pattern_data'] = json.loads(sig.pattern_data) if sig.pattern_data else None
+        elif sig.signature_type == 'similarity':
+            data['similarity_hash'] = sig.similarity_hash
+        result.append(data)
+    return result
+
+
+def legacy_licenses():
+    now = datetime.utcnow()
+    return [{'id': lic.id, 'key': lic.key, 'created_at': lic.created_at.isoformat(),
+             'expires_at': lic.expires_at.isoformat(), 'device_id': lic.device_id,
+             'is_active': lic.expires_at > now, 'is_used': lic.device_id is not None}
+            for lic in LicenseKey.query.all()]
+
+
+def signature_rows():
+    return db.session.query(
+        VirusSignature.id, VirusSignature.name, VirusSignature.signature_type, VirusSignature.severity,
+        VirusSignature.created_at, VirusSignature.hash_value, VirusSignature.signature_id,
+        VirusSignature.pattern_data, VirusSignature.similarity_hash
+    ).all()
+
+
+def license_rows():
+    now = datetime.utcnow()
+    return db.session.query(
+        LicenseKey.id, LicenseKey.key, LicenseKey.created_at, LicenseKey.expires_at,
+        LicenseKey.device_id, LicenseKey.expires_at > now, LicenseKey.device_id != None
+    ).all()
+
+
+def measure(fetch, encode, repeat):
+    best_fetch = best_encode = float('inf')
+    for _ in range(repeat):
+        db.session.expunge_all()
+        started = time.process_time()
+        rows = fetch()
+        fetched = time.process_time()
+        body = encode(rows)
+        best_fetch = min(best_fetch, fetched - started)
+        best_encode = min(best_encode, time.process_time() - fetched)
+    return best_fetch, best_encode, body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3, help='runs per variant; the fastest is reported')
+    args = parser.parse_args()
+
+    fast_available = serialization.FAST_JSON
+    print(f"{'list':<11}  {'rows':>7}  {'variant':<15}  {'fetch ms/10k':>12}  {'encode ms/10k':>13}  "
+          f"{'total ms/10k':>12}  {'speedup':>7}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(directory, 'bench.db')}"})
+        with app.app_context():
+            db.create_all()
+            for count in args.rows:
+                db.session.query(VirusSignature).delete()
+                db.session.query(LicenseKey).delete()
+                fill(count)
+
+                for name, legacy, fetch, encoder in (
+                    ('signatures', legacy_signatures, signature_rows, SIGNATURE_LIST_ENCODER),
+                    ('licenses', legacy_licenses, license_rows, LICENSE_LIST_ENCODER)
+                ):
+                    variants = [('orm+json', legacy, lambda result: json.dumps(result).encode())]
+                    variants.append(('columns+stdlib', fetch, encoder.dumps))
+                    if fast_available:
+                        variants.append(('columns+orjson', fetch, encoder.dumps))
+
+                    baseline = expected = None
+                    for variant, fetch_rows, encode in variants:
+                        serialization.FAST_JSON = variant == 'columns+orjson'
+                        fetch_seconds, encode_seconds, body = measure(fetch_rows, encode, args.repeat)
+                        parsed = json.loads(body)
+                        if expected is None:
+                            expected = parsed
+                        assert parsed == expected, f'{variant} output differs'
+
+                        total = fetch_seconds + encode_seconds
+                        baseline = baseline or total
+                        scale = 10000 / count * 1000
+                        print(f'{name:<11}  {count:>7}  {variant:<15}  {fetch_seconds * scale:>12.1f}  '
+                              f'{encode_seconds * scale:>13.1f}  {total * scale:>12.1f}  {baseline / total:>6.1f}x')
+                    serialization.FAST_JSON = fast_available
+            db.session.remove()
+            db.engine.dispose()
+
+if __name__ == '__main__':
+    main()
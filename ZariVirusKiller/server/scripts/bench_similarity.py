@@ -0,0 +1,95 @@
+"""
+Benchmarks recall and query latency of the similarity LSH index.
+
+Real sketches are computed for a set of sample families and for mutated
+variants of each sample (random insertions, as a repacker would produce).
+The index is padded with random sketches up to --signatures entries, and
+every variant is queried both through the LSH index and by a linear scan.
+
+    python scripts/bench_similarity.py --signatures 100000 --families 200
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+from similarity import (LSHIndex, SIMILARITY_BINS, compute_similarity_hash, decode_similarity_hash,
+                        encode_similarity_hash, similarity)
+
+
+def mutate(data, edits, rng):
+    data = bytearray(data)
+    for _ in range(edits):
+        position = rng.randrange(len(data))
+        data[position:position] = os.urandom(rng.randint(1, 64))
+    return bytes(data)
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--signatures', type=int, default=100000, help='total signatures in the index')
+    parser.add_argument('--families', type=int, default=200, help='real samples with queried variants')
+    parser.add_argument('--sample-size', type=int, default=64 * 1024, help='bytes per sample')
+    parser.add_argument('--edits', type=int, default=20, help='random insertions per variant')
+    parser.add_argument('--max-distance', type=float, default=0.5)
+    parser.add_argument('--linear-queries', type=int, default=20, help='queries timed with a linear scan')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    index = LSHIndex()
+    entries = []
+
+    start = time.perf_counter()
+    samples = [os.urandom(args.sample_size) for _ in range(args.families)]
+    for family, sample in enumerate(samples):
+        sketch = compute_similarity_hash(sample)
+        index.add(family, sketch)
+        entries.append((family, decode_similarity_hash(sketch)))
+    sketch_seconds = time.perf_counter() - start
+
+    for key in range(args.families, args.signatures):
+        sketch = encode_similarity_hash([rng.getrandbits(32) for _ in range(SIMILARITY_BINS)])
+        index.add(key, sketch)
+        entries.append((key, decode_similarity_hash(sketch)))
+
+    variants = [compute_similarity_hash(mutate(sample, args.edits, rng)) for sample in samples]
+
+    latencies = []
+    found = 0
+    for family, variant in enumerate(variants):
+        started = time.perf_counter()
+        matches = index.query(variant, max_distance=args.max_distance)
+        latencies.append((time.perf_counter() - started) * 1000)
+        if any(match['id'] == family for match in matches):
+            found += 1
+
+    linear_latencies = []
+    linear_found = 0
+    for family, variant in enumerate(variants[:args.linear_queries]):
+        bins = decode_similarity_hash(variant)
+        started = time.perf_counter()
+        matches = [key for key, entry in entries if 1.0 - similarity(bins, entry) <= args.max_distance]
+        linear_latencies.append((time.perf_counter() - started) * 1000)
+        if family in matches:
+            linear_found += 1
+
+    sample_mb = args.families * args.sample_size / (1024 * 1024)
+    print(f'signatures:        {len(index)}')
+    print(f'sketching:         {sample_mb / sketch_seconds:.1f} MB/s')
+    print(f'LSH recall:        {found / len(variants):.3f} ({found}/{len(variants)} variants)')
+    print(f'LSH latency:       p50 {statistics.median(latencies):.3f} ms, p99 {percentile(latencies, 0.99):.3f} ms')
+    print(f'linear recall:     {linear_found / len(linear_latencies):.3f}')
+    print(f'linear latency:    p50 {statistics.median(linear_latencies):.3f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,406 @@
+"""
+Replays the traffic of a client fleet against a running server.
+
+Each simulated device verifies its license at launch, then polls
+/api/definitions every think time (exponentially distributed), downloads
+the definitions types whose version changed after a random jitter, and now
+and then scans a burst of files through /api/check-file. Devices start
+according to the ramp profile: all at once (burst), evenly over
+--ramp-seconds (linear) or in --ramp-steps batches (step). --publish-at
+adds a hash signature at the given seconds into the run, so the fleet
+reacts to a new definitions build.
+
+Requests are sent by --concurrency threads with keep-alive connections;
+"schedule lag" shows how far behind the harness itself fell, and should
+stay low for the latencies to mean anything. Query counts come from
+/api/metrics and are per worker process: run the server with a single
+process (flask run, or gunicorn -w 1 --threads N) to see them all.
+
+    python scripts/load_test.py --fleet 50000 --ramp burst --duration 120 --publish-at 60
+"""
+import argparse
+import hashlib
+import heapq
+import http.client
+import itertools
+import json
+import math
+import os
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+from concurrent.futures import ThreadPoolExecutor
+
+CLIENT_VERSION = 'loadtest'
+
+
+class Client:
+    """
+    Keep-alive JSON client, one connection per thread
+    """
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port
+        self.https = url.scheme == 'https'
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def request(self, method, path, body=None, token=None):
+        headers = {'Connection': 'keep-alive'}
+        if body is not None:
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        # A server may close an idle keep-alive connection; retry once on a fresh one
+        for attempt in range(2):
+            connection = self._connection()
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                payload = response.read()
+                return response.status, payload
+            except (http.client.HTTPException, ConnectionError):
+                self._local.connection = None
+                connection.close()
+                if attempt:
+                    raise
+
+    def json(self, method, path, body=None, token=None):
+        status, payload = self.request(method, path, body, token)
+        try:
+            return status, json.loads(payload) if payload else None
+        except ValueError:
+            return status, None
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+            connection = cls(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+        return connection
+
+
+class Stats:
+    """
+    Latencies and status codes per endpoint
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = {}
+        self.statuses = {}
+        self.errors = {}
+        self.schedule_lag = []
+
+    def record(self, endpoint, latency, status=None, error=None):
+        with self._lock:
+            self.latencies.setdefault(endpoint, []).append(latency)
+            counts = self.statuses.setdefault(endpoint, {})
+            key = status if status is not None else type(error).__name__
+            counts[key] = counts.get(key, 0) + 1
+            if error is not None or status >= 400:
+                self.errors[endpoint] = self.errors.get(endpoint, 0) + 1
+
+    def record_lag(self, lag):
+        with self._lock:
+            self.schedule_lag.append(lag)
+
+
+class Scheduler:
+    """
+    Time-ordered queue of device actions shared by the worker threads
+    """
+
+    def __init__(self):
+        self._heap = []
+        self._condition = threading.Condition()
+        self._counter = itertools.count()
+
+    def schedule(self, when, device, action):
+        with self._condition:
+            heapq.heappush(self._heap, (when, next(self._counter), device, action))
+            self._condition.notify()
+
+    def next(self, deadline):
+        """
+        Blocks until an action is due; returns None once ``deadline`` passes
+        """
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                if now >= deadline:
+                    return None
+                if self._heap and self._heap[0][0] <= now:
+                    when, _, device, action = heapq.heappop(self._heap)
+                    return when, device, action
+                wait = deadline - now
+                if self._heap:
+                    wait = min(wait, self._heap[0][0] - now)
+                self._condition.wait(wait)
+
+
+class Device:
+    def __init__(self, index, license_key):
+        self.device_id = f'loadtest-{index:06d}'
+        self.license_key = license_key
+        self.versions = {}
+
+
+class Fleet:
+    def __init__(self, args, client, licenses):
+        self.args = args
+        self.client = client
+        self.stats = Stats()
+        self.scheduler = Scheduler()
+        self.rng = random.Random(args.seed)
+        self.rng_lock = threading.Lock()
+        self.devices = [Device(i, licenses[i % len(licenses)] if licenses else None) for i in range(args.fleet)]
+        self.known_hashes = []
+
+    def random(self):
+        with self.rng_lock:
+            return self.rng.random()
+
+    def start_times(self, started):
+        args = self.args
+        for index, device in enumerate(self.devices):
+            if args.ramp == 'burst':
+                offset = 0.0
+            elif args.ramp == 'step':
+                step = index * args.ramp_steps // len(self.devices)
+                offset = step * args.ramp_seconds / args.ramp_steps
+            else:
+                offset = index * args.ramp_seconds / len(self.devices)
+            self.scheduler.schedule(started + offset, device, 'launch')
+
+    def think(self):
+        return -self.args.think_time * math.log(1.0 - self.random())
+
+    def call(self, endpoint, method, path, body=None):
+        started = time.perf_counter()
+        try:
+            status, payload = self.client.json(method, path, body)
+        except Exception as e:
+            self.stats.record(endpoint, time.perf_counter() - started, error=e)
+            return None, None
+        self.stats.record(endpoint, time.perf_counter() - started, status=status)
+        return status, payload
+
+    def download(self, endpoint, path):
+        started = time.perf_counter()
+        try:
+            status, _ = self.client.request('GET', path)
+        except Exception as e:
+            self.stats.record(endpoint, time.perf_counter() - started, error=e)
+            return
+        self.stats.record(endpoint, time.perf_counter() - started, status=status)
+
+    def run_action(self, device, action):
+        """
+        Performs one device action and returns the next one to schedule
+        """
+        now = time.monotonic()
+        if action == 'launch':
+            if device.license_key:
+                self.call('verify-license', 'POST', '/api/verify-license', {
+                    'key': device.license_key,
+                    'device_id': device.device_id,
+                    'client_version': CLIENT_VERSION
+                })
+            self.poll(device, initial=True)
+            return now + self.think(), 'tick'
+
+        if action.startswith('download:'):
+            self.download('download-definitions', f"/api/download-definitions/{action.split(':', 1)[1]}")
+            return None
+
+        # Regular tick: scan a burst of files sometimes, otherwise poll
+        if self.random() < self.args.burst_probability:
+            for _ in range(self.args.burst_size):
+                self.call('check-file', 'POST', '/api/check-file', {'hash': self.file_hash()})
+        else:
+            self.poll(device)
+        return now + self.think(), 'tick'
+
+    def poll(self, device, initial=False):
+        status, payload = self.call('definitions', 'GET', '/api/definitions')
+        if status != 200 or not payload:
+            return
+
+        for update_type in ('hash', 'pattern', 'similarity'):
+            version = (payload.get(f'{update_type}_definitions') or {}).get('version')
+            if not version:
+                continue
+            if device.versions.get(update_type) != version and not initial:
+                jitter = self.random() * self.args.download_jitter
+                self.scheduler.schedule(time.monotonic() + jitter, device, f'download:{update_type}')
+            device.versions[update_type] = version
+
+    def file_hash(self):
+        # Mostly clean files, with the occasional known-bad hash
+        if self.known_hashes and self.random() < self.args.infected_ratio:
+            return self.known_hashes[int(self.random() * len(self.known_hashes))]
+        return hashlib.sha256(os.urandom(16)).hexdigest()
+
+    def worker(self, deadline):
+        while True:
+            item = self.scheduler.next(deadline)
+            if item is None:
+                return
+            when, device, action = item
+            self.stats.record_lag(time.monotonic() - when)
+
+            following = self.run_action(device, action)
+            if following is not None and following[0] < deadline:
+                self.scheduler.schedule(following[0], device, following[1])
+
+
+def login(client, username, password):
+    status, payload = client.json('POST', '/auth/login', {'username': username, 'password': password})
+    if status != 200:
+        raise SystemExit(f'Login failed ({status}): {payload}')
+    return payload['access_token']
+
+
+def create_licenses(client, token, count, concurrency):
+    """
+    Issues one license per device, so activations do not collide
+    """
+    def create(_):
+        status, payload = client.json('POST', '/api/license/licenses', {'duration_days': 30}, token=token)
+        if status != 201:
+            raise SystemExit(f'Could not create license ({status}): {payload}')
+        return payload['key']
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return list(pool.map(create, range(count)))
+
+
+def publish(client, token, fleet, stats):
+    """
+    Adds a hash signature, triggering a new definitions build
+    """
+    hash_value = hashlib.sha256(os.urandom(32)).hexdigest()
+    started = time.perf_counter()
+    status, payload = client.json('POST', '/api/add-signature', {
+        'type': 'hash',
+        'name': f'LoadTest.{hash_value[:8]}',
+        'hash': hash_value,
+        'severity': 'low'
+    }, token=token)
+    stats.record('publish', time.perf_counter() - started, status=status)
+    if status in (200, 201):
+        fleet.known_hashes.append(hash_value)
+
+
+def query_metrics(client, token):
+    if not token:
+        return None
+    status, payload = client.json('GET', '/api/metrics', token=token)
+    return payload.get('queries') if status == 200 and payload else None
+
+
+def percentile(values, fraction):
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def report(stats, elapsed, queries_before, queries_after):
+    total = sum(len(latencies) for latencies in stats.latencies.values())
+    errors = sum(stats.errors.values())
+    print(f'duration:        {elapsed:.1f} s')
+    print(f'requests:        {total} ({total / elapsed:.1f} req/s), errors {errors} ({errors / max(total, 1):.2%})')
+
+    lag = sorted(stats.schedule_lag) or [0.0]
+    print(f'schedule lag:    p50 {percentile(lag, 0.5) * 1000:.1f} ms, p99 {percentile(lag, 0.99) * 1000:.1f} ms')
+    print()
+    print(f"{'endpoint':<22}{'count':>8}{'req/s':>9}{'p50 ms':>9}{'p90 ms':>9}{'p99 ms':>9}{'max ms':>9}{'errors':>9}  statuses")
+    for endpoint in sorted(stats.latencies):
+        latencies = sorted(stats.latencies[endpoint])
+        count = len(latencies)
+        print(
+            f'{endpoint:<22}{count:>8}{count / elapsed:>9.1f}'
+            f'{percentile(latencies, 0.5) * 1000:>9.1f}{percentile(latencies, 0.9) * 1000:>9.1f}'
+            f'{percentile(latencies, 0.99) * 1000:>9.1f}{latencies[-1] * 1000:>9.1f}'
+            f'{stats.errors.get(endpoint, 0) / count:>9.2%}  {stats.statuses[endpoint]}'
+        )
+
+    if queries_before is not None and queries_after is not None:
+        queries = queries_after['total'] - queries_before['total']
+        print()
+        print(f'db queries:      {queries} ({queries / elapsed:.1f}/s, {queries / max(total, 1):.2f} per request)')
+        print(f"db time:         {queries_after['time_ms'] - queries_before['time_ms']:.0f} ms")
+        for kind, after in sorted(queries_after['by_kind'].items()):
+            count = after['count'] - queries_before['by_kind'].get(kind, {}).get('count', 0)
+            if count:
+                print(f'  {kind:<14} {count}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--fleet', type=int, default=1000, help='simulated devices')
+    parser.add_argument('--duration', type=float, default=60, help='seconds to run')
+    parser.add_argument('--ramp', choices=['burst', 'linear', 'step'], default='linear')
+    parser.add_argument('--ramp-seconds', type=float, default=10)
+    parser.add_argument('--ramp-steps', type=int, default=5)
+    parser.add_argument('--think-time', type=float, default=30, help='mean seconds between device actions')
+    parser.add_argument('--burst-probability', type=float, default=0.1, help='chance an action is a check-file burst')
+    parser.add_argument('--burst-size', type=int, default=20, help='check-file calls per burst')
+    parser.add_argument('--infected-ratio', type=float, default=0.01, help='share of scanned hashes that are known')
+    parser.add_argument('--download-jitter', type=float, default=10, help='max seconds before downloading a new build')
+    parser.add_argument('--publish-at', type=float, action='append', default=[], help='seconds into the run to publish')
+    parser.add_argument('--concurrency', type=int, default=64, help='threads sending requests')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default=os.getenv('ADMIN_PASSWORD', 'admin123'))
+    parser.add_argument('--licenses', type=int, default=None,
+                        help='licenses to issue before the run (default: one per device, 0 to skip verify-license)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    client = Client(args.url, args.timeout)
+    token = login(client, args.username, args.password) if args.password else None
+    if token is None and (args.publish_at or args.licenses != 0):
+        raise SystemExit('--password (or ADMIN_PASSWORD) is required to issue licenses and publish')
+
+    licenses = []
+    license_count = args.fleet if args.licenses is None else args.licenses
+    if license_count:
+        print(f'issuing {license_count} licenses...')
+        licenses = create_licenses(client, token, license_count, args.concurrency)
+
+    fleet = Fleet(args, client, licenses)
+    queries_before = query_metrics(client, token)
+
+    started = time.monotonic()
+    deadline = started + args.duration
+    fleet.start_times(started)
+
+    publishers = []
+    for offset in args.publish_at:
+        timer = threading.Timer(offset, publish, (client, token, fleet, fleet.stats))
+        timer.daemon = True
+        timer.start()
+        publishers.append(timer)
+
+    print(f'running {args.fleet} devices for {args.duration:.0f} s ({args.ramp} ramp)...')
+    threads = [threading.Thread(target=fleet.worker, args=(deadline,), daemon=True) for _ in range(args.concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for timer in publishers:
+        timer.cancel()
+    elapsed = time.monotonic() - started
+
+    report(fleet.stats, elapsed, queries_before, query_metrics(client, token))
+
+
+if __name__ == '__main__':
+    main()
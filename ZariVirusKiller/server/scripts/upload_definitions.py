@@ -0,0 +1,126 @@
+"""
+Uploads a definitions bundle with the chunked, resumable upload protocol.
+
+The bundle is hashed, an upload session is created (or resumed with
+--resume), and chunks are sent with their SHA-256. On a network error or a
+rejected chunk the script asks the server for its offset and continues from
+there, so an interrupted upload never starts over.
+
+    python scripts/upload_definitions.py definitions_2.4.0.zip --version 2.4.0 --signature-count 120000
+"""
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import time
+from urllib.parse import urlsplit
+
+
+def sha256_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            hasher.update(block)
+    return hasher.hexdigest()
+
+
+class Server:
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        cls = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.connect = lambda: cls(url.hostname, url.port, timeout=timeout)
+        self.prefix = url.path.rstrip('/')
+
+    def request(self, method, path, body=None, headers=None):
+        headers = dict(headers or {})
+        if isinstance(body, dict):
+            body = json.dumps(body)
+            headers['Content-Type'] = 'application/json'
+        connection = self.connect()
+        try:
+            connection.request(method, self.prefix + path, body=body, headers=headers)
+            response = connection.getresponse()
+            payload = response.read()
+            return response.status, json.loads(payload) if payload else {}
+        finally:
+            connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('bundle')
+    parser.add_argument('--version', required=True)
+    parser.add_argument('--signature-count', type=int, default=0)
+    parser.add_argument('--url', default='http://127.0.0.1:5000')
+    parser.add_argument('--resume', help='upload id of an interrupted upload')
+    parser.add_argument('--retries', type=int, default=10, help='consecutive failures before giving up')
+    parser.add_argument('--timeout', type=float, default=120)
+    args = parser.parse_args()
+
+    server = Server(args.url, args.timeout)
+    size = os.path.getsize(args.bundle)
+    digest = sha256_file(args.bundle)
+
+    if args.resume:
+        status, upload = server.request('GET', f'/upload-definitions/sessions/{args.resume}')
+    else:
+        status, upload = server.request('POST', '/upload-definitions/sessions', {
+            'version': args.version,
+            'size': size,
+            'sha256': digest,
+            'signature_count': args.signature_count
+        })
+    if status not in (200, 201):
+        raise SystemExit(f'Could not start the upload ({status}): {upload}')
+
+    upload_id = upload['upload_id']
+    chunk_size = upload['chunk_size']
+    offset = upload['offset']
+    print(f'upload {upload_id}: {size} bytes, resuming at {offset}')
+
+    failures = 0
+    with open(args.bundle, 'rb') as f:
+        while offset < size:
+            f.seek(offset)
+            chunk = f.read(chunk_size)
+            try:
+                status, result = server.request('PUT', f'/upload-definitions/sessions/{upload_id}', chunk, {
+                    'Upload-Offset': str(offset),
+                    'X-Chunk-SHA256': hashlib.sha256(chunk).hexdigest(),
+                    'Content-Type': 'application/octet-stream'
+                })
+            except (OSError, http.client.HTTPException) as e:
+                status, result = None, {'error': str(e)}
+
+            if status == 200:
+                offset = result['offset']
+                failures = 0
+                print(f'  {offset}/{size} bytes')
+                continue
+
+            failures += 1
+            if failures > args.retries:
+                raise SystemExit(f'Giving up after {args.retries} failures; resume with --resume {upload_id}')
+            print(f'  chunk at {offset} failed ({status}): {result.get("error")}; retrying')
+            time.sleep(min(2 ** failures, 30))
+
+            # The server knows how much it kept
+            if result.get('offset') is not None:
+                offset = result['offset']
+            else:
+                try:
+                    status, current = server.request('GET', f'/upload-definitions/sessions/{upload_id}')
+                    if status == 200:
+                        offset = current['offset']
+                except (OSError, http.client.HTTPException):
+                    pass
+
+    status, result = server.request('POST', f'/upload-definitions/sessions/{upload_id}/complete')
+    if status != 201:
+        raise SystemExit(f'Could not publish the upload ({status}): {result}')
+    print(f"published version {result['version']} ({result['sha256']})")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+import os
+import sys
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVER_DIR)
+
+from app import create_app, db  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    """
+    The application on a fresh SQLite database, with its files under tmp_path
+    """
+    from app.hash_partitions import hash_partitions
+    from app.signature_search import SignatureSearch
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'test.db'}",
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'DEFINITIONS_FOLDER': str(tmp_path / 'definitions'),
+        'HASH_PARTITION_FOLDER': str(tmp_path / 'partitions'),
+        'HASH_PARTITION_BACKEND': 'sqlite',
+        'DEFINITIONS_WARMUP': False,
+        'JWT_SECRET_KEY': 'test-secret-key-long-enough-for-hs256'
+    })
+    os.makedirs(app.config['DEFINITIONS_FOLDER'], exist_ok=True)
+
+    with app.app_context():
+        db.create_all()
+        hash_partitions.ensure_schema()
+        SignatureSearch.ensure_index()
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    from flask_jwt_extended import create_access_token
+    return {'Authorization': f'Bearer {create_access_token(identity="admin")}'}
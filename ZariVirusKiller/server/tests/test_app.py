@@ -0,0 +1,66 @@
+import time
+
+import pytest
+
+from app.snapshot import definitions_cache, start_warmup, write_snapshot
+from app.signature_manager import SignatureManager
+
+
+@pytest.fixture
+def cold_cache(monkeypatch):
+    monkeypatch.setattr(definitions_cache, '_info', None)
+    monkeypatch.setattr(definitions_cache, 'source', None)
+
+
+def test_health_reports_startup_times(client):
+    response = client.get('/health')
+    assert response.status_code == 200
+    assert response.get_json()['startup']['boot_ms'] >= 0
+
+
+def test_ready_reports_a_cold_cache_without_loading_it(client, cold_cache, monkeypatch):
+    def unexpected_load():
+        raise AssertionError('/ready must not query the database')
+
+    monkeypatch.setattr(SignatureManager, 'get_latest_definitions', staticmethod(unexpected_load))
+    response = client.get('/ready')
+    assert response.status_code == 503
+    assert response.get_json()['status'] == 'warming'
+
+
+def test_warmup_loads_the_cache_and_retries_failures(app, client, cold_cache):
+    attempts = []
+
+    def loader():
+        attempts.append(1)
+        return {'error': 'database down'} if len(attempts) == 1 else {'hash_definitions': None}
+
+    start_warmup(app, loader, max_delay=0.01).join(5)
+    assert len(attempts) == 2
+    response = client.get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['definitions_source'] == 'database'
+
+
+def test_snapshot_makes_a_new_worker_ready(app, cold_cache):
+    from app import create_app
+
+    write_snapshot(app.config['DEFINITIONS_FOLDER'], {'hash_definitions': {'version': '1'}})
+    worker = create_app(dict(app.config, DEFINITIONS_WARMUP=False))
+    response = worker.test_client().get('/ready')
+    assert response.status_code == 200
+    assert response.get_json()['definitions_source'] == 'snapshot'
+
+
+def test_admin_views_are_served_by_the_lazy_loader(app, client, auth_headers):
+    from app.auth import create_initial_admin
+
+    create_initial_admin(app)
+    response = client.post('/auth/login', json={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 200
+    assert response.get_json()['user'] == {'username': 'admin', 'is_admin': True}
+
+    assert client.post('/auth/login', json={'username': 'admin', 'password': 'wrong'}).status_code == 401
+    assert client.get('/auth/users').status_code == 401
+    assert client.get('/auth/users', headers=auth_headers).status_code == 200
+    assert client.get('/api/license/licenses', headers=auth_headers).status_code == 200
@@ -0,0 +1,141 @@
+import hashlib
+import io
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from app.chunked_upload import ChunkedUploadStore, UploadError, save_stream
+
+PAYLOAD = os.urandom(300000)
+SHA256 = hashlib.sha256(PAYLOAD).hexdigest()
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ChunkedUploadStore(str(tmp_path / 'uploads'), max_size=1024 * 1024)
+
+
+def append(store, upload_id, offset, chunk, chunk_sha256=None):
+    return store.append(upload_id, offset, io.BytesIO(chunk), len(chunk), chunk_sha256)
+
+
+def test_upload_in_chunks_and_resume_from_another_worker(store, tmp_path):
+    upload_id = store.create(len(PAYLOAD), SHA256, {'version': '2.4.0'})['upload_id']
+    append(store, upload_id, 0, PAYLOAD[:100000])
+
+    # A second store stands in for another worker without the cached hasher
+    other = ChunkedUploadStore(store.folder, store.max_size)
+    assert other.status(upload_id)['offset'] == 100000
+    append(other, upload_id, 100000, PAYLOAD[100000:])
+
+    destination = str(tmp_path / 'published' / 'definitions.zip')
+    metadata = other.complete(upload_id, destination)
+    assert metadata == {'version': '2.4.0', 'sha256': SHA256, 'size': len(PAYLOAD)}
+    with open(destination, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert os.listdir(store.folder) == []
+
+
+def test_repeated_offset_is_rejected_with_the_current_offset(store):
+    upload_id = store.create(len(PAYLOAD), SHA256)['upload_id']
+    append(store, upload_id, 0, PAYLOAD[:1000])
+
+    with pytest.raises(UploadError) as error:
+        append(store, upload_id, 0, PAYLOAD[:1000])
+    assert (error.value.status, error.value.offset) == (409, 1000)
+
+
+def test_chunk_sha_mismatch_drops_the_chunk(store):
+    upload_id = store.create(len(PAYLOAD), SHA256)['upload_id']
+    with pytest.raises(UploadError) as error:
+        append(store, upload_id, 0, PAYLOAD[:1000], chunk_sha256='0' * 64)
+    assert error.value.status == 422
+    assert store.status(upload_id)['offset'] == 0
+
+
+def test_truncated_chunk_is_dropped(store):
+    upload_id = store.create(len(PAYLOAD), SHA256)['upload_id']
+    with pytest.raises(UploadError):
+        store.append(upload_id, 0, io.BytesIO(PAYLOAD[:500]), 1000)
+    assert store.status(upload_id)['offset'] == 0
+
+
+def test_file_sha_mismatch_discards_the_upload(store, tmp_path):
+    upload_id = store.create(len(PAYLOAD), 'f' * 64)['upload_id']
+    append(store, upload_id, 0, PAYLOAD)
+
+    with pytest.raises(UploadError) as error:
+        store.complete(upload_id, str(tmp_path / 'definitions.zip'))
+    assert error.value.status == 422
+    with pytest.raises(UploadError) as error:
+        store.status(upload_id)
+    assert error.value.status == 404
+
+
+@pytest.mark.parametrize('size, sha256, status', [
+    (0, SHA256, 400),
+    ('10', SHA256, 400),
+    (2 * 1024 * 1024, SHA256, 413),
+    (10, 'not-a-digest', 400)
+])
+def test_create_rejects_bad_uploads(store, size, sha256, status):
+    with pytest.raises(UploadError) as error:
+        store.create(size, sha256)
+    assert error.value.status == status
+
+
+def test_chunk_past_the_declared_size_is_rejected(store):
+    upload_id = store.create(1000, SHA256)['upload_id']
+    with pytest.raises(UploadError) as error:
+        append(store, upload_id, 0, PAYLOAD[:1001])
+    assert error.value.status == 413
+
+
+@pytest.mark.parametrize('upload_id', ['../etc/passwd', '0' * 32, None])
+def test_unknown_uploads_are_not_found(store, upload_id):
+    with pytest.raises(UploadError) as error:
+        append(store, upload_id, 0, b'data')
+    assert error.value.status == 404
+
+
+class SlowStream(io.BytesIO):
+    def read(self, size=-1):
+        time.sleep(0.05)
+        return super().read(min(size, 1000))
+
+
+def _append_in_process(folder, upload_id, results):
+    store = ChunkedUploadStore(folder, 1024 * 1024)
+    try:
+        store.append(upload_id, 0, SlowStream(PAYLOAD[:5000]), 5000)
+        results.put('ok')
+    except UploadError as e:
+        results.put(e.status)
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='needs fork')
+def test_workers_in_other_processes_cannot_append_at_the_same_offset(store):
+    upload_id = store.create(len(PAYLOAD), SHA256)['upload_id']
+    context = multiprocessing.get_context('fork')
+    results = context.Queue()
+    workers = [context.Process(target=_append_in_process, args=(store.folder, upload_id, results))
+               for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert sorted(str(results.get(timeout=5)) for _ in workers) == ['409', '409', 'ok']
+    assert store.status(upload_id)['offset'] == 5000
+
+
+def test_save_stream_verifies_the_digest(tmp_path):
+    destination = str(tmp_path / 'out' / 'file.bin')
+    assert save_stream(io.BytesIO(PAYLOAD), destination, SHA256.upper()) == SHA256
+
+    with pytest.raises(UploadError):
+        save_stream(io.BytesIO(PAYLOAD), str(tmp_path / 'other.bin'), '0' * 64)
+    assert not os.path.exists(tmp_path / 'other.bin')
+    assert os.listdir(tmp_path) == ['out']
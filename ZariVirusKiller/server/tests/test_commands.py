@@ -0,0 +1,49 @@
+import os
+
+from app.hash_partitions import hash_partitions
+from models import db, User, VirusSignature
+
+
+def test_init_db_creates_the_schema_and_one_admin(app):
+    runner = app.test_cli_runner()
+
+    result = runner.invoke(args=['init-db'])
+    assert result.exit_code == 0, result.output
+    assert 'Database schema created' in result.output
+
+    # Running it again keeps the existing admin
+    assert runner.invoke(args=['init-db']).exit_code == 0
+    assert [user.username for user in User.query.all()] == ['admin']
+
+
+def test_build_snapshot_writes_the_snapshot(app):
+    result = app.test_cli_runner().invoke(args=['build-snapshot'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Definitions snapshot written' in result.output
+    assert os.listdir(app.config['DEFINITIONS_FOLDER'])
+
+
+def test_migrate_hash_signatures_copies_valid_hashes(app):
+    db.session.add_all([
+        VirusSignature(name='Trojan.A', signature_type='hash', hash_value='A' * 64),
+        VirusSignature(name='Legacy.B', signature_type='hash', hash_value='not-a-digest')
+    ])
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['migrate-hash-signatures', '--batch-size', '1'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Copied 1 hash signatures into partitions' in result.output
+    assert 'Skipped 1 signatures' in result.output
+    assert hash_partitions.lookup('a' * 64)['name'] == 'Trojan.A'
+
+
+def test_rebuild_search_index_reports_the_count(app):
+    db.session.add(VirusSignature(name='Worm.C', signature_type='hash', hash_value='c' * 64))
+    db.session.commit()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-search-index'])
+
+    assert result.exit_code == 0, result.output
+    assert 'Indexed 1 signatures' in result.output
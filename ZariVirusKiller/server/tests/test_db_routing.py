@@ -0,0 +1,134 @@
+import os
+import time
+
+import pytest
+from sqlalchemy import create_engine
+
+from app import create_app, db
+from app.db_routing import primary_reads, replica_router, use_replica
+from models import VirusSignature
+
+
+@pytest.fixture
+def replica_app(tmp_path):
+    """
+    An application whose primary and replica SQLite files hold different
+    signatures, so each query shows which database served it
+    """
+    from app.hash_partitions import hash_partitions
+    from app.signature_search import SignatureSearch
+
+    replica_engine = create_engine(f"sqlite:///{tmp_path / 'replica.db'}")
+    db.metadata.create_all(replica_engine)
+    with replica_engine.begin() as connection:
+        connection.execute(VirusSignature.__table__.insert(), [{'name': 'Replica.Only', 'signature_type': 'hash'}])
+    replica_engine.dispose()
+
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'primary.db'}",
+        'SQLALCHEMY_REPLICA_URIS': [f"sqlite:///{tmp_path / 'replica.db'}"],
+        'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+        'DEFINITIONS_FOLDER': str(tmp_path / 'definitions'),
+        'HASH_PARTITION_FOLDER': str(tmp_path / 'partitions'),
+        'HASH_PARTITION_BACKEND': 'sqlite',
+        'DEFINITIONS_WARMUP': False,
+        'JWT_SECRET_KEY': 'test-secret-key-long-enough-for-hs256'
+    })
+    os.makedirs(app.config['DEFINITIONS_FOLDER'], exist_ok=True)
+
+    with app.app_context():
+        db.create_all()
+        hash_partitions.ensure_schema()
+        SignatureSearch.ensure_index()
+        db.session.execute(VirusSignature.__table__.insert(), [{'name': 'Primary.Only', 'signature_type': 'hash'}])
+        db.session.commit()
+        db.session.remove()
+
+    yield app
+
+    for engine in replica_router._engines:
+        engine.dispose()
+    replica_router._engines = []
+    with app.app_context():
+        db.engine.dispose()
+
+
+def served_by():
+    return [signature.name for signature in VirusSignature.query.all()]
+
+
+def test_reads_use_the_primary_by_default(replica_app):
+    with replica_app.app_context():
+        assert served_by() == ['Primary.Only']
+
+
+def test_replica_reads_go_to_the_replica(replica_app):
+    with replica_app.app_context():
+        before = replica_router.metrics()['replica_reads']
+        with use_replica():
+            assert served_by() == ['Replica.Only']
+            with primary_reads():
+                assert served_by() == ['Primary.Only']
+            assert served_by() == ['Replica.Only']
+
+        assert replica_router.metrics()['replica_reads'] == before + 2
+        assert served_by() == ['Primary.Only']
+
+
+def test_reads_after_a_write_use_the_primary(replica_app):
+    with replica_app.app_context():
+        with use_replica():
+            db.session.add(VirusSignature(name='Written', signature_type='hash'))
+            db.session.flush()
+            assert served_by() == ['Primary.Only', 'Written']
+        db.session.rollback()
+
+
+def test_lagging_replicas_are_skipped(replica_app):
+    with replica_app.app_context():
+        replica_router._lag[0] = (replica_router.max_lag + 1, time.monotonic())
+        skips = replica_router.metrics()['lagging_skips']
+
+        with use_replica():
+            assert served_by() == ['Primary.Only']
+
+        metrics = replica_router.metrics()
+        assert metrics['lagging_skips'] == skips + 1
+        assert metrics['replicas'][0]['lag'] == replica_router.max_lag + 1
+
+
+def test_replica_reads_views_follow_the_fence_cookie(replica_app):
+    from flask_jwt_extended import create_access_token
+
+    client = replica_app.test_client()
+    with replica_app.app_context():
+        headers = {'Authorization': f'Bearer {create_access_token(identity="admin")}'}
+
+    def listed(extra=None, client=client):
+        response = client.get('/api/signatures', headers=dict(headers, **(extra or {})))
+        assert response.status_code == 200
+        return [signature['name'] for signature in response.get_json()]
+
+    assert listed() == ['Replica.Only']
+
+    response = client.post('/api/add-signature', headers=headers,
+                           json={'type': 'hash', 'name': 'Fresh', 'hash': 'a' * 64})
+    assert response.status_code == 201
+    assert replica_router.fence_cookie in response.headers.get('Set-Cookie', '')
+    assert listed() == ['Primary.Only', 'Fresh']
+
+    # Without a cookie jar, so each request sends only the cookie given
+    client = replica_app.test_client(use_cookies=False)
+    fence = {'Cookie': f'{replica_router.fence_cookie}={time.time()}'}
+    assert listed(fence, client) == ['Primary.Only', 'Fresh']
+    stale = {'Cookie': f'{replica_router.fence_cookie}={time.time() - replica_router.max_lag - 1}'}
+    assert listed(stale, client) == ['Replica.Only']
+    garbage = {'Cookie': f'{replica_router.fence_cookie}=not-a-time'}
+    assert listed(garbage, client) == ['Replica.Only']
+
+
+def test_without_replicas_everything_reads_the_primary(app):
+    assert replica_router.replica_engine() is None
+    with use_replica():
+        assert served_by() == []
@@ -0,0 +1,70 @@
+import threading
+import time
+
+import pytest
+
+from app.definitions_notifier import DefinitionsNotifier, download_jitter
+
+
+def test_publish_wakes_waiter():
+    notifier = DefinitionsNotifier()
+    notifier.publish('hash', '1')
+    threading.Timer(0.05, notifier.publish, ('hash', '2')).start()
+
+    versions = notifier.wait_for_change({'hash': '1'}, timeout=5)
+
+    assert versions == {'hash': '2'}
+
+
+def test_same_version_is_not_a_change():
+    notifier = DefinitionsNotifier()
+    assert notifier.publish('hash', '1')
+    sequence = notifier.sequence
+
+    assert not notifier.publish('hash', '1')
+    assert notifier.sequence == sequence
+
+
+def test_wait_times_out_without_change():
+    notifier = DefinitionsNotifier()
+    notifier.publish('hash', '1')
+
+    started = time.monotonic()
+    assert notifier.wait_for_change({'hash': '1'}, timeout=0.05) is None
+    assert time.monotonic() - started < 1
+
+
+@pytest.mark.parametrize('timeout', [float('nan'), float('inf'), float('-inf')])
+def test_wait_rejects_non_finite_timeout(timeout):
+    with pytest.raises(ValueError):
+        DefinitionsNotifier().wait_for_change({'hash': '1'}, timeout)
+
+
+def test_negative_timeout_returns_immediately():
+    notifier = DefinitionsNotifier()
+    notifier.publish('hash', '1')
+    assert notifier.wait_for_change({'hash': '1'}, timeout=-5) is None
+
+
+def test_refresh_publishes_loaded_versions():
+    notifier = DefinitionsNotifier()
+    notifier.refresh(lambda: {'hash': '7', 'pattern': None})
+    assert notifier.versions() == {'hash': '7'}
+
+
+def test_download_jitter_bounds():
+    assert download_jitter(0) == 0.0
+    assert all(0 <= download_jitter(2) <= 2 for _ in range(100))
+
+
+@pytest.mark.parametrize('timeout', ['nan', 'inf', '-inf', 'abc'])
+def test_watch_rejects_invalid_timeout(client, timeout):
+    response = client.get('/api/definitions/watch', query_string={'timeout': timeout, 'hash': 'x'})
+    assert response.status_code == 400
+
+
+def test_watch_clamps_negative_timeout(client):
+    started = time.monotonic()
+    response = client.get('/api/definitions/watch', query_string={'timeout': '-10', 'hash': 'x'})
+    assert response.status_code in (200, 204)
+    assert time.monotonic() - started < 5
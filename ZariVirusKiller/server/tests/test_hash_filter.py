@@ -0,0 +1,112 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from app.hash_filter import HashFilter, filter_parameters
+
+
+def digests(count, salt='sig'):
+    return [hashlib.sha256(f'{salt}-{i}'.encode()).hexdigest() for i in range(count)]
+
+
+def test_no_false_negatives_and_bounded_false_positives():
+    hash_filter = HashFilter.for_capacity(2000, 0.01)
+    for hash_value in digests(2000):
+        hash_filter.add(hash_value)
+
+    assert all(hash_value in hash_filter for hash_value in digests(2000))
+    false_positives = sum(hash_value in hash_filter for hash_value in digests(20000, salt='clean'))
+    assert false_positives / 20000 < 0.03
+
+
+def test_membership_ignores_case():
+    hash_filter = HashFilter.for_capacity(10, 0.01)
+    hash_filter.add('ABCDEF' * 8)
+    assert ('abcdef' * 8) in hash_filter
+
+
+def test_round_trip():
+    hash_filter = HashFilter.for_capacity(100, 0.001)
+    hash_filter.add(digests(1)[0])
+    loaded = HashFilter.from_bytes(hash_filter.to_bytes())
+
+    assert (loaded.bits, loaded.hash_functions, loaded.count) == (hash_filter.bits, hash_filter.hash_functions, 1)
+    assert digests(1)[0] in loaded
+
+
+@pytest.mark.parametrize('payload', [b'', b'XXXX' + bytes(40), HashFilter.for_capacity(10, 0.1).to_bytes()[:-1]])
+def test_from_bytes_rejects_corrupt_files(payload):
+    with pytest.raises(ValueError):
+        HashFilter.from_bytes(payload)
+
+
+@pytest.mark.parametrize('fp_rate', [0, 1, -0.5])
+def test_filter_parameters_reject_bad_rates(fp_rate):
+    with pytest.raises(ValueError):
+        filter_parameters(100, fp_rate)
+
+
+def test_update_ors_filters_of_the_same_size():
+    first, second = HashFilter.for_capacity(100, 0.01), HashFilter.for_capacity(100, 0.01)
+    first.add(digests(1, 'a')[0])
+    second.add(digests(1, 'b')[0])
+
+    first.update(second)
+
+    assert digests(1, 'a')[0] in first and digests(1, 'b')[0] in first
+    assert first.count == 2
+
+
+def test_update_rejects_different_sizes():
+    with pytest.raises(ValueError):
+        HashFilter.for_capacity(100, 0.01).update(HashFilter.for_capacity(10000, 0.01))
+
+
+def published_filter():
+    from models import DefinitionUpdate
+    from app.signature_manager import SignatureManager
+
+    update = DefinitionUpdate.query.filter_by(update_type='filter').order_by(DefinitionUpdate.id.desc()).first()
+    return HashFilter.load(SignatureManager.merged_definitions_file('filter', update.path))
+
+
+def test_definitions_build_reads_only_changed_partitions(app, monkeypatch):
+    from app.hash_partitions import hash_partitions
+    from app.signature_manager import SignatureManager
+
+    hashes = digests(40)
+    for hash_value in hashes:
+        hash_partitions.add(hash_value, 'Test.Hash')
+    assert SignatureManager.generate_definitions_file()[0]
+
+    read = []
+    original = hash_partitions.partition_rows
+    monkeypatch.setattr(hash_partitions, 'partition_rows', lambda prefix: read.append(prefix) or original(prefix))
+    new_hash = 'f' + hashes[0][1:]
+    hash_partitions.add(new_hash, 'Test.New')
+    assert SignatureManager.generate_definitions_file()[0]
+
+    assert read == ['f']
+    published = published_filter()
+    assert published.count == 41
+    assert all(hash_value in published for hash_value in hashes + [new_hash])
+
+
+def test_filter_grows_past_its_capacity(app):
+    from app.hash_partitions import hash_partitions
+    from app.signature_manager import SignatureManager
+
+    for hash_value in digests(10):
+        hash_partitions.add(hash_value, 'Test.Hash')
+    SignatureManager.generate_definitions_file()
+    for hash_value in digests(1100, salt='more'):
+        hash_partitions.add(hash_value, 'Test.More')
+    SignatureManager.generate_definitions_file()
+
+    with open(os.path.join(app.config['DEFINITIONS_FOLDER'], 'hash', 'manifest.json')) as f:
+        assert json.load(f)['filter']['capacity'] == 2048
+    published = published_filter()
+    assert published.count == 1110
+    assert all(hash_value in published for hash_value in digests(10) + digests(1100, salt='more'))
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import os
+
+import pytest
+
+from app.db_utils import dialect_insert
+from app.hash_partitions import hash_partition_state, hash_partitions
+from app.signature_manager import SignatureManager
+
+
+def digest(text):
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def test_add_and_lookup_is_case_insensitive(app):
+    hash_value = digest('a')
+    assert hash_partitions.add(hash_value.upper(), 'Test.Hash', 'high')
+    assert hash_partitions.lookup(hash_value)['name'] == 'Test.Hash'
+    assert hash_partitions.lookup(digest('b')) is None
+
+
+def test_duplicate_add_returns_false(app):
+    hash_value = digest('a')
+    assert hash_partitions.add(hash_value, 'Test.Hash')
+    assert not hash_partitions.add(hash_value, 'Test.Other')
+    assert hash_partitions.count() == 1
+
+
+@pytest.mark.parametrize('hash_value', ['', 'xyz', 'g' * 64])
+def test_add_rejects_non_hex_hashes(app, hash_value):
+    with pytest.raises(ValueError):
+        hash_partitions.add(hash_value, 'Test.Bad')
+
+
+@pytest.mark.parametrize('dialect', ['sqlite', 'postgresql'])
+def test_dialect_insert_supports_on_conflict(app, dialect):
+    statement = dialect_insert(hash_partition_state, dialect)
+
+    assert hasattr(statement, 'on_conflict_do_update')
+
+
+def test_dialect_insert_defaults_to_the_bound_database(app):
+    from sqlalchemy.dialects import sqlite
+
+    assert isinstance(dialect_insert(hash_partition_state), sqlite.Insert)
+
+
+def test_dialect_insert_rejects_other_databases(app):
+    with pytest.raises(ValueError):
+        dialect_insert(hash_partition_state, 'mysql')
+
+
+def test_generation_only_changes_for_the_written_partition(app):
+    hash_value = digest('a')
+    prefix = hash_partitions.partition_of(hash_value)
+    others = {p: hash_partitions.generation(p) for p in hash_partitions.prefixes() if p != prefix}
+
+    before = hash_partitions.generation(prefix)
+    hash_partitions.add(hash_value, 'Test.Hash')
+    assert hash_partitions.generation(prefix) == before + 1
+    hash_partitions.remove(hash_value)
+    assert hash_partitions.generation(prefix) == before + 2
+    assert {p: hash_partitions.generation(p) for p in others} == others
+
+
+def test_partition_and_manifest_endpoints(app, client):
+    hash_value = digest('a')
+    hash_partitions.add(hash_value, 'Test.Hash')
+    SignatureManager.generate_definitions_file()
+    prefix = hash_partitions.partition_of(hash_value)
+
+    manifest = json.loads(client.get('/api/download-definitions/hash/manifest').data)
+    assert manifest['partitions'][prefix]['signature_count'] == 1
+
+    partition = json.loads(client.get(f'/api/download-definitions/hash/{prefix.upper()}').data)
+    assert partition == {'Test.Hash': hash_value}
+
+    assert client.get('/api/download-definitions/hash/zz').status_code == 404
+    assert client.get('/api/download-definitions/hash/..').status_code == 404
+
+
+def test_full_definitions_are_merged_on_first_download(app, client):
+    hashes = [digest(str(i)) for i in range(20)]
+    for i, hash_value in enumerate(hashes):
+        hash_partitions.add(hash_value, f'Test.Hash{i}')
+    SignatureManager.generate_definitions_file()
+    partitions_dir = os.path.join(app.config['DEFINITIONS_FOLDER'], 'hash')
+    assert not [name for name in os.listdir(partitions_dir) if name.startswith('signatures-')]
+
+    response = client.get('/api/download-definitions/hash')
+    assert response.status_code == 200
+    assert 'signatures.json' in response.headers['Content-Disposition']
+    assert sorted(json.loads(response.data).values()) == sorted(hashes)
+
+    hash_partitions.add(digest('new'), 'Test.New')
+    SignatureManager.generate_definitions_file()
+    response = client.get('/api/download-definitions/hash')
+    assert len(json.loads(response.data)) == 21
+    assert len([name for name in os.listdir(partitions_dir) if name.startswith('signatures-')]) == 1
+
+
+def test_concurrent_adds_of_one_hash_store_it_once(app):
+    from concurrent.futures import ThreadPoolExecutor
+
+    hash_value = digest('a')
+    prefix = hash_partitions.partition_of(hash_value)
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda i: hash_partitions.add(hash_value, f'Test.Hash{i}'), range(8)))
+
+    assert results.count(True) == 1
+    assert hash_partitions.count() == 1
+    assert hash_partitions.generation(prefix) == 1
@@ -0,0 +1,119 @@
+import time
+
+import pytest
+
+from models import DeviceHeartbeat, LicenseKey
+from app.heartbeats import heartbeats, record_heartbeat
+from app.write_behind import WriteBehindBuffer
+
+
+def test_flush_writes_pending_rows_once():
+    written = []
+    buffer = WriteBehindBuffer(written.extend, flush_interval=3600)
+    buffer.record('a', {'id': 'a'})
+    buffer.record('b', {'id': 'b'})
+
+    assert buffer.flush() == 2
+    assert buffer.flush() == 0
+    assert sorted(row['id'] for row in written) == ['a', 'b']
+    assert buffer.metrics()['flushed_rows'] == 2
+
+
+def test_newer_rows_merge_into_pending_ones():
+    written = []
+    buffer = WriteBehindBuffer(written.extend, flush_interval=3600)
+    buffer.record('a', {'version': '1.0', 'key': 'K1', 'seen': 1})
+    buffer.record('a', {'version': None, 'key': None, 'seen': 2})
+    buffer.record('a', {'version': '1.1', 'key': None, 'seen': 3})
+
+    buffer.flush()
+    assert written == [{'version': '1.1', 'key': 'K1', 'seen': 3}]
+    assert buffer.metrics()['coalesced'] == 2
+
+
+def test_failed_flush_keeps_rows_and_newer_values():
+    def failing_writer(rows):
+        buffer.record('a', {'version': None, 'seen': 2})
+        raise RuntimeError('database down')
+
+    buffer = WriteBehindBuffer(failing_writer, flush_interval=3600)
+    buffer.record('a', {'version': '1.0', 'seen': 1})
+    with pytest.raises(RuntimeError):
+        buffer.flush()
+
+    written = []
+    buffer._writer = written.extend
+    buffer.flush()
+    assert written == [{'version': '1.0', 'seen': 2}]
+    assert buffer.metrics()['failed_flushes'] == 1
+
+
+def test_new_keys_are_dropped_when_the_buffer_is_full():
+    buffer = WriteBehindBuffer(lambda rows: None, flush_interval=3600, max_buffered=2)
+    assert buffer.record('a', {})
+    assert buffer.record('b', {})
+    assert not buffer.record('c', {})
+    assert buffer.record('a', {})
+    assert buffer.metrics()['dropped'] == 1
+
+
+def test_flush_rows_wakes_the_flusher():
+    written = []
+    buffer = WriteBehindBuffer(written.extend, flush_interval=3600, flush_rows=2)
+    buffer.record('a', {'id': 'a'})
+    buffer.record('b', {'id': 'b'})
+    deadline = time.monotonic() + 5
+    while not written and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(written) == 2
+
+
+def test_heartbeat_is_upserted_without_the_unverified_key(app, client):
+    heartbeats.flush()
+    response = client.post('/api/heartbeat', json={'device_id': 'device-1', 'key': 'FAKE-KEY', 'client_version': '1.0'})
+    assert response.status_code == 202
+    client.post('/api/heartbeat', json={'device_id': 'device-1'})
+    heartbeats.flush()
+
+    row = DeviceHeartbeat.query.filter_by(device_id='device-1').one()
+    assert (row.client_version, row.license_key) == ('1.0', None)
+
+
+def test_verified_license_key_is_kept_by_later_heartbeats(app, client):
+    from datetime import datetime, timedelta
+    from app import db
+
+    heartbeats.flush()
+    db.session.add(LicenseKey(key='GOOD-KEY', expires_at=datetime.utcnow() + timedelta(days=1)))
+    db.session.commit()
+
+    assert client.post('/api/verify-license', json={'key': 'GOOD-KEY', 'device_id': 'device-2'}).get_json()['valid']
+    heartbeats.flush()
+    client.post('/api/heartbeat', json={'device_id': 'device-2', 'client_version': '2.0'})
+    heartbeats.flush()
+
+    row = DeviceHeartbeat.query.filter_by(device_id='device-2').one()
+    assert (row.client_version, row.license_key) == ('2.0', 'GOOD-KEY')
+
+
+@pytest.mark.parametrize('body', [
+    None,
+    ['device-1'],
+    'device-1',
+    {},
+    {'device_id': 42},
+    {'device_id': 'd' * 65},
+    {'device_id': 'device-1', 'client_version': 3},
+    {'device_id': 'device-1', 'client_version': 'v' * 33}
+])
+def test_bad_heartbeats_are_rejected(app, client, body):
+    heartbeats.flush()
+    assert client.post('/api/heartbeat', json=body).status_code == 400
+    assert heartbeats.metrics()['pending'] == 0
+
+
+def test_record_heartbeat_validates_fields():
+    with pytest.raises(ValueError):
+        record_heartbeat(None)
+    with pytest.raises(ValueError):
+        record_heartbeat('device-1', license_key='k' * 129)
@@ -0,0 +1,114 @@
+import io
+import json
+import os
+import stat
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from app.json_stream import atomic_file, iter_json_object_members, stream_rows, write_json_array, write_json_object
+
+
+def test_atomic_file_replaces_the_target(tmp_path):
+    path = tmp_path / 'definitions' / 'signatures.json'
+
+    with atomic_file(str(path)) as f:
+        f.write('new')
+
+    assert path.read_text() == 'new'
+    assert os.listdir(path.parent) == ['signatures.json']
+
+
+def test_atomic_file_keeps_the_old_file_on_error(tmp_path):
+    path = tmp_path / 'signatures.json'
+    path.write_text('old')
+
+    with pytest.raises(RuntimeError):
+        with atomic_file(str(path)) as f:
+            f.write('partial')
+            raise RuntimeError('build failed')
+
+    assert path.read_text() == 'old'
+    assert os.listdir(tmp_path) == ['signatures.json']
+
+
+def test_atomic_file_keeps_the_mode_of_the_replaced_file(tmp_path):
+    path = tmp_path / 'signatures.json'
+    path.write_text('old')
+    os.chmod(path, 0o640)
+
+    with atomic_file(str(path)) as f:
+        f.write('new')
+
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+
+
+def test_atomic_file_writes_binary(tmp_path):
+    path = tmp_path / 'hashes.bloom'
+
+    with atomic_file(str(path), 'wb') as f:
+        f.write(b'\x00\xff')
+
+    assert path.read_bytes() == b'\x00\xff'
+
+
+@pytest.mark.parametrize('items', [[], [('a', 1), (2, {'b': [1, 2]}), ('c"d', 'é')]])
+def test_write_json_object_round_trips(items):
+    f = io.StringIO()
+
+    assert write_json_object(f, items) == len(items)
+    assert json.loads(f.getvalue()) == {str(key): value for key, value in items}
+
+
+@pytest.mark.parametrize('key', [None, 'signatures'])
+@pytest.mark.parametrize('items', [[], [1, 'two', {'three': 3}]])
+def test_write_json_array_round_trips(items, key):
+    f = io.StringIO()
+
+    assert write_json_array(f, iter(items), key=key) == len(items)
+    assert json.loads(f.getvalue()) == (items if key is None else {key: items})
+
+
+def test_write_json_object_rejects_unserializable_values():
+    with pytest.raises(TypeError):
+        write_json_object(io.StringIO(), [('a', object())])
+
+
+@pytest.mark.parametrize('dump', [
+    lambda f, data: write_json_object(f, data.items()),
+    lambda f, data: json.dump(data, f, indent=2)
+])
+def test_iter_json_object_members_yields_raw_members(tmp_path, dump):
+    path = tmp_path / 'signatures.json'
+    data = {'aaa': 'Trojan.A', 'bbb': 'Worm.B'}
+    with open(path, 'w') as f:
+        dump(f, data)
+
+    members = list(iter_json_object_members(str(path)))
+
+    assert members == ['"aaa": "Trojan.A"', '"bbb": "Worm.B"']
+    assert json.loads('{' + ', '.join(members) + '}') == data
+
+
+def test_iter_json_object_members_of_an_empty_object(tmp_path):
+    path = tmp_path / 'signatures.json'
+    with open(path, 'w') as f:
+        write_json_object(f, [])
+
+    assert list(iter_json_object_members(str(path))) == []
+
+
+def test_iter_json_object_members_needs_the_file(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        list(iter_json_object_members(str(tmp_path / 'missing.json')))
+
+
+def test_stream_rows_yields_every_row_in_batches():
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY)'))
+        connection.execute(text('INSERT INTO item (id) VALUES (:id)'), [{'id': i} for i in range(7)])
+
+    with engine.connect() as connection:
+        rows = stream_rows(connection, text('SELECT id FROM item ORDER BY id'), batch_size=3)
+        assert [row.id for row in rows] == list(range(7))
@@ -0,0 +1,104 @@
+import datetime
+import hashlib
+import importlib.util
+import os
+
+import pytest
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture(scope='module')
+def legacy_module(tmp_path_factory):
+    """
+    The legacy app (app/app.py), configured from the environment at import
+    """
+    folder = tmp_path_factory.mktemp('legacy')
+    with pytest.MonkeyPatch.context() as env:
+        env.setenv('DATABASE_URL', f"sqlite:///{folder / 'legacy.db'}")
+        env.setenv('SAMPLE_STORE_FOLDER', str(folder / 'samples'))
+        spec = importlib.util.spec_from_file_location('legacy_app', os.path.join(SERVER_DIR, 'app', 'app.py'))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+    module.app.config['DEFINITIONS_FOLDER'] = str(folder / 'definitions')
+    return module
+
+
+@pytest.fixture
+def legacy(legacy_module):
+    with legacy_module.app.app_context():
+        legacy_module.db.drop_all()
+        legacy_module.db.create_all()
+        yield legacy_module
+        legacy_module.db.session.remove()
+
+
+def add_sample(legacy, tmp_path, content, last_seen, stored=True):
+    sha256 = hashlib.sha256(content).hexdigest()
+    stored_size = 0
+    if stored:
+        source = tmp_path / sha256
+        source.write_bytes(content)
+        stored_size, _ = legacy.sample_store.put_file(str(source), sha256)
+    legacy.db.session.add(legacy.Sample(sha256=sha256, size=len(content), stored_size=stored_size,
+                                        last_seen=last_seen))
+    legacy.db.session.commit()
+    return sha256
+
+
+def test_eviction_skips_samples_still_being_written(legacy, tmp_path):
+    now = datetime.datetime.utcnow()
+    pending = add_sample(legacy, tmp_path, b'pending', now - datetime.timedelta(days=3), stored=False)
+    oldest = add_sample(legacy, tmp_path, os.urandom(4000), now - datetime.timedelta(days=2))
+    newest = add_sample(legacy, tmp_path, os.urandom(4000), now)
+
+    stored = legacy.db.session.query(legacy.db.func.sum(legacy.Sample.stored_size)).scalar()
+    legacy.app.config['SAMPLE_STORE_MAX_BYTES'] = stored - 1
+    try:
+        assert legacy.evict_samples() == 1
+    finally:
+        legacy.app.config['SAMPLE_STORE_MAX_BYTES'] = 10 * 1024 * 1024 * 1024
+
+    remaining = {sample.sha256 for sample in legacy.Sample.query}
+    assert remaining == {pending, newest}
+    assert not legacy.sample_store.exists(oldest)
+    assert legacy.sample_store.exists(newest)
+
+
+def test_eviction_does_nothing_under_the_limit(legacy, tmp_path):
+    add_sample(legacy, tmp_path, b'sample', datetime.datetime.utcnow())
+    assert legacy.evict_samples() == 0
+
+
+def test_rescan_looks_up_hash_signatures_per_batch(legacy, tmp_path):
+    now = datetime.datetime.utcnow()
+    samples = [add_sample(legacy, tmp_path, f'sample {i}'.encode(), now) for i in range(5)]
+    missing = add_sample(legacy, tmp_path, b'evicted meanwhile', now)
+    legacy.sample_store.remove(missing)
+    add_sample(legacy, tmp_path, b'being written', now, stored=False)
+
+    detected = sorted(samples)[3]
+    legacy.db.session.add(legacy.VirusSignature(name='Trojan.Rescan', hash_signature=detected, severity='high'))
+    legacy.db.session.commit()
+
+    statements = []
+    from sqlalchemy import event
+
+    def record(conn, cursor, statement, *args):
+        if 'FROM virus_signature' in statement:
+            statements.append(statement)
+
+    engine = legacy.db.engine
+    event.listen(engine, 'before_cursor_execute', record)
+    legacy.app.config['SAMPLE_RESCAN_BATCH_SIZE'] = 2
+    try:
+        stats = legacy.rescan_samples('2.0.0')
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+        legacy.app.config['SAMPLE_RESCAN_BATCH_SIZE'] = 500
+
+    assert (stats['scanned'], stats['missing'], stats['newly_detected']) == (5, 1, 1)
+    assert stats['new_detections'] == [detected]
+    assert statements and all(' IN ' in statement for statement in statements)
+    sample = legacy.Sample.query.filter_by(sha256=detected).one()
+    assert sample.detected and sample.scanned_version == '2.0.0'
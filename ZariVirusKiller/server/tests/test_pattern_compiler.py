@@ -0,0 +1,142 @@
+import json
+import os
+
+import pytest
+
+from app.pattern_compiler import PatternCompiler, normalize_pattern, normalize_patterns
+
+
+def hex_pattern(value, offset='any'):
+    return {'type': 'hex', 'value': value, 'offset': offset}
+
+
+@pytest.mark.parametrize('pattern, expected', [
+    ({'hex_pattern': '4d 5a:90-00'}, {'type': 'hex', 'offset': 'any', 'hex_pattern': '4D5A9000',
+                                       'value': '4D5A9000', 'match_type': 'exact'}),
+    ({'type': 'hex', 'value': '0x4d0x5a', 'offset': 0}, {'type': 'hex', 'offset': '0', 'hex_pattern': '4D5A',
+                                                         'value': '4D5A', 'match_type': 'exact'}),
+    ({'ascii_pattern': 'evil.exe', 'offset': '16'}, {'type': 'ascii', 'offset': '16', 'ascii_pattern': 'evil.exe',
+                                                     'value': 'evil.exe', 'match_type': 'contains'}),
+    ({'type': 'regex', 'value': r'evil\d+'}, {'type': 'regex', 'offset': 'any', 'value': r'evil\d+'})
+])
+def test_patterns_are_normalized_to_the_client_format(pattern, expected):
+    assert normalize_patterns([pattern]) == [expected]
+
+
+@pytest.mark.parametrize('pattern', [
+    'not an object',
+    {'type': 'hex'},
+    {'type': 'hex', 'value': ''},
+    {'type': 'hex', 'value': '4D5'},
+    {'type': 'hex', 'value': 'GG'},
+    {'type': 'hex', 'value': '????'},
+    {'type': 'hex', 'value': '4D5A', 'offset': -1},
+    {'type': 'hex', 'value': '4D5A', 'offset': 'start'},
+    {'type': 'ascii', 'value': 'évil'},
+    {'type': 'regex', 'value': '(unclosed'},
+    {'type': 'yara', 'value': 'rule x {}'}
+])
+def test_invalid_patterns_are_rejected(pattern):
+    with pytest.raises(ValueError):
+        normalize_patterns([pattern])
+
+
+def test_wildcards_parse_but_are_not_supported_by_clients():
+    assert normalize_pattern({'type': 'hex', 'value': '4D??5A'}).fixed_bytes == 2
+    with pytest.raises(ValueError, match='Wildcard'):
+        normalize_patterns([{'type': 'hex', 'value': '4D??5A'}])
+
+
+@pytest.mark.parametrize('patterns', [None, [], {'type': 'hex'}])
+def test_pattern_lists_are_required(patterns):
+    with pytest.raises(ValueError):
+        normalize_patterns(patterns)
+
+
+def test_duplicate_and_contained_patterns_are_dropped():
+    compiler = PatternCompiler()
+    compiler.add('S1', 'Sig.All', 'high', [
+        hex_pattern('DEADBEEFCAFE'), hex_pattern('de ad be ef ca fe'), hex_pattern('BEEFCAFE'),
+        {'type': 'ascii', 'value': 'payload'}
+    ])
+    (signature,), report = compiler.compile()
+    assert [p['value'] for p in signature['patterns']] == ['payload', 'DEADBEEFCAFE']
+    assert report['removed_patterns'] == 2
+
+    # With "any", the longer pattern only matches where the contained one does
+    compiler = PatternCompiler()
+    compiler.add('S2', 'Sig.Any', 'high', [hex_pattern('DEADBEEFCAFE'), hex_pattern('BEEFCAFE')], logic='any')
+    (signature,), _ = compiler.compile()
+    assert signature['patterns'] == [json_pattern('BEEFCAFE')]
+    assert signature['logic'] == 'all'
+
+
+def json_pattern(value):
+    return {'type': 'hex', 'offset': 'any', 'hex_pattern': value, 'value': value, 'match_type': 'exact'}
+
+
+def test_all_patterns_are_ordered_most_selective_first():
+    compiler = PatternCompiler()
+    compiler.add('S1', 'Sig', 'high', [
+        hex_pattern('99887766'), hex_pattern('1122334455667788'), hex_pattern('4D5A', offset=0)
+    ])
+    (signature,), _ = compiler.compile()
+    assert [p['value'] for p in signature['patterns']] == ['4D5A', '1122334455667788', '99887766']
+    assert signature['cost'] < 0.02
+
+
+def test_duplicate_and_subsumed_signatures_are_dropped():
+    compiler = PatternCompiler()
+    compiler.add('S1', 'Family.A', 'high', [hex_pattern('0102030405060708')])
+    compiler.add('S2', 'Family.A.Copy', 'high', [hex_pattern('01 02 03 04 05 06 07 08')])
+    compiler.add('S3', 'Family.A.Longer', 'medium', [hex_pattern('AA0102030405060708BB')])
+    compiler.add('S4', 'Family.A.Critical', 'critical', [hex_pattern('AA0102030405060708BBCC')])
+    signatures, report = compiler.compile()
+
+    assert [signature['id'] for signature in signatures] == ['S1', 'S4']
+    assert {(entry['id'], entry['reason'], entry['by']) for entry in report['dropped']} == {
+        ('S2', 'duplicate', 'S1'), ('S3', 'subsumed', 'S1')
+    }
+
+
+def test_unselective_signatures_are_flagged_not_used_to_drop_others():
+    compiler = PatternCompiler()
+    compiler.add('S1', 'Catch.All', 'critical', [hex_pattern('4D5A')])
+    compiler.add('S2', 'Padding', 'low', [hex_pattern('00000000')])
+    compiler.add('S3', 'Specific', 'low', [hex_pattern('4D5A112233445566')])
+    signatures, report = compiler.compile()
+
+    assert {signature['id'] for signature in signatures} == {'S1', 'S2', 'S3'}
+    flagged = {entry['id']: entry for entry in report['flagged']}
+    assert flagged['S1']['patterns'][0]['flags'] == ['short']
+    assert 'low_selectivity' in flagged['S1']
+    assert flagged['S2']['patterns'][0]['flags'] == ['common_bytes']
+    assert 'S3' not in flagged
+
+
+def test_invalid_signatures_are_reported():
+    compiler = PatternCompiler()
+    compiler.add('S1', 'Empty', 'high', [])
+    compiler.add('S2', 'Bad.Logic', 'high', [hex_pattern('01020304')], logic='most')
+    compiler.add('S3', 'Bad.Hex', 'high', [hex_pattern('XYZ')])
+    signatures, report = compiler.compile()
+
+    assert signatures == []
+    assert [(entry['id'], entry['reason']) for entry in report['dropped']] == [
+        ('S1', 'invalid'), ('S2', 'invalid'), ('S3', 'invalid')
+    ]
+    assert report['source_signatures'] == 3
+
+
+def test_patterns_file_and_report_are_written(app):
+    from app.signature_manager import SignatureManager
+
+    patterns = [{'type': 'hex', 'hex_pattern': '0102030405060708'}]
+    assert SignatureManager.add_pattern_signature('Sig.One', patterns, severity='high')[0]
+    assert SignatureManager.add_pattern_signature('Sig.Two', patterns, severity='high')[0]
+
+    definitions = app.config['DEFINITIONS_FOLDER']
+    with open(os.path.join(definitions, 'patterns.json')) as f:
+        assert [signature['name'] for signature in json.load(f)['signatures']] == ['Sig.One']
+    with open(os.path.join(definitions, 'patterns.report.json')) as f:
+        assert json.load(f)['dropped'][0]['reason'] == 'duplicate'
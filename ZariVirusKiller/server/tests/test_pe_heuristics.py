@@ -0,0 +1,252 @@
+import random
+import struct
+import time
+
+import numpy as np
+import pytest
+
+from app.pe_heuristics import (BLOCK_SIZE, MAX_IMPORTS, BlockHistograms, PEFile, analyze, entropy,
+                               suspicious_names)
+
+FILE_ALIGNMENT = 0x200
+SECTION_ALIGNMENT = 0x1000
+HEADERS_SIZE = 0x400
+CODE = 0x60000020
+DATA = 0x40000040
+WRITABLE_CODE = 0xE0000020
+
+
+def align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+def code_bytes(size, seed=0):
+    rng = random.Random(seed)
+    pool = bytes([0x8B, 0x89, 0xE8, 0x48, 0x83, 0xC3, 0x55, 0x00, 0xFF, 0x0F]) * 40 + bytes(range(256))
+    return bytes(rng.choice(pool) for _ in range(size))
+
+
+def import_table(rva, imports, width):
+    """
+    Import descriptors for ``imports`` ({dll: [name or ordinal]}), their
+    thunk arrays and the hint/name entries, laid out from ``rva``
+    """
+    descriptors_size = (len(imports) + 1) * 20
+    thunks_size = sum((len(functions) + 1) * width for functions in imports.values())
+    names = bytearray()
+    names_rva = rva + descriptors_size + thunks_size
+
+    descriptors, thunks = bytearray(), bytearray()
+    thunks_rva = rva + descriptors_size
+    ordinal_flag = 1 << (width * 8 - 1)
+    for dll, functions in imports.items():
+        dll_rva = names_rva + len(names)
+        names += dll.encode('ascii') + b'\0'
+        array_rva = thunks_rva + len(thunks)
+        for function in functions:
+            if isinstance(function, int):
+                thunks += (ordinal_flag | function).to_bytes(width, 'little')
+            else:
+                thunks += (names_rva + len(names)).to_bytes(width, 'little')
+                names += b'\0\0' + function.encode('ascii') + b'\0'
+        thunks += bytes(width)
+        descriptors += struct.pack('<IIIII', array_rva, 0, 0, dll_rva, array_rva)
+    return bytes(descriptors + bytes(20) + thunks + names)
+
+
+def build_pe(sections, imports=None, entry=None, pe32_plus=False, dll=False, overlay=b''):
+    """
+    A minimal PE image. ``sections`` are (name, characteristics, body) or
+    (name, characteristics, body, virtual_size); imports go in an .idata section.
+    """
+    sections = [section if len(section) == 4 else (*section, len(section[2])) for section in sections]
+    width = 8 if pe32_plus else 4
+    virtual = SECTION_ALIGNMENT
+    layout = []
+    for name, characteristics, body, virtual_size in sections:
+        layout.append((name, characteristics, virtual, body, virtual_size))
+        virtual += align(max(virtual_size, len(body), 1), SECTION_ALIGNMENT)
+    import_rva = 0
+    if imports:
+        import_rva = virtual
+        body = import_table(virtual, imports, width)
+        layout.append(('.idata', DATA, virtual, body, len(body)))
+        virtual += align(len(body), SECTION_ALIGNMENT)
+    if entry is None:
+        entry = next((rva + 0x10 for _, flags, rva, body, _ in layout if flags & 0x20000000 and body), 0)
+
+    optional = bytearray(240 if pe32_plus else 224)
+    directories = 112 if pe32_plus else 96
+    struct.pack_into('<H', optional, 0, 0x20B if pe32_plus else 0x10B)
+    struct.pack_into('<I', optional, 16, entry)
+    struct.pack_into('<II', optional, 32, SECTION_ALIGNMENT, FILE_ALIGNMENT)
+    struct.pack_into('<II', optional, 56, virtual, HEADERS_SIZE)
+    struct.pack_into('<I', optional, directories - 4, 16)
+    struct.pack_into('<II', optional, directories + 8, import_rva, 40)
+
+    headers = bytearray(HEADERS_SIZE)
+    headers[0:2] = b'MZ'
+    struct.pack_into('<I', headers, 0x3C, 0x80)
+    headers[0x80:0x84] = b'PE\0\0'
+    struct.pack_into('<HHIIIHH', headers, 0x84, 0x8664 if pe32_plus else 0x14C, len(layout), 1700000000, 0, 0,
+                     len(optional), 0x2102 if dll else 0x0102)
+    headers[0x98:0x98 + len(optional)] = optional
+
+    table = 0x98 + len(optional)
+    raw = HEADERS_SIZE
+    bodies = []
+    for index, (name, characteristics, rva, body, virtual_size) in enumerate(layout):
+        raw_body = body.ljust(align(len(body), FILE_ALIGNMENT), b'\0')
+        struct.pack_into('<8sIIIIIIHHI', headers, table + index * 40, name.encode('ascii'), virtual_size,
+                         rva, len(raw_body), raw if raw_body else 0, 0, 0, 0, 0, characteristics)
+        raw += len(raw_body)
+        bodies.append(raw_body)
+    return bytes(headers) + b''.join(bodies) + overlay
+
+
+def finding_types(analysis):
+    return {finding['type'] for finding in analysis.findings}
+
+
+def test_entropy_of_histograms():
+    assert entropy(np.bincount(np.zeros(100, dtype=np.uint8), minlength=256)) == 0.0
+    assert entropy(np.ones(256)) == pytest.approx(8.0)
+    assert entropy(np.zeros(256)) == 0.0
+    assert entropy(np.stack([np.ones(256), np.eye(256)[0]])).tolist() == pytest.approx([8.0, 0.0])
+
+
+def test_block_histograms_match_direct_counts():
+    data = np.frombuffer(random.Random(1).randbytes(20 * BLOCK_SIZE + 123), dtype=np.uint8)
+    blocks = BlockHistograms(data)
+    assert blocks.counts.shape == (20, 256)
+    rng = random.Random(2)
+    for start, end in [(0, None), (0, 10), (100, 5 * BLOCK_SIZE + 7), (BLOCK_SIZE, 3 * BLOCK_SIZE)] + [
+        tuple(sorted(rng.sample(range(len(data)), 2))) for _ in range(20)
+    ]:
+        expected = np.bincount(data[start:end], minlength=256)
+        assert (blocks.histogram(start, end) == expected).all()
+
+
+def test_plain_executable_is_low_risk():
+    data = build_pe(
+        [('.text', CODE, code_bytes(8192)), ('.data', 0xC0000040, bytes(2048))],
+        imports={'KERNEL32.dll': ['ExitProcess', 'ReadFile', 'WriteFile', 'CloseHandle', 7]}
+    )
+    analysis = analyze(data)
+    result = analysis.to_json()
+
+    assert finding_types(analysis) == {'FileType'}
+    assert result['risk_level'] == 'low'
+    assert result['pe']['pe32_plus'] is False
+    assert result['pe']['imported_dlls'] == 1
+    assert result['pe']['imported_functions'] == 4
+    assert [section['name'] for section in result['pe']['sections']] == ['.text', '.data', '.idata']
+    text = result['pe']['sections'][0]
+    assert text['executable'] and not text['writable'] and 0 < text['entropy'] < 7.2
+    assert result['pe']['sections'][1]['zero_ratio'] == 1.0
+
+
+def test_packed_executable_is_high_risk():
+    data = build_pe(
+        [('UPX0', WRITABLE_CODE, b'', 0x20000), ('UPX1', WRITABLE_CODE, random.Random(3).randbytes(32768))],
+        imports={'kernel32.dll': ['LoadLibraryA', 'GetProcAddress', 'VirtualAllocEx',
+                                  'WriteProcessMemory', 'CreateRemoteThread']}
+    )
+    analysis = analyze(data)
+
+    assert {'PackerSection', 'WritableCode', 'PackedSection', 'EmptyCodeSection',
+            'SuspiciousAPI'} <= finding_types(analysis)
+    assert analysis.risk_level == 'high'
+    assert analysis.score <= 100
+    assert analysis.suspicious_imports == ['CreateRemoteThread', 'VirtualAllocEx', 'WriteProcessMemory',
+                                           'GetProcAddress', 'LoadLibrary']
+
+
+def test_pe32_plus_imports_and_runtime_linking():
+    data = build_pe([('.text', CODE, code_bytes(4096))], pe32_plus=True,
+                    imports={'kernel32.dll': ['LoadLibraryExW', 'GetProcAddress', 12]})
+    analysis = analyze(data)
+
+    assert analysis.pe.pe32_plus
+    assert analysis.pe.imports == {'kernel32.dll': ['LoadLibraryExW', 'GetProcAddress']}
+    assert 'FewImports' in finding_types(analysis)
+
+
+def test_dll_without_imports_is_not_flagged():
+    analysis = analyze(build_pe([('.text', CODE, code_bytes(4096))], dll=True))
+    assert analysis.pe.dll
+    assert 'FewImports' not in finding_types(analysis)
+    assert 'PE32 DLL' in analysis.findings[0]['description']
+
+
+def test_entry_point_outside_code():
+    data = build_pe([('.text', CODE, code_bytes(4096)), ('.rsrc', DATA, bytes(1024))],
+                    entry=0x2010, imports={'kernel32.dll': ['ExitProcess', 'ReadFile', 'WriteFile', 'Sleep']})
+    analysis = analyze(data)
+    assert 'EntryPoint' in finding_types(analysis)
+    assert 'section .rsrc' in next(f['description'] for f in analysis.findings if f['type'] == 'EntryPoint')
+
+
+def test_high_entropy_overlay():
+    overlay = random.Random(4).randbytes(8 * BLOCK_SIZE)
+    data = build_pe([('.text', CODE, code_bytes(4096))], overlay=overlay,
+                    imports={'kernel32.dll': ['ExitProcess', 'ReadFile', 'WriteFile', 'Sleep']})
+    analysis = analyze(data)
+    assert 'Overlay' in finding_types(analysis)
+    assert analysis.to_json()['pe']['overlay_size'] == len(overlay)
+
+
+@pytest.mark.parametrize('data', [
+    b'MZ' + bytes(62),
+    b'MZ' + bytes(58) + struct.pack('<I', 0x7FFFFFFF),
+    b'MZ' + bytes(58) + struct.pack('<I', 0x40) + b'PE\0\0' + bytes(8),
+    b'MZ' + bytes(58) + struct.pack('<I', 0x40) + b'PE\0\0' + bytes(20) + b'\x07\x01' + bytes(300)
+])
+def test_broken_pe_headers_are_reported(data):
+    with pytest.raises(ValueError):
+        PEFile(data)
+    analysis = analyze(data)
+    assert analysis.pe is None
+    assert 'MalformedPE' in finding_types(analysis)
+
+
+def test_truncated_import_table_is_ignored():
+    data = build_pe([('.text', CODE, code_bytes(4096))], imports={'kernel32.dll': ['ExitProcess']})
+    truncated = data[:HEADERS_SIZE + 4096]
+    analysis = analyze(truncated)
+    assert analysis.pe.imports == {}
+    assert 'FewImports' not in finding_types(analysis)
+
+
+def test_import_parsing_is_capped():
+    # Thousands of descriptors sharing one huge thunk array, plus many distinct arrays
+    shared = ['CreateRemoteThread'] * 4000
+    imports = {f'dll{index}.dll': shared for index in range(60)}
+    data = build_pe([('.text', CODE, code_bytes(4096))], imports=imports)
+
+    started = time.perf_counter()
+    analysis = analyze(data)
+    assert time.perf_counter() - started < 5
+    assert sum(len(names) for names in analysis.pe.imports.values()) <= MAX_IMPORTS
+
+
+def test_non_pe_data_uses_string_search():
+    analysis = analyze(b'#!/bin/sh\n# calls CreateRemoteThread and WinExec\n')
+    assert analysis.pe is None
+    assert analysis.suspicious_imports == ['CreateRemoteThread', 'WinExec']
+    assert analysis.risk_level == 'low'
+
+
+def test_empty_and_random_data():
+    empty = analyze(b'').to_json()
+    assert (empty['score'], empty['risk_level'], empty['entropy'], empty['pe']) == (0, 'none', 0.0, None)
+
+    noise = analyze(random.Random(5).randbytes(256 * 1024))
+    assert noise.entropy > 7.9
+    assert noise.high_entropy_ratio == 1.0
+    assert 'Entropy' in finding_types(noise)
+
+
+def test_suspicious_names_match_by_prefix():
+    assert suspicious_names(['LoadLibraryExW', 'ShellExecuteA', 'Sleep']) == ['LoadLibrary', 'ShellExecute']
+    assert suspicious_names([]) == []
@@ -0,0 +1,67 @@
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from app.query_stats import query_stats
+
+
+@pytest.fixture
+def engine(app):
+    # create_app installed the listeners; they apply to every engine
+    engine = create_engine('sqlite://')
+    with engine.begin() as connection:
+        connection.execute(text('CREATE TABLE item (id INTEGER PRIMARY KEY)'))
+    query_stats.reset()
+    yield engine
+    engine.dispose()
+
+
+def test_statements_are_counted_by_kind(engine):
+    with engine.begin() as connection:
+        connection.execute(text('INSERT INTO item (id) VALUES (1)'))
+        connection.execute(text('  select id from item'))
+        connection.execute(text('SELECT COUNT(*) FROM item'))
+
+    metrics = query_stats.metrics()
+
+    assert metrics['by_kind']['SELECT']['count'] == 2
+    assert metrics['by_kind']['INSERT']['count'] == 1
+    assert metrics['total'] == sum(stats['count'] for stats in metrics['by_kind'].values())
+    assert metrics['time_ms'] >= 0
+
+
+def test_failed_statements_are_counted_as_errors(engine):
+    with engine.connect() as connection:
+        with pytest.raises(OperationalError):
+            connection.execute(text('SELECT missing FROM nowhere'))
+        # The failed statement's start time is not left behind
+        assert connection.info['query_started'] == []
+        connection.execute(text('SELECT 1'))
+
+    by_kind = query_stats.metrics()['by_kind']
+    assert by_kind['ERROR']['count'] == 1
+    assert by_kind['SELECT']['count'] == 1
+
+
+def test_reset_clears_the_counters(engine):
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    query_stats.reset()
+
+    assert query_stats.metrics() == {'total': 0, 'time_ms': 0, 'by_kind': {}}
+
+
+def test_listeners_are_installed_once(app, engine):
+    query_stats.init_app(app)
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+
+    assert query_stats.metrics()['by_kind']['SELECT']['count'] == 1
+
+
+def test_metrics_route_reports_queries(client, auth_headers):
+    response = client.get('/api/metrics', headers=auth_headers)
+
+    assert response.status_code == 200
+    assert set(response.get_json()) == {'single_flight', 'heartbeats', 'replicas', 'queries'}
+    assert client.get('/api/metrics').status_code == 401
@@ -0,0 +1,180 @@
+import gzip
+import hashlib
+import os
+import threading
+import time
+
+import pytest
+
+from app.sample_store import TEMP_PREFIX, PeriodicTask, RescanScheduler, SampleStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return SampleStore(str(tmp_path / 'samples'))
+
+
+def sample(tmp_path, data, name='sample.bin'):
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path), hashlib.sha256(data).hexdigest()
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, 'timed out'
+        time.sleep(0.01)
+
+
+def test_path_is_sharded_by_hash(store):
+    sha256 = 'AB' + 'cd' * 31
+
+    assert store.path(sha256) == os.path.join(store.folder, 'ab', 'cd', sha256.lower() + '.gz')
+
+
+@pytest.mark.parametrize('sha256', [None, '', 'abc', 'g' * 64, '../' + 'a' * 61, 'a' * 65])
+def test_invalid_keys_are_rejected(store, sha256):
+    with pytest.raises(ValueError):
+        store.path(sha256)
+
+
+def test_put_file_stores_each_sample_once(store, tmp_path):
+    path, sha256 = sample(tmp_path, b'MZ' + b'\x00' * 4096)
+
+    size, created = store.put_file(path, sha256)
+    again = store.put_file(path, sha256)
+
+    assert created and size == os.path.getsize(store.path(sha256))
+    assert again == (size, False)
+    assert store.read(sha256) == b'MZ' + b'\x00' * 4096
+    assert store.read(sha256, max_bytes=2) == b'MZ'
+
+
+def test_stored_files_are_plain_deterministic_gzip(tmp_path):
+    path, sha256 = sample(tmp_path, b'payload' * 100)
+    first, second = SampleStore(str(tmp_path / 'a')), SampleStore(str(tmp_path / 'b'))
+    first.put_file(path, sha256)
+    second.put_file(path, sha256)
+
+    with open(first.path(sha256), 'rb') as a, open(second.path(sha256), 'rb') as b:
+        assert a.read() == b.read()
+    with gzip.open(first.path(sha256)) as f:
+        assert f.read() == b'payload' * 100
+
+
+def test_put_file_leaves_no_temp_file_on_error(store, tmp_path):
+    with pytest.raises(FileNotFoundError):
+        store.put_file(str(tmp_path / 'missing.bin'), 'a' * 64)
+
+    assert list(store.files()) == []
+    assert not store.exists('a' * 64)
+
+
+def test_missing_samples(store):
+    with pytest.raises(FileNotFoundError):
+        store.read('a' * 64)
+    assert store.remove('a' * 64) == 0
+
+
+def test_remove_returns_the_bytes_freed(store, tmp_path):
+    path, sha256 = sample(tmp_path, b'data')
+    size, _ = store.put_file(path, sha256)
+
+    assert store.remove(sha256) == size
+    assert not store.exists(sha256)
+
+
+def test_files_lists_samples_and_temp_files(store, tmp_path):
+    path, sha256 = sample(tmp_path, b'data')
+    store.put_file(path, sha256)
+    directory = os.path.dirname(store.path(sha256))
+    open(os.path.join(directory, TEMP_PREFIX + 'x.tmp'), 'wb').close()
+    open(os.path.join(directory, 'notes.txt'), 'wb').close()
+
+    assert sorted(key or '' for key, _ in store.files()) == ['', sha256]
+
+
+def test_remove_temp_files_only_removes_old_ones(store, tmp_path):
+    old = os.path.join(store.folder, TEMP_PREFIX + 'old.tmp')
+    new = os.path.join(store.folder, TEMP_PREFIX + 'new.tmp')
+    open(old, 'wb').close()
+    open(new, 'wb').close()
+    os.utime(old, (time.time() - 7200, time.time() - 7200))
+
+    assert store.remove_temp_files(time.time() - 3600) == 1
+    assert not os.path.exists(old)
+    assert os.path.exists(new)
+
+
+def test_rescan_scheduler_coalesces_requests():
+    release = threading.Event()
+    runs = []
+
+    def job(version):
+        runs.append(version)
+        release.wait(5)
+        return {'version': version}
+
+    scheduler = RescanScheduler(job)
+    scheduler.request('1.0')
+    wait_for(lambda: runs == ['1.0'])
+    scheduler.request('1.1')
+    scheduler.request('1.2')
+    assert scheduler.status()['pending_version'] == '1.2'
+    release.set()
+
+    wait_for(lambda: not scheduler.status()['running'])
+    status = scheduler.status()
+    assert runs == ['1.0', '1.2']
+    assert status['last_run'] == {'version': '1.2'}
+    assert status['error'] is None
+
+
+def test_rescan_scheduler_keeps_errors_and_runs_again():
+    calls = []
+
+    def job(version):
+        calls.append(version)
+        if version == 'bad':
+            raise RuntimeError('scan failed')
+        return version
+
+    scheduler = RescanScheduler(job)
+    scheduler.request('bad')
+    wait_for(lambda: calls and not scheduler.status()['running'])
+    assert scheduler.status()['error'] == 'scan failed'
+
+    scheduler.request('good')
+    wait_for(lambda: scheduler.status()['last_run'] == 'good')
+    assert scheduler.status()['error'] is None
+
+
+def test_periodic_task_runs_on_schedule_and_keeps_errors():
+    calls = []
+    errors_seen = []
+
+    def job():
+        calls.append(None)
+        if len(calls) == 1:
+            raise RuntimeError('sweep failed')
+        if len(calls) == 2:
+            # The failed run is recorded before the next one starts
+            errors_seen.append(task.status()['error'])
+        return len(calls)
+
+    task = PeriodicTask(job, interval=0.01)
+    task.start()
+    task.start()
+    wait_for(lambda: (task.status()['last_run'] or 0) >= 2)
+
+    assert errors_seen == ['sweep failed']
+    assert task.status()['error'] is None
+
+
+def test_periodic_task_with_no_interval_never_starts():
+    task = PeriodicTask(lambda: pytest.fail('should not run'), interval=0)
+    task.start()
+    time.sleep(0.05)
+
+    assert task.status()['finished_at'] is None
@@ -0,0 +1,73 @@
+import json
+from datetime import date, datetime
+
+import pytest
+
+from app import serialization
+from app.serialization import DATETIME, RAW, RowEncoder
+
+ENCODER = RowEncoder(
+    [('id', 0), ('name', 1), ('type', 2), ('created_at', 3, DATETIME)],
+    variant=(2, {'pattern': [('pattern_data', 4, RAW)], 'hash': [('hash_value', 5)]})
+)
+
+ROWS = [
+    (1, 'Trojan.Ünïcødé ☠ "quoted" \\ /', 'pattern', datetime(2024, 5, 1, 12, 30, 15, 250),
+     '{"patterns": [{"type": "ascii", "value": "é"}], "logic": "all"}', None),
+    (2, 'Control\x00\x1f\n\t ', 'hash', datetime(2024, 5, 1), None, 'a' * 64),
+    (3, None, 'pattern', None, None, None),
+    (4, 'Emoji \U0001F600', 'other', date(2024, 5, 1), None, None),
+    (5, True, 'hash', None, None, False)
+]
+
+
+def template_dumps(rows, monkeypatch):
+    monkeypatch.setattr(serialization, 'FAST_JSON', False)
+    return ENCODER.dumps(rows)
+
+
+def test_rows_encode_to_plain_json(monkeypatch):
+    decoded = json.loads(template_dumps(ROWS, monkeypatch))
+    assert decoded[0]['pattern_data'] == {'patterns': [{'type': 'ascii', 'value': 'é'}], 'logic': 'all'}
+    assert decoded[0]['created_at'] == '2024-05-01T12:30:15.000250'
+    assert decoded[1] == {'id': 2, 'name': 'Control\x00\x1f\n\t ', 'type': 'hash',
+                          'created_at': '2024-05-01T00:00:00', 'hash_value': 'a' * 64}
+    assert decoded[2]['pattern_data'] is None
+    assert 'pattern_data' not in decoded[3] and 'hash_value' not in decoded[3]
+
+
+@pytest.mark.skipif(not serialization.FAST_JSON, reason='orjson with Fragment is not installed')
+def test_orjson_and_template_paths_produce_the_same_bytes(monkeypatch):
+    fast = ENCODER.dumps(ROWS)
+    assert template_dumps(ROWS, monkeypatch) == fast
+    assert 'Ünïcødé'.encode('utf-8') in fast
+
+
+def test_empty_list(monkeypatch):
+    assert template_dumps([], monkeypatch) == b'[]'
+
+
+def test_unknown_field_kind_is_rejected():
+    with pytest.raises(ValueError):
+        RowEncoder([('id', 0, 'decimal')])
+
+
+@pytest.mark.parametrize('pattern_data', ['{"patterns": [', 'not json', ''])
+def test_invalid_pattern_data_cannot_be_written(app, pattern_data):
+    from models import VirusSignature
+
+    with pytest.raises(ValueError):
+        VirusSignature(name='Bad', signature_type='pattern', pattern_data=pattern_data)
+
+
+def test_signature_list_embeds_pattern_data(app, client, auth_headers):
+    from app.signature_manager import SignatureManager
+
+    patterns = [{'type': 'hex', 'hex_pattern': '4D5A90', 'offset': 0}]
+    assert SignatureManager.add_pattern_signature('Test.Pattern', patterns, severity='high')[0]
+
+    response = client.get('/api/signatures?type=pattern', headers=auth_headers)
+    assert response.status_code == 200
+    (signature,) = response.get_json()
+    assert signature['name'] == 'Test.Pattern'
+    assert signature['pattern_data']['patterns'][0]['hex_pattern'] == '4D5A90'
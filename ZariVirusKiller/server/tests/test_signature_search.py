@@ -0,0 +1,118 @@
+import pytest
+
+from app.signature_manager import SignatureManager
+from app.signature_search import SignatureSearch, hex_tokens, normalize_hex, searchable_patterns
+
+
+@pytest.fixture
+def signatures(app):
+    SignatureManager.add_hash_signature('Trojan.Dropper', 'a' * 64, severity='high',
+                                        description='Windows dropper for temp payloads')
+    SignatureManager.add_hash_signature('Adware.Toolbar', 'b' * 64, severity='low',
+                                        description='Windows browser toolbar installer')
+    SignatureManager.add_pattern_signature('Worm.Autorun', [
+        {'type': 'hex', 'value': '4D5A9000'},
+        {'type': 'ascii', 'value': 'autorun.inf'}
+    ], severity='high', description='Windows worm spreading through drives')
+
+
+def names(results):
+    return [result['name'] for result in results['results']]
+
+
+def test_normalize_hex_strips_separators():
+    assert normalize_hex('4d 5a:90-00') == '4D5A9000'
+    assert normalize_hex(None) == ''
+
+
+def test_hex_tokens_delimit_whole_bytes():
+    assert hex_tokens('4D5A') == ' 4D 5A '
+
+
+def test_searchable_patterns_hex_encode_ascii_and_skip_regex():
+    pattern_data = ('{"patterns": [{"type": "ascii", "value": "MZ"}, '
+                    '{"type": "regex", "value": "evil\\\\d+"}, {"type": "hex", "value": "90"}]}')
+
+    assert searchable_patterns(pattern_data) == ' 4D 5A | 90 '
+
+
+@pytest.mark.parametrize('pattern_data', [None, '', 'not json', '[]', '{"patterns": [{"type": "yara"}]}'])
+def test_searchable_patterns_tolerates_bad_data(pattern_data):
+    assert searchable_patterns(pattern_data) == ''
+
+
+def test_substring_search_matches_name_and_description(signatures):
+    assert names(SignatureSearch.search('ropp')) == ['Trojan.Dropper']
+    assert names(SignatureSearch.search('toolbar', field='description')) == ['Adware.Toolbar']
+    assert names(SignatureSearch.search('Autorun', field='description')) == []
+
+
+def test_prefix_search_anchors_to_the_start(signatures):
+    assert names(SignatureSearch.search('Trojan', mode='prefix')) == ['Trojan.Dropper']
+    assert names(SignatureSearch.search('Dropper', mode='prefix')) == []
+
+
+def test_hex_search_matches_whole_bytes_in_patterns(signatures):
+    assert names(SignatureSearch.search(hex_pattern='5a 90')) == ['Worm.Autorun']
+    # 'autorun' spelled in hex: ASCII patterns are indexed as bytes too
+    assert names(SignatureSearch.search(hex_pattern='6175746F72756E')) == ['Worm.Autorun']
+    # 'A90' would straddle the 5A/90 byte boundary
+    assert names(SignatureSearch.search(hex_pattern='A900')) == []
+
+
+def test_filters_narrow_results_but_not_facets(signatures):
+    results = SignatureSearch.search('windows', severity='high')
+
+    assert sorted(names(results)) == ['Trojan.Dropper', 'Worm.Autorun']
+    assert results['total'] == 2
+    assert results['facets'] == {'severity': {'high': 2, 'low': 1}, 'type': {'hash': 2, 'pattern': 1}}
+
+    typed = SignatureSearch.search('windows', signature_type='pattern')
+    assert names(typed) == ['Worm.Autorun']
+
+
+def test_results_are_paginated(signatures):
+    first = SignatureSearch.search('windows', page=1, per_page=2)
+    second = SignatureSearch.search('windows', page=2, per_page=2)
+
+    assert first['total'] == second['total'] == 3
+    assert len(first['results']) == 2
+    assert len(second['results']) == 1
+    assert not set(names(first)) & set(names(second))
+    assert SignatureSearch.search('windows', page=0, per_page=500)['per_page'] == 100
+
+
+def test_reindexing_a_signature_replaces_its_document(signatures):
+    from models import db, VirusSignature
+
+    signature = VirusSignature.query.filter_by(name='Adware.Toolbar').one()
+    signature.description = 'Bundled search hijacker'
+    db.session.commit()
+    SignatureSearch.index_signature(signature)
+
+    assert names(SignatureSearch.search('hijack')) == ['Adware.Toolbar']
+    assert names(SignatureSearch.search('toolbar', field='description')) == []
+    assert SignatureSearch.rebuild() == 3
+
+
+@pytest.mark.parametrize('kwargs', [
+    {},
+    {'query': 'ab'},
+    {'query': 'dropper', 'field': 'pattern_data'},
+    {'hex_pattern': '4D'},
+    {'hex_pattern': '4D5A9'},
+    {'hex_pattern': 'zz'}
+])
+def test_invalid_searches_are_rejected(app, kwargs):
+    with pytest.raises(ValueError):
+        SignatureSearch.search(**kwargs)
+
+
+def test_search_route_reports_bad_input(client, auth_headers, signatures):
+    response = client.get('/api/signatures/search?q=dropper', headers=auth_headers)
+    assert response.status_code == 200
+    assert [result['name'] for result in response.get_json()['results']] == ['Trojan.Dropper']
+
+    assert client.get('/api/signatures/search?q=ab', headers=auth_headers).status_code == 400
+    assert client.get('/api/signatures/search?hex=4D5A9', headers=auth_headers).status_code == 400
+    assert client.get('/api/signatures/search?q=dropper').status_code == 401
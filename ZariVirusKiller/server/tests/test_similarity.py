@@ -0,0 +1,118 @@
+import io
+import random
+
+import pytest
+
+from app.similarity import (EMPTY_BIN, SIMILARITY_BINS, LSHIndex, compute_similarity_hash,
+                            decode_similarity_hash, similarity)
+
+
+def sample(seed, size=64 * 1024):
+    return random.Random(seed).randbytes(size)
+
+
+def edited(data, offset, patch):
+    return data[:offset] + patch + data[offset + len(patch):]
+
+
+def distance(data_a, data_b):
+    return 1 - similarity(decode_similarity_hash(compute_similarity_hash(data_a)),
+                          decode_similarity_hash(compute_similarity_hash(data_b)))
+
+
+def test_identical_data_has_identical_sketches():
+    data = sample(1)
+    assert compute_similarity_hash(data) == compute_similarity_hash(bytearray(data))
+    assert distance(data, data) == 0
+
+
+def test_small_edits_stay_close_and_unrelated_data_is_far():
+    data = sample(1)
+    variant = edited(edited(data, 10000, b'repacked'), 40000, b'\x90' * 32)
+    assert distance(data, variant) < 0.1
+    assert distance(data, sample(2)) > 0.9
+
+
+def test_inserted_bytes_only_change_nearby_chunks():
+    data = sample(3)
+    assert distance(data, data[:20000] + b'inserted payload' + data[20000:]) < 0.1
+
+
+def test_short_inputs_fall_back_to_byte_shingles():
+    data = sample(8, size=4096)
+    assert distance(data, edited(data, 2000, b'patched!')) < 0.1
+    assert distance(data, sample(9, size=4096)) > 0.9
+
+
+def test_empty_input_has_an_empty_sketch():
+    bins = decode_similarity_hash(compute_similarity_hash(b''))
+    assert bins == (EMPTY_BIN,) * SIMILARITY_BINS
+    assert similarity(bins, bins) == 0.0
+
+
+def test_max_bytes_limits_the_input():
+    data = sample(4)
+    assert compute_similarity_hash(data, max_bytes=32768) == compute_similarity_hash(data[:32768])
+
+
+@pytest.mark.parametrize('similarity_hash', [
+    None,
+    '',
+    'mh1:128',
+    'mh2:128:' + '0' * 1024,
+    'mh1:64:' + '0' * 512,
+    'mh1:128:' + '0' * 1023,
+    'mh1:128:' + 'zz' * 512,
+    'mh1:x:' + '0' * 1024
+])
+def test_decode_rejects_malformed_hashes(similarity_hash):
+    with pytest.raises(ValueError):
+        decode_similarity_hash(similarity_hash)
+
+
+def test_lsh_index_returns_near_variants_nearest_first():
+    index = LSHIndex()
+    family = sample(5)
+    index.add('close', compute_similarity_hash(edited(family, 1000, b'x' * 16)), {'name': 'Family.Close'})
+    index.add('farther', compute_similarity_hash(edited(family, 1000, b'y' * 4000)), {'name': 'Family.Far'})
+    index.add('other', compute_similarity_hash(sample(6)), {'name': 'Other'})
+    assert len(index) == 3
+
+    matches = index.query(compute_similarity_hash(family), max_distance=0.5)
+    assert [match['id'] for match in matches] == ['close', 'farther']
+    assert matches[0]['name'] == 'Family.Close'
+    assert matches[0]['distance'] <= matches[1]['distance']
+
+    assert [match['id'] for match in index.query(compute_similarity_hash(family), limit=1)] == ['close']
+    assert index.query(compute_similarity_hash(family), max_distance=0.0) == []
+
+
+def test_lsh_index_rejects_malformed_hashes():
+    with pytest.raises(ValueError):
+        LSHIndex().add('bad', 'mh1:128:00')
+    with pytest.raises(ValueError):
+        LSHIndex().query('bad')
+
+
+def test_signatures_added_through_the_api_are_searchable(app, client, auth_headers):
+    family = sample(7)
+    response = client.post('/api/add-signature', headers=auth_headers, json={
+        'type': 'similarity', 'name': 'Family.Sample', 'similarity_hash': compute_similarity_hash(family)
+    })
+    assert response.status_code == 201
+
+    variant = io.BytesIO(edited(family, 5000, b'patched'))
+    response = client.post('/api/similarity/search', headers=auth_headers,
+                           data={'file': (variant, 'variant.exe')}, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert [match['name'] for match in response.get_json()['matches']] == ['Family.Sample']
+
+
+def test_invalid_similarity_input_is_rejected(app, client, auth_headers):
+    response = client.post('/api/add-signature', headers=auth_headers, json={
+        'type': 'similarity', 'name': 'Bad', 'similarity_hash': 'mh1:128:00'
+    })
+    assert response.status_code == 400
+    assert client.post('/api/similarity/search', headers=auth_headers, json={}).status_code == 400
+    response = client.post('/api/similarity/search', headers=auth_headers, json={'similarity_hash': 'nope'})
+    assert response.status_code == 400
@@ -0,0 +1,88 @@
+import threading
+
+import pytest
+
+from app.single_flight import SingleFlight
+
+
+def run_concurrently(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    release = threading.Event()
+    executions = []
+    results = []
+
+    def work():
+        executions.append(1)
+        release.wait(5)
+        return {'version': '1.0'}
+
+    threads = run_concurrently(8, lambda: results.append(flight.do(('definitions', 1), work)))
+    while flight.metrics()['definitions']['calls'] < 8:
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(executions) == 1
+    assert results == [{'version': '1.0'}] * 8
+    metrics = flight.metrics()['definitions']
+    assert (metrics['executions'], metrics['collapsed'], metrics['collapse_ratio']) == (1, 7, 0.875)
+    assert metrics['in_flight'] == 0
+
+
+def test_waiters_receive_the_leaders_exception():
+    flight = SingleFlight()
+    release = threading.Event()
+    errors = []
+
+    def work():
+        release.wait(5)
+        raise LookupError('database down')
+
+    def call():
+        try:
+            flight.do('license', work)
+        except LookupError as e:
+            errors.append(e)
+
+    threads = run_concurrently(4, call)
+    while flight.metrics()['license']['calls'] < 4:
+        release.wait(0.01)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert len(errors) == 4
+    assert len({id(error) for error in errors}) == 1
+
+
+def test_sequential_calls_run_again_after_completion():
+    flight = SingleFlight()
+    counter = iter(range(10))
+    assert flight.do(('stats',), lambda: next(counter)) == 0
+    assert flight.do(('stats',), lambda: next(counter)) == 1
+
+    with pytest.raises(ZeroDivisionError):
+        flight.do(('stats',), lambda: 1 / 0)
+    assert flight.do(('stats',), lambda: next(counter)) == 2
+
+
+def test_different_keys_do_not_wait_for_each_other():
+    flight = SingleFlight()
+    assert flight.do(('verify-license', 'A'), str.lower, 'A') == 'a'
+    assert flight.do(('verify-license', 'B'), str.lower, 'B') == 'b'
+    assert flight.metrics()['verify-license']['executions'] == 2
+
+
+def test_reset_metrics():
+    flight = SingleFlight()
+    flight.do('key', lambda: None)
+    flight.reset_metrics()
+    assert flight.metrics() == {}
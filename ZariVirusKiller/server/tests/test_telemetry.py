@@ -0,0 +1,108 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import DetectionEvent, DetectionRollup
+from app.telemetry import apply_rollups, bucket_start, parse_timestamp
+
+
+def post(client, events, **body):
+    return client.post('/api/telemetry/detections', json=dict(body, events=events))
+
+
+def test_events_are_stored_and_rolled_up(app, client):
+    now = datetime.utcnow().replace(microsecond=0)
+    events = [
+        {'signature_id': 'Trojan.A', 'hash': 'a' * 64, 'timestamp': now.isoformat() + 'Z'},
+        {'signature_id': 'Trojan.A', 'timestamp': now.isoformat() + 'Z'},
+        {'signature_id': 'Worm.B', 'device_id': 'device-2'}
+    ]
+    response = post(client, events, device_id='device-1')
+    assert response.status_code == 202
+    assert response.get_json() == {'accepted': 3}
+
+    assert DetectionEvent.query.count() == 3
+    assert DetectionEvent.query.filter_by(signature_id='Worm.B').one().device_id == 'device-2'
+    rollup = DetectionRollup.query.filter_by(granularity='hour', signature_id='Trojan.A').one()
+    assert (rollup.bucket_start, rollup.count) == (bucket_start(now, 'hour'), 2)
+
+
+def test_rollups_accumulate_across_batches(app, client):
+    for _ in range(2):
+        assert post(client, [{'signature_id': 'Trojan.A'}]).status_code == 202
+    assert DetectionRollup.query.filter_by(granularity='day').one().count == 2
+
+
+@pytest.mark.parametrize('body', [None, [], {'events': []}, {'events': 'x'}, {'events': [{}], 'device_id': 1}])
+def test_malformed_batches_are_rejected(client, body):
+    assert client.post('/api/telemetry/detections', json=body).status_code == 400
+
+
+@pytest.mark.parametrize('event', [
+    'Trojan.A',
+    {},
+    {'signature_id': 7},
+    {'signature_id': 'Trojan.A', 'hash': 123},
+    {'signature_id': 'Trojan.A', 'timestamp': 1700000000},
+    {'signature_id': 'Trojan.A', 'timestamp': 'yesterday'},
+    {'signature_id': 'x' * 129},
+    {'signature_id': 'Trojan.A', 'hash': 'a' * 65},
+    {'signature_id': 'Trojan.A', 'device_id': 'd' * 65},
+    {'signature_id': 'Trojan.A', 'timestamp': '9999-12-31T23:59:59'},
+    {'signature_id': 'Trojan.A', 'timestamp': '9999-12-31T23:59:59-05:00'},
+    {'signature_id': 'Trojan.A', 'timestamp': '1970-01-01T00:00:00Z'}
+])
+def test_invalid_events_reject_the_whole_batch(app, client, event):
+    response = post(client, [{'signature_id': 'Ok.Event'}, event])
+    assert response.status_code == 400
+    assert 'Event 1' in response.get_json()['error']
+    assert DetectionEvent.query.count() == 0
+    assert DetectionRollup.query.count() == 0
+
+
+def test_timestamp_window_is_configurable(app, client):
+    app.config['TELEMETRY_MAX_CLOCK_SKEW'] = 0
+    ahead = (datetime.utcnow() + timedelta(minutes=5)).isoformat()
+    assert post(client, [{'signature_id': 'Trojan.A', 'timestamp': ahead}]).status_code == 400
+
+    app.config['TELEMETRY_MAX_EVENT_AGE_DAYS'] = 400
+    old = (datetime.utcnow() - timedelta(days=365)).isoformat()
+    assert post(client, [{'signature_id': 'Trojan.A', 'timestamp': old}]).status_code == 202
+
+
+def test_oversized_batches_are_rejected(app, client):
+    app.config['TELEMETRY_MAX_BATCH'] = 2
+    assert post(client, [{'signature_id': 'Trojan.A'}] * 3).status_code == 413
+
+
+def test_rollup_rows_are_upserted_in_key_order(app, monkeypatch):
+    from app import db
+
+    executed = []
+    monkeypatch.setattr(db.session, 'execute', lambda statement, rows: executed.append(rows))
+    now = datetime.utcnow()
+    apply_rollups([
+        {'signature_id': 'Worm.B', 'detected_at': now},
+        {'signature_id': 'Adware.C', 'detected_at': now - timedelta(hours=2)},
+        {'signature_id': 'Trojan.A', 'detected_at': now}
+    ])
+
+    keys = [(row['granularity'], row['bucket_start'], row['signature_id']) for row in executed[0]]
+    assert keys == sorted(keys)
+
+
+def test_trends_require_auth_and_valid_granularity(client, auth_headers):
+    assert client.get('/api/telemetry/trends').status_code == 401
+    assert client.get('/api/telemetry/trends?granularity=week', headers=auth_headers).status_code == 400
+    assert client.get('/api/telemetry/trends?since=soon', headers=auth_headers).status_code == 400
+
+
+def test_trends_report_rollup_buckets(client, auth_headers):
+    post(client, [{'signature_id': 'Trojan.A'}, {'signature_id': 'Trojan.A'}])
+    response = client.get('/api/telemetry/trends?granularity=day&signature_id=Trojan.A', headers=auth_headers)
+    assert [bucket['count'] for bucket in response.get_json()['buckets']] == [2]
+
+
+def test_parse_timestamp_converts_to_naive_utc():
+    assert parse_timestamp('2024-05-01T12:30:00+02:00') == datetime(2024, 5, 1, 10, 30)
+    assert parse_timestamp('2024-05-01T12:30:00Z') == datetime(2024, 5, 1, 12, 30)